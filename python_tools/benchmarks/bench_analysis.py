@@ -0,0 +1,157 @@
+#!/usr/bin/env python3.8
+
+"""Benchmark of reading, plotting and totalling the stored LB2120 data.
+
+Builds a SQLite database holding months of synthetic LB2120_STATS samples
+(and the rollup tables built from them) and then times the --plot
+(_getDataSet() and _plot()) and --total (_getTotals() and _showTotals())
+steps over the whole period at each resolution. The figure is converted to
+HTML (as plotly does before it is shown) rather than opened in a browser."""
+
+import  os
+import  sys
+import  datetime
+import  tempfile
+import  numpy as np
+import  plotly.graph_objects as go
+
+from    time import monotonic
+from    optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from    lb2120lib.stats import LB2120Stats
+from    lb2120lib.usage import UsageLogger
+from    lb2120lib.cli import addCollectorOptions
+from    bench_pipeline import BenchmarkUIO, BenchmarkDBConfig, getCPUSeconds, getMaxRSSMB
+
+INSERT_ROWS         = 10000
+RANDOM_SEED         = 2120
+
+class AnalysisUsageLogger(UsageLogger):
+    """@brief A UsageLogger that reads a fixed time period rather than the
+              period held in the read config file."""
+
+    def __init__(self, uio, options, config, start, stop):
+        super().__init__(uio, options, config)
+        self._start = start
+        self._stop  = stop
+
+    def _getReadDBConfig(self):
+        return (self._start, self._stop, 1)
+
+def showFigure(fig, *args, **kwargs):
+    """@brief Convert the figure to HTML in place of opening it in a browser."""
+    fig.to_html()
+
+def getSyntheticColumns(start, sampleCount, pollSeconds, resetCount):
+    """@brief Get a synthetic set of samples.
+       @param start The time of the first sample.
+       @param sampleCount The number of samples.
+       @param pollSeconds The time between samples.
+       @param resetCount The number of times the byte counters are reset (the LB2120 rebooted).
+       @return A dict of column name: list of values."""
+    random = np.random.default_rng(RANDOM_SEED)
+    downMbps = random.gamma(2.0, 5.0, sampleCount)
+    upMbps = random.gamma(2.0, 0.5, sampleCount)
+    tempC = 45 + 5*np.sin(np.arange(sampleCount) * 2 * np.pi * pollSeconds / 86400) + random.normal(0, 0.5, sampleCount)
+
+    #The byte counters wrap at 32 bits and restart from 0 at each reset.
+    wrapValue = LB2120Stats.COUNTER_WRAP_VALUES[0]
+    rxDeltas = (downMbps * pollSeconds * 1E6 / 8).astype(np.int64)
+    txDeltas = (upMbps * pollSeconds * 1E6 / 8).astype(np.int64)
+    segments = np.zeros(sampleCount, dtype=np.int64)
+    segments[random.choice(sampleCount, resetCount, replace=False)] = 1
+    segments = np.cumsum(segments)
+    rxBytes = np.empty(sampleCount, dtype=np.int64)
+    txBytes = np.empty(sampleCount, dtype=np.int64)
+    for segment in np.unique(segments):
+        indexes = segments == segment
+        rxBytes[indexes] = np.cumsum(rxDeltas[indexes]) % wrapValue
+        txBytes[indexes] = np.cumsum(txDeltas[indexes]) % wrapValue
+
+    timestamps = [start + datetime.timedelta(seconds=index*pollSeconds) for index in range(sampleCount)]
+    return {"TIMESTAMP":    timestamps,
+            "DOWNMBPS":     np.round(downMbps, 3).tolist(),
+            "UPMBPS":       np.round(upMbps, 3).tolist(),
+            "TEMPC":        np.round(tempC, 1).tolist(),
+            "TEMPCRITICAL": [False] * sampleCount,
+            "RXBYTES":      rxBytes.tolist(),
+            "TXBYTES":      txBytes.tolist()}
+
+def createDatabase(usageLogger, start, sampleCount, pollSeconds, resetCount):
+    """@brief Fill the database with synthetic samples and build the rollup tables."""
+    columns = getSyntheticColumns(start, sampleCount, pollSeconds, resetCount)
+    colNames = list(columns.keys())
+    usageLogger._connectToDBS()
+    backend = usageLogger._dataBaseIF
+    for index in range(0, sampleCount, INSERT_ROWS):
+        rows = [dict(zip(colNames, values)) for values in zip(*(columns[colName][index:index+INSERT_ROWS] for colName in colNames))]
+        with backend.transaction():
+            backend.insertRows(UsageLogger.TABLE_NAME, colNames, rows)
+    usageLogger.rebuildRollups()
+
+def measure(name, func):
+    """@brief Call a function and show the wall and CPU time it took.
+       @param name The name of the step.
+       @param func The function to call.
+       @return The value returned by func."""
+    startTime = monotonic()
+    startCPU = getCPUSeconds()
+    value = func()
+    print("{:<28} {:>9.3f} s wall {:>9.3f} s CPU {:>9.1f} MB max RSS".format(name, monotonic()-startTime, getCPUSeconds()-startCPU, getMaxRSSMB()))
+    return value
+
+def main():
+    opts=OptionParser(description="Benchmark reading, plotting and totalling months of LB2120 data held in a SQLite database.")
+    opts.add_option("--months",   help="The number of months of samples (default=3).", type="int", default=3)
+    opts.add_option("--psec",     help="The time between samples in seconds (default=30).", type="int", default=30)
+    opts.add_option("--resets",   help="The number of times the byte counters are reset (default=3).", type="int", default=3)
+    opts.add_option("--resolutions", help="A comma separated list of the resolutions to read (default=raw,auto).", default="raw,auto")
+    opts.add_option("--db",       help="The SQLite database file. If it does not exist it is created (default=a temporary file).", default=None)
+    (benchOptions, args) = opts.parse_args()
+
+    collectorOpts = OptionParser()
+    addCollectorOptions(collectorOpts)
+    options = collectorOpts.get_default_values()
+    options.psec = benchOptions.psec
+    options.device = None
+    options.cplot = False
+    options.total = False
+    options.offline = False
+    options.points = UsageLogger.DEFAULT_MAX_PLOT_POINTS
+
+    tempDir = tempfile.TemporaryDirectory()
+    dbFile = benchOptions.db or os.path.join(tempDir.name, "lb2120.db")
+    options.spool = os.path.join(tempDir.name, "lb2120.spool")
+    sampleCount = benchOptions.months * 30 * 86400 // benchOptions.psec
+    start = datetime.datetime(2021, 1, 1)
+    stop = start + datetime.timedelta(seconds=sampleCount*benchOptions.psec)
+    go.Figure.show = showFigure
+
+    try:
+        uio = BenchmarkUIO()
+        if not os.path.isfile(dbFile):
+            usageLogger = AnalysisUsageLogger(uio, options, BenchmarkDBConfig(dbFile), start, stop)
+            measure("Create {} samples".format(sampleCount), lambda: createDatabase(usageLogger, start, sampleCount, benchOptions.psec, benchOptions.resets))
+
+        for resolution in benchOptions.resolutions.split(","):
+            options.resolution = resolution
+            for period in (None, "day"):
+                options.tperiod = period
+                usageLogger = AnalysisUsageLogger(uio, options, BenchmarkDBConfig(dbFile), start, stop)
+                usageLogger._connectToDBS()
+                try:
+                    if period is None:
+                        dataSet = measure("{} _getDataSet".format(resolution), usageLogger._getDataSet)
+                        print("{:<28} {:>9} records".format("", len(dataSet)))
+                        measure("{} _plot".format(resolution), lambda: usageLogger._plot(dataSet))
+                    totals = measure("{} _getTotals ({})".format(resolution, period or "all"), lambda: usageLogger._getTotals(period))
+                    measure("{} _showTotals ({})".format(resolution, period or "all"), lambda: usageLogger._showTotals(totals))
+                finally:
+                    usageLogger.shutDown()
+    finally:
+        tempDir.cleanup()
+
+if __name__== '__main__':
+    main()
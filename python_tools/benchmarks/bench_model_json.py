@@ -0,0 +1,61 @@
+#!/usr/bin/env python3.8
+
+"""Micro-benchmark of the model.json parse stage.
+
+Compares the original parse (strip the browser HTML wrapper with two
+str.replace() calls and then json.loads() the whole document) against
+ModelJSONExtractor on a captured LB2120 model.json payload."""
+
+import  os
+import  sys
+import  json
+import  timeit
+
+from    optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from    lb2120lib.client import LB2120BrowserClient, ModelJSONExtractor
+
+MODEL_JSON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.json")
+
+def replaceAndLoads(content):
+    """@brief The original parse stage.
+       @param content The page source returned by the browser.
+       @return A tuple of the field values."""
+    jsonContent=content.replace(LB2120BrowserClient.HTML_PREFIX, "")
+    jsonContent=jsonContent.replace(LB2120BrowserClient.HTML_SUFFIX, "")
+    data = json.loads(jsonContent)
+    return (data['wwan']['dataTransferredRx'],
+            data['wwan']['dataTransferredTx'],
+            data['general']['devTemperature'],
+            data['power']['deviceTempCritical'])
+
+def main():
+    opts=OptionParser(description="Benchmark the LB2120 model.json parse stage.")
+    opts.add_option("--file",    help="The model.json file to parse (default={}).".format(MODEL_JSON_FILE), default=MODEL_JSON_FILE)
+    opts.add_option("--count",   help="The number of parses per run (default=10000).", type="int", default=10000)
+    opts.add_option("--repeat",  help="The number of runs, the best is reported (default=5).", type="int", default=5)
+    (options, args) = opts.parse_args()
+
+    with open(options.file) as fd:
+        jsonText = fd.read()
+    pageSource = LB2120BrowserClient.HTML_PREFIX + jsonText + LB2120BrowserClient.HTML_SUFFIX
+
+    extractor = ModelJSONExtractor()
+    expected = replaceAndLoads(pageSource)
+    for content in (jsonText, pageSource):
+        if extractor.extract(content) != expected:
+            raise Exception("ModelJSONExtractor returned {} not {}".format(extractor.extract(content), expected))
+
+    print("Payload: {} bytes, {} parses per run".format(len(jsonText), options.count))
+    cases = (("replace + json.loads (page source)",     lambda: replaceAndLoads(pageSource)),
+             ("json.loads (model.json)",                lambda: json.loads(jsonText)),
+             ("ModelJSONExtractor (page source)",       lambda: extractor.extract(pageSource)),
+             ("ModelJSONExtractor (model.json)",        lambda: extractor.extract(jsonText)))
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=options.count, repeat=options.repeat))
+        print("{:<40} {:8.2f} us/parse".format(name, best/options.count*1E6))
+
+if __name__== '__main__':
+    main()
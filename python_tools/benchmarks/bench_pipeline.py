@@ -0,0 +1,177 @@
+#!/usr/bin/env python3.8
+
+"""Benchmark of the collector pipeline (LB2120 -> UsageLogger -> database).
+
+Reads stand-in LB2120 devices (fake_lb2120.py, run in a separate process so
+that its CPU time is not counted) and stores the samples in a SQLite database
+until the required number of samples have been stored. The samples per
+second, end to end sample latency (from the LB2120 read to the database
+commit), CPU use and RSS of the collector are reported along with the time
+taken by each stage of handling a sample."""
+
+import  os
+import  sys
+import  json
+import  datetime
+import  resource
+import  tempfile
+import  subprocess
+import  numpy as np
+
+from    time import monotonic
+from    optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from    lb2120lib.storage import DBClientConfig, SQLiteBackend
+from    lb2120lib.poller import LB2120
+from    lb2120lib.usage import UsageLogger
+from    lb2120lib.cli import addCollectorOptions
+from    fake_lb2120 import FakeLB2120, addServerOptions, getServerArgs, waitForPort
+
+FAKE_LB2120_FILE    = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_lb2120.py")
+TABLE_SCHEMA        = "TIMESTAMP:TIMESTAMP DOWNMBPS:FLOAT(24) UPMBPS:FLOAT(24) TEMPC:FLOAT(24) TEMPCRITICAL:VARCHAR(8) RXBYTES:BIGINT TXBYTES:BIGINT"
+LATENCY_PERCENTILES = (50, 90, 99)
+
+class BenchmarkComplete(BaseException):
+    """@brief Raised to stop the collector (as Ctrl C does) once the required
+              number of samples have been stored."""
+    pass
+
+class BenchmarkUIO(object):
+    """@brief Discards the collector console output so that the speed of the
+              terminal is not measured. Errors are shown."""
+
+    debug = False
+
+    def info(self, msg):
+        pass
+
+    def warn(self, msg):
+        print("WARN:  {}".format(msg))
+
+    def error(self, msg):
+        print("ERROR: {}".format(msg))
+
+class BenchmarkDBConfig(object):
+    """@brief A database configuration that selects a SQLite database."""
+
+    def __init__(self, dbFile):
+        """@brief Constructor
+           @param dbFile The SQLite database file."""
+        self._configDict = dict(DBClientConfig.DEFAULT_CONFIG)
+        self._configDict[DBClientConfig.DB_BACKEND] = SQLiteBackend.NAME
+        self._configDict[DBClientConfig.DB_SQLITE_FILE] = dbFile
+        self._configDict[DBClientConfig.DB_TABLE_SCHEMA] = TABLE_SCHEMA
+
+    def getAttr(self, key):
+        return self._configDict[key]
+
+class BenchmarkUsageLogger(UsageLogger):
+    """@brief A UsageLogger that records the end to end latency of each
+              sample stored and stops once sampleCount samples are stored."""
+
+    def __init__(self, uio, options, config, sampleCount):
+        super().__init__(uio, options, config)
+        self._sampleCount   = sampleCount
+        self.latencies      = []
+        self.startTime      = None
+        self.startCPU       = None
+        self.stopTime       = None
+        self.stopCPU        = None
+
+    def _insertRows(self, rows):
+        super()._insertRows(rows)
+        now = datetime.datetime.now()
+        self.latencies = self.latencies + [(now - row["TIMESTAMP"]).total_seconds() for row in rows]
+
+    def _updateDatabase(self, lb2120Stats):
+        if self.startTime is None:
+            self.startTime = monotonic()
+            self.startCPU = getCPUSeconds()
+        super()._updateDatabase(lb2120Stats)
+        if len(self.latencies) >= self._sampleCount:
+            self.stopTime = monotonic()
+            self.stopCPU = getCPUSeconds()
+            raise BenchmarkComplete()
+
+def getCPUSeconds():
+    """@return The user and system CPU time used by this process."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def getMaxRSSMB():
+    """@return The maximum resident set size of this process in MB."""
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Linux reports KB, macOS reports bytes.
+    if sys.platform == "darwin":
+        return maxRSS / 1E6
+    return maxRSS / 1E3
+
+def main():
+    opts=OptionParser(description="Benchmark the LB2120 collector pipeline using stand-in LB2120 devices and a SQLite database.")
+    addServerOptions(opts)
+    opts.add_option("--samples",  help="The number of samples to store (default=500).", type="int", default=500)
+    opts.add_option("--devices",  help="The number of LB2120 devices to read. More than 1 are read concurrently as the collector --devices option does (default=1).", type="int", default=1)
+    opts.add_option("--psec",     help="The poll period in seconds of each device (default=0.01).", type="float", default=0.01)
+    opts.add_option("--batch",    help="The maximum number of samples written to the database in one insert (default=10).", type="int", default=10)
+    opts.add_option("--bsec",     help="The maximum time in seconds a sample is held before it is written to the database (default=1).", type="float", default=1)
+    opts.add_option("--db",       help="The SQLite database file (default=a temporary file).", default=None)
+    (benchOptions, args) = opts.parse_args()
+
+    collectorOpts = OptionParser()
+    addCollectorOptions(collectorOpts)
+    options = collectorOpts.get_default_values()
+    options.psec = benchOptions.psec
+    options.batch = benchOptions.batch
+    options.bsec = benchOptions.bsec
+    options.resolution = UsageLogger.AUTO_RESOLUTION
+    options.device = None
+
+    os.environ[LB2120.PASSWORD_ENV_VAR] = FakeLB2120.DEFAULT_PASSWORD
+    tempDir = tempfile.TemporaryDirectory()
+    dbFile = benchOptions.db or os.path.join(tempDir.name, "lb2120.db")
+    options.spool = os.path.join(tempDir.name, "lb2120.spool")
+    options.session = os.path.join(tempDir.name, "lb2120_sessions.json")
+    if benchOptions.devices > 1:
+        options.devices = os.path.join(tempDir.name, "devices.json")
+        with open(options.devices, "w") as fd:
+            json.dump([{"id": "lb2120-{}".format(index), "address": "127.0.0.1:{}".format(benchOptions.port+index)}
+                       for index in range(benchOptions.devices)], fd)
+    else:
+        options.address = "127.0.0.1:{}".format(benchOptions.port)
+
+    server = subprocess.Popen([sys.executable, FAKE_LB2120_FILE, "--ports", str(benchOptions.devices)] + getServerArgs(benchOptions), stdout=subprocess.DEVNULL)
+    try:
+        for index in range(benchOptions.devices):
+            waitForPort("127.0.0.1", benchOptions.port+index)
+
+        usageLogger = BenchmarkUsageLogger(BenchmarkUIO(), options, BenchmarkDBConfig(dbFile), benchOptions.samples)
+        try:
+            usageLogger.run()
+        except BenchmarkComplete:
+            pass
+        seconds = usageLogger.stopTime - usageLogger.startTime
+        cpuSeconds = usageLogger.stopCPU - usageLogger.startCPU
+
+    finally:
+        server.terminate()
+        server.wait()
+        tempDir.cleanup()
+
+    latencies = np.array(usageLogger.latencies) * 1000
+    print("Devices:           {} polled every {} seconds".format(benchOptions.devices, benchOptions.psec))
+    print("Batch:             {} rows or {} seconds".format(options.batch, options.bsec))
+    print("Samples stored:    {} in {:.2f} seconds".format(len(latencies), seconds))
+    print("Samples/second:    {:.1f}".format(len(latencies) / seconds))
+    print("Latency (ms):      mean {:.2f}, ".format(latencies.mean()) +
+          ", ".join("P{} {:.2f}".format(p, value) for p, value in zip(LATENCY_PERCENTILES, np.percentile(latencies, LATENCY_PERCENTILES))) +
+          ", max {:.2f}".format(latencies.max()))
+    print("CPU:               {:.2f} seconds ({:.1f}% of one core)".format(cpuSeconds, cpuSeconds / seconds * 100))
+    print("Max RSS:           {:.1f} MB".format(getMaxRSSMB()))
+    print("")
+    for line in usageLogger._metrics.getStageReport():
+        print(line)
+
+if __name__== '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3.8
+
+"""Benchmark of the lb2120 command start up time.
+
+Starts each lb2120 subcommand (imports lb2120 and parses the subcommand
+options) in a new Python process and reports the time taken. This fails
+(exit status 1) if importing lb2120 takes longer than the import time budget
+or if a subcommand imports a module that is only required once it runs
+(E.G plotly, numpy) during start up. Only the subcommands that poll the
+LB2120 may import the modules that the poller uses (E.G asyncio). The slowest imports reported by
+python -X importtime are shown so that a module that breaks the budget can be
+found."""
+
+import  os
+import  sys
+import  json
+import  py_compile
+import  subprocess
+
+from    time import monotonic
+from    optparse import OptionParser
+
+LB2120_PATH         = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+LB2120_FILE         = os.path.join(LB2120_PATH, "lb2120.py")
+#The modules that take a long time to import. No subcommand should import
+#these before it uses them.
+LAZY_MODULES        = ("plotly", "numpy", "pyarrow", "webbot", "selenium", "cryptography", "MySQLdb")
+#The modules that only the subcommands that poll the LB2120 should import.
+POLLER_MODULES      = ("asyncio", "http.client", "http.server", "lb2120lib.poller", "lb2120lib.client", "lb2120lib.servers")
+DEFAULT_BUDGET_MS   = 150
+#The arguments for each subcommand. The legacy options are also checked.
+SUBCOMMAND_ARGS     = (["collect"],
+                       ["plot"],
+                       ["plot", "--offline"],
+                       ["total", "--tperiod", "day"],
+                       ["export"],
+                       ["config"],
+                       ["rollup"],
+                       ["align"],
+                       [],
+                       ["--plot"],
+                       ["--total"])
+
+STARTUP_CODE = """
+import  sys
+import  json
+from    time import perf_counter
+startTime = perf_counter()
+import  lb2120
+importSeconds = perf_counter() - startTime
+subcommand, argList = lb2120.Subcommand.Get(sys.argv[1:])
+options = lb2120.Subcommand.GetOptions(subcommand, argList, lb2120.Subcommand.IsLegacy(sys.argv[1:]))
+usesDBConfig = lb2120.Subcommand.UsesDBConfig(subcommand, options)
+usesPoller = lb2120.Subcommand.IsLegacy(sys.argv[1:]) or lb2120.Subcommand.UsesPoller(subcommand)
+print(json.dumps({"subcommand":     subcommand,
+                  "usesDBConfig":   usesDBConfig,
+                  "usesPoller":     usesPoller,
+                  "importSeconds":  importSeconds,
+                  "startSeconds":   perf_counter() - startTime,
+                  "modules":        sorted(sys.modules.keys())}))
+"""
+
+def startSubcommand(args):
+    """@brief Start a subcommand in a new Python process.
+       @param args The subcommand arguments.
+       @return A tuple containing the dict reported by the process, the
+               process run time and the list of (cumulative us, module)
+               reported by python -X importtime."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([LB2120_PATH] + [path for path in [env.get("PYTHONPATH")] if path])
+    startTime = monotonic()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_CODE] + args,
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    runSeconds = monotonic() - startTime
+    importTimes = []
+    for line in result.stderr.splitlines():
+        #import time: self [us] | cumulative | imported package
+        elems = line.split("|")
+        if line.startswith("import time:") and len(elems) == 3 and elems[1].strip().isdigit():
+            importTimes.append((int(elems[1]), elems[2].rstrip()))
+    return (json.loads(result.stdout), runSeconds, importTimes)
+
+def main():
+    opts=OptionParser(description="Benchmark the start up time of each lb2120 subcommand and check it against an import time budget.")
+    opts.add_option("--budget",   help="The maximum time in milliseconds that importing lb2120 may take (default={}).".format(DEFAULT_BUDGET_MS), type="float", default=DEFAULT_BUDGET_MS)
+    opts.add_option("--runs",     help="The number of times each subcommand is started, the fastest is reported (default=5).", type="int", default=5)
+    opts.add_option("--top",      help="The number of the slowest imports to show (default=10).", type="int", default=10)
+    (benchOptions, args) = opts.parse_args()
+
+    #Measure the start up time with the compiled lb2120 module (as when installed).
+    py_compile.compile(LB2120_FILE)
+
+    failures = []
+    importTimes = []
+    print("{:<28} {:<8} {:>10} {:>10} {:>10}".format("ARGS", "DBCONFIG", "IMPORT ms", "START ms", "RUN ms"))
+    for subcommandArgs in SUBCOMMAND_ARGS:
+        runs = [startSubcommand(subcommandArgs) for _ in range(benchOptions.runs)]
+        report, runSeconds, importTimes = min(runs, key=lambda run: run[0]["importSeconds"])
+        print("{:<28} {:<8} {:>10.1f} {:>10.1f} {:>10.1f}".format(" ".join(subcommandArgs) or "(none)",
+                                                                  "yes" if report["usesDBConfig"] else "no",
+                                                                  report["importSeconds"]*1000,
+                                                                  report["startSeconds"]*1000,
+                                                                  runSeconds*1000))
+        lazyModules = sorted(set(module.split(".")[0] for module in report["modules"]) & set(LAZY_MODULES))
+        if lazyModules:
+            failures.append("{} imported {} during start up.".format(report["subcommand"], ", ".join(lazyModules)))
+        pollerModules = sorted(set(report["modules"]) & set(POLLER_MODULES))
+        if pollerModules and not report["usesPoller"]:
+            failures.append("{} imported {} during start up.".format(" ".join(subcommandArgs), ", ".join(pollerModules)))
+        if report["importSeconds"]*1000 > benchOptions.budget:
+            failures.append("{}: importing lb2120 took {:.1f} ms, the budget is {:.1f} ms.".format(" ".join(subcommandArgs) or "(none)", report["importSeconds"]*1000, benchOptions.budget))
+
+    print("")
+    print("Slowest imports (cumulative ms)")
+    for cumulativeUS, module in sorted(importTimes, reverse=True)[:benchOptions.top]:
+        print("{:>10.1f} {}".format(cumulativeUS/1000, module))
+
+    if failures:
+        print("")
+        for failure in failures:
+            print("FAIL:  {}".format(failure))
+        sys.exit(1)
+
+if __name__== '__main__':
+    main()
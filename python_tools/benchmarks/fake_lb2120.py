@@ -0,0 +1,245 @@
+#!/usr/bin/env python3.8
+
+"""A stand-in for the Netgear LB2120 web interface used by the benchmarks.
+
+Serves the index.html login page, the /Forms/config login form and
+/api/model.json on one or more local TCP ports so that the collector can be
+benchmarked without a modem. Each port behaves as a separate LB2120 with its
+own byte counters. The model.json payload size, the response latency and the
+byte counter behaviour (wraps and resets) can be set."""
+
+import  os
+import  json
+import  uuid
+import  socket
+
+from    time import sleep, monotonic
+from    threading import Thread, Lock
+from    optparse import OptionParser
+from    urllib.parse import parse_qs
+from    http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_JSON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.json")
+
+class FakeLB2120Handler(BaseHTTPRequestHandler):
+    """@brief Responsible for answering the requests sent to one FakeLB2120 port."""
+
+    protocol_version    = "HTTP/1.1"
+    #The headers and body are written separately so Nagle's algorithm would
+    #add the TCP delayed ACK time to each response.
+    disable_nagle_algorithm = True
+    INDEX_PAGE          = "/index.html"
+    LOGIN_FORM          = "/Forms/config"
+    MODEL_JSON          = "/api/model.json"
+    SESSION_COOKIE      = "sessionId"
+
+    def log_message(self, format, *args):
+        """@brief Requests are not logged to the console."""
+        pass
+
+    def _send(self, status, body, contentType="text/html", cookie=None):
+        """@brief Send a response.
+           @param status The HTTP status code.
+           @param body The response body (str).
+           @param contentType The response content type.
+           @param cookie A Set-Cookie header value or None."""
+        content = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(content)))
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _getSessionID(self):
+        """@return The session ID sent in the request cookie or None."""
+        for cookie in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == FakeLB2120Handler.SESSION_COOKIE:
+                return value
+        return None
+
+    def do_GET(self):
+        """@brief Serve the login page and model.json."""
+        fakeLB2120 = self.server.fakeLB2120
+        fakeLB2120.delay()
+        path = self.path.split("?")[0]
+        if path == FakeLB2120Handler.INDEX_PAGE:
+            sessionID = fakeLB2120.createSession()
+            self._send(200,
+                       '<html><form><input type="hidden" name="token" value="{}"></form></html>'.format(fakeLB2120.TOKEN),
+                       cookie="{}={}; Path=/".format(FakeLB2120Handler.SESSION_COOKIE, sessionID))
+        elif path == FakeLB2120Handler.MODEL_JSON:
+            port = self.server.server_address[1]
+            self._send(200, fakeLB2120.getModelJSON(port, self._getSessionID()), "application/json")
+        else:
+            self._send(404, "Not found")
+
+    def do_POST(self):
+        """@brief Handle the login form."""
+        fakeLB2120 = self.server.fakeLB2120
+        fakeLB2120.delay()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        if self.path.split("?")[0] != FakeLB2120Handler.LOGIN_FORM:
+            self._send(404, "Not found")
+            return
+        form = parse_qs(body)
+        if form.get("token", [None])[0] == fakeLB2120.TOKEN and form.get("session.password", [None])[0] == fakeLB2120.password:
+            fakeLB2120.login(self._getSessionID())
+        self._send(200, "OK")
+
+class FakeLB2120(object):
+    """@brief Responsible for serving one or more stand-in LB2120 web interfaces."""
+
+    TOKEN               = "1234567890"
+    DEFAULT_PORT        = 18080
+    DEFAULT_PASSWORD    = "password"
+    DEFAULT_STEP_BYTES  = 1000000
+    COUNTER_WRAP_VALUE  = 2**32
+    ADMIN_ROLE          = "Admin"
+    GUEST_ROLE          = "Guest"
+
+    def __init__(self, password=DEFAULT_PASSWORD, padBytes=0, latencySeconds=0, stepBytes=DEFAULT_STEP_BYTES, resetReads=0, wrap=False):
+        """@brief Constructor
+           @param password The login password.
+           @param padBytes The number of bytes of padding added to model.json.
+           @param latencySeconds The time to wait before each response.
+           @param stepBytes The number of bytes the RX counter increases by on each model.json read.
+                            The TX counter increases by a tenth of this.
+           @param resetReads If not 0 the byte counters are reset (as when the LB2120 reboots) after this number of reads.
+           @param wrap If True the byte counters start just below and wrap at 2^32."""
+        self.password       = password
+        self._latency       = latencySeconds
+        self._stepBytes     = stepBytes
+        self._resetReads    = resetReads
+        self._wrap          = wrap
+        self._lock          = Lock()
+        self._sessionSet    = set()
+        self._loginSet      = set()
+        self._readsDict     = {}
+        self._servers       = []
+        with open(MODEL_JSON_FILE) as fd:
+            self._model     = json.load(fd)
+        if padBytes:
+            self._model["padding"] = "x" * padBytes
+
+    def delay(self):
+        """@brief Wait for the response latency."""
+        if self._latency:
+            sleep(self._latency)
+
+    def createSession(self):
+        """@return The ID of a new session."""
+        sessionID = uuid.uuid4().hex
+        with self._lock:
+            self._sessionSet.add(sessionID)
+        return sessionID
+
+    def login(self, sessionID):
+        """@brief Login a session.
+           @param sessionID The session ID."""
+        with self._lock:
+            if sessionID in self._sessionSet:
+                self._loginSet.add(sessionID)
+
+    def getCounters(self, reads):
+        """@param reads The number of model.json reads since the server started.
+           @return A tuple of the RX and TX byte counters for the read."""
+        if self._resetReads:
+            reads = reads % self._resetReads
+        rxBytes = reads * self._stepBytes
+        txBytes = reads * self._stepBytes // 10
+        if self._wrap:
+            start = FakeLB2120.COUNTER_WRAP_VALUE - 100 * self._stepBytes
+            rxBytes = (start + rxBytes) % FakeLB2120.COUNTER_WRAP_VALUE
+            txBytes = (start + txBytes) % FakeLB2120.COUNTER_WRAP_VALUE
+        return (rxBytes, txBytes)
+
+    def getModelJSON(self, port, sessionID):
+        """@param port The port the request was received on.
+           @param sessionID The session ID sent with the request.
+           @return The model.json text."""
+        with self._lock:
+            reads = self._readsDict.get(port, 0) + 1
+            self._readsDict[port] = reads
+            loggedIn = sessionID in self._loginSet
+        rxBytes, txBytes = self.getCounters(reads)
+        model = dict(self._model)
+        model["wwan"] = dict(model["wwan"], dataTransferredRx=rxBytes, dataTransferredTx=txBytes)
+        model["session"] = dict(model.get("session", {}), userRole=FakeLB2120.ADMIN_ROLE if loggedIn else FakeLB2120.GUEST_ROLE)
+        return json.dumps(model, separators=(",", ":"))
+
+    def start(self, port=DEFAULT_PORT, portCount=1, address="127.0.0.1"):
+        """@brief Start serving on consecutive TCP ports.
+           @param port The first TCP port.
+           @param portCount The number of ports (stand-in LB2120 devices).
+           @param address The interface address to bind to."""
+        for devicePort in range(port, port+portCount):
+            server = ThreadingHTTPServer((address, devicePort), FakeLB2120Handler)
+            server.daemon_threads = True
+            server.fakeLB2120 = self
+            Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+
+    def shutdown(self):
+        """@brief Stop serving."""
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+def waitForPort(address, port, timeout=10):
+    """@brief Wait for a server to accept connections.
+       @param address The server address.
+       @param port The server TCP port.
+       @param timeout The maximum time to wait in seconds."""
+    deadline = monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((address, port), timeout=1).close()
+            return
+        except OSError:
+            if monotonic() > deadline:
+                raise
+            sleep(0.05)
+
+def addServerOptions(opts):
+    """@brief Add the options that define the FakeLB2120 behaviour.
+       @param opts An OptionParser instance."""
+    opts.add_option("--port",     help="The first TCP port to serve on (default={}).".format(FakeLB2120.DEFAULT_PORT), type="int", default=FakeLB2120.DEFAULT_PORT)
+    opts.add_option("--pad",      help="The number of bytes of padding added to model.json (default=0).", type="int", default=0)
+    opts.add_option("--latency",  help="The time in seconds to wait before each response (default=0).", type="float", default=0)
+    opts.add_option("--step",     help="The number of bytes the RX counter increases by per read (default={}).".format(FakeLB2120.DEFAULT_STEP_BYTES), type="int", default=FakeLB2120.DEFAULT_STEP_BYTES)
+    opts.add_option("--reset",    help="Reset the byte counters after this number of reads. 0 = never (default=0).", type="int", default=0)
+    opts.add_option("--wrap",     help="Start the byte counters just below 2^32 so that they wrap.", action="store_true", default=False)
+
+def getServerArgs(options):
+    """@param options The options added by addServerOptions().
+       @return The command line arguments that start a FakeLB2120 with the same behaviour."""
+    args = ["--port", str(options.port), "--pad", str(options.pad), "--latency", str(options.latency),
+            "--step", str(options.step), "--reset", str(options.reset)]
+    if options.wrap:
+        args.append("--wrap")
+    return args
+
+def main():
+    opts=OptionParser(description="Serve stand-in Netgear LB2120 web interfaces for benchmarking.")
+    addServerOptions(opts)
+    opts.add_option("--ports",    help="The number of consecutive ports (LB2120 devices) to serve (default=1).", type="int", default=1)
+    opts.add_option("--password", help="The login password (default={}).".format(FakeLB2120.DEFAULT_PASSWORD), default=FakeLB2120.DEFAULT_PASSWORD)
+    (options, args) = opts.parse_args()
+
+    fakeLB2120 = FakeLB2120(options.password, options.pad, options.latency, options.step, options.reset, options.wrap)
+    fakeLB2120.start(options.port, options.ports)
+    print("Serving {} LB2120 on 127.0.0.1:{}-{}".format(options.ports, options.port, options.port+options.ports-1), flush=True)
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fakeLB2120.shutdown()
+
+if __name__== '__main__':
+    main()
@@ -0,0 +1,13 @@
+#The lb2120 and lb2120_mbps commands. Each module holds one part of the program.
+
+#stats     The LB2120Stats sample, the LB2120_STATS table and the StatsColumns read from it.
+#storage   The MySQL and SQLite storage backends, the Parquet store and the database configs.
+#rollup    The minute, hour and day rollup tables.
+#client    The LB2120 web API clients, the login session cache and the model.json extractor.
+#metrics   The collector metrics, the profiler and the circuit breakers.
+#servers   The Prometheus metrics, dashboard and Aligner app status servers.
+#history   The recent samples held in memory.
+#pipeline  The sample queue, batched writes and the spool used while the database is unavailable.
+#poller    The LB2120 pollers (one LB2120, many LB2120 devices and the antenna aligner).
+#usage     The UsageLogger that records, plots, totals and exports the data.
+#cli       The lb2120 command line subcommands and options.
@@ -0,0 +1,288 @@
+import  sys
+
+from    optparse import OptionParser, SUPPRESS_HELP
+
+from    p3lib.uio import UIO
+
+from    .stats import StatsTable
+from    .storage import ParquetStore, DBClientConfig
+from    .history import SampleRing
+from    .pipeline import SampleSpool, SampleQueue, BatchedRowWriter
+from    .usage import UsageLogger
+
+#The poller, client and servers modules import asyncio, http.client and
+#http.server which take a long time to import so they are only imported by the
+#options of the subcommands that poll the LB2120 (see Subcommand.POLLER_OPTIONS)
+#and by the UsageLogger methods that run them.
+
+def addWriterOptions(opts):
+    """@brief Add the command line options that set up the database writer and
+              the recent samples held in memory. The UsageLogger reads these
+              whichever subcommand is used.
+       @param opts An OptionParser instance."""
+    opts.add_option("--batch",    help="The maximum number of samples written to the database in one insert (default={}).".format(BatchedRowWriter.DEFAULT_MAX_ROWS), type="int", default=BatchedRowWriter.DEFAULT_MAX_ROWS)
+    opts.add_option("--bsec",     help="The maximum time in seconds a sample is held before it is written to the database (default={}).".format(BatchedRowWriter.DEFAULT_MAX_LATENCY_SECONDS), type="int", default=BatchedRowWriter.DEFAULT_MAX_LATENCY_SECONDS)
+    opts.add_option("--qsize",    help="The maximum number of samples held in the queue to the database writer (default={}).".format(SampleQueue.DEFAULT_MAX_SIZE), type="int", default=SampleQueue.DEFAULT_MAX_SIZE)
+    opts.add_option("--qpolicy",  help="What happens to a sample read when the queue to the database writer is full. block = the poller waits, drop = the oldest queued sample is dropped, coalesce = the sample is combined with the newest queued sample (default={}).".format(SampleQueue.DEFAULT_POLICY),
+                    type="choice", choices=list(SampleQueue.POLICIES), default=SampleQueue.DEFAULT_POLICY)
+    opts.add_option("--history",  help="The number of recent samples held in memory for each LB2120 (default={}).".format(SampleRing.DEFAULT_CAPACITY), type="int", default=SampleRing.DEFAULT_CAPACITY)
+    opts.add_option("--windows",  help="A comma separated list of the time windows (seconds) over which the mean/min/max of the recent samples are shown (default={}).".format(",".join(str(windowSeconds) for windowSeconds in SampleRing.DEFAULT_WINDOWS)), default=",".join(str(windowSeconds) for windowSeconds in SampleRing.DEFAULT_WINDOWS))
+    opts.add_option("--wsec",     help="Show the mean/max over each --windows time window on the console at most once every this many seconds for each LB2120. 0 = not shown (default={}).".format(SampleRing.DEFAULT_SHOW_SECONDS), type="int", default=SampleRing.DEFAULT_SHOW_SECONDS)
+    opts.add_option("--spool",    help="The file that samples are saved to while the database is unavailable (default={}).".format(SampleSpool.DEFAULT_SPOOL_FILE), default=SampleSpool.DEFAULT_SPOOL_FILE)
+    opts.add_option("--profile",  help="Profile the collector until this number of samples have been stored and then show where the time was spent.", type="int", default=None)
+
+def addCollectorOptions(opts):
+    """@brief Add the command line options used when collecting data from the LB2120.
+       @param opts An OptionParser instance."""
+    from    .client import SessionCache
+    from    .servers import DashboardServer, StatusResponder
+    from    .poller import LB2120
+    opts.add_option("--address",  help="The address of the Netgear LB2120 4G modem (default={}).".format(LB2120.DEFAULT_ADDRESS), default=LB2120.DEFAULT_ADDRESS)
+    opts.add_option("--psec",     help="The poll period in seconds (default={}).".format(LB2120.POLL_DELAY_SECONDS), type="int", default=LB2120.POLL_DELAY_SECONDS)
+    addWriterOptions(opts)
+    opts.add_option("--session",  help="The file that the LB2120 login sessions are saved to so that they are reused (rather than logging in) when the collector is restarted. Set to an empty string to only hold the sessions in memory (default={}).".format(SessionCache.DEFAULT_SESSION_FILE), default=SessionCache.DEFAULT_SESSION_FILE)
+    opts.add_option("--browser",  help="Read the LB2120 web interface using a Chrome browser rather than the HTTP API client.", action="store_true", default=False)
+    opts.add_option("--devices",  help="A JSON file listing many LB2120 devices to read concurrently in place of --address. Each sample is stored with the {} ID of the device it was read from.".format(StatsTable.DEVICE), default=None)
+    opts.add_option("--status",   help="Answer the status requests from the Aligner Android app with the latest LB2120 RX power.", action="store_true", default=False)
+    opts.add_option("--sport",    help="The UDP port that the Aligner app sends status requests to (default={}).".format(StatusResponder.DEFAULT_PORT), type="int", default=StatusResponder.DEFAULT_PORT)
+    opts.add_option("--metrics",  help="Serve the latest LB2120 stats and the collector metrics for Prometheus on http://<host>:<port>/metrics using this TCP port.", type="int", default=None)
+    opts.add_option("--dashboard", help="Serve a live plot of the samples as they are read on http://<host>:<port>/ using this TCP port.", type="int", default=None)
+    opts.add_option("--dpoints",  help="The maximum number of points shown in each --dashboard trace (default={}).".format(DashboardServer.DEFAULT_POINTS), type="int", default=DashboardServer.DEFAULT_POINTS)
+    opts.add_option("--config",   help="Configure the database config.", action="store_true", default=False)
+    opts.add_option("--debug",    help="Enable debugging.", action="store_true", default=False)
+
+def addReadOptions(opts):
+    """@brief Add the command line options used when reading the data stored previously.
+       @param opts An OptionParser instance."""
+    opts.add_option("--resolution", help="The resolution of the data read. auto selects the coarsest resolution that gives at least {} points (default={}).".format(UsageLogger.MIN_AUTO_ROWS, UsageLogger.AUTO_RESOLUTION),
+                                    type="choice", choices=[UsageLogger.AUTO_RESOLUTION, UsageLogger.RAW_RESOLUTION]+[rollupTable.resolution for rollupTable in UsageLogger.ROLLUP_TABLES], default=UsageLogger.AUTO_RESOLUTION)
+    opts.add_option("--offline",  help="Read the data from the --store folder rather than the database.", action="store_true", default=False)
+    opts.add_option("--device",   help="Only read the data from the device with this ID (see --devices).", default=None)
+
+def addStoreOptions(opts):
+    """@brief Add the command line options that select the exported Parquet files.
+       @param opts An OptionParser instance."""
+    opts.add_option("--store",    help="The folder holding the exported Parquet files (default={}).".format(ParquetStore.DEFAULT_PATH), default=ParquetStore.DEFAULT_PATH)
+
+def addPlotOptions(opts):
+    """@brief Add the command line options used when plotting the data stored previously.
+       @param opts An OptionParser instance."""
+    opts.add_option("--cplot",    help="Configure the period to read before plotting.", action="store_true", default=False)
+    opts.add_option("--points",   help="The maximum number of points plotted per trace. Peaks are kept when the data is reduced (default={}).".format(UsageLogger.DEFAULT_MAX_PLOT_POINTS), type="int", default=UsageLogger.DEFAULT_MAX_PLOT_POINTS)
+
+def addTotalOptions(opts):
+    """@brief Add the command line options used when totalling the data stored previously.
+       @param opts An OptionParser instance."""
+    opts.add_option("--tperiod",  help="Break the total data down per day or per week.", type="choice", choices=["day", "week"], default=None)
+
+def addAlignOptions(opts):
+    """@brief Add the command line options used when aligning an antenna.
+       @param opts An OptionParser instance."""
+    from    .poller import LB2120Aligner
+    opts.add_option("--asec",     help="The poll period in seconds (default={}).".format(LB2120Aligner.DEFAULT_POLL_SECONDS), type="float", default=LB2120Aligner.DEFAULT_POLL_SECONDS)
+    opts.add_option("--alpha",    help="The smoothing factor (0 - 1). 1 = no smoothing (default={}).".format(LB2120Aligner.DEFAULT_ALPHA), type="float", default=LB2120Aligner.DEFAULT_ALPHA)
+
+def addDebugOptions(opts):
+    """@brief Add the command line options used by every subcommand.
+       @param opts An OptionParser instance."""
+    opts.add_option("--debug",    help="Enable debugging.", action="store_true", default=False)
+
+class Subcommand(object):
+    """@brief Responsible for selecting the lb2120 subcommand and parsing only
+              the command line options that it uses."""
+
+    COLLECT         = "collect"
+    PLOT            = "plot"
+    TOTAL           = "total"
+    EXPORT          = "export"
+    CONFIG          = "config"
+    ROLLUP          = "rollup"
+    ALIGN           = "align"
+
+    #The description and the functions that add the options of each subcommand.
+    #addCollectorOptions() adds the --debug option.
+    OPTIONS = {
+        COLLECT:    ("Read (HTML scrape) the internet usage from a Netgear LB2120 4G modem and record the results in a database. "\
+                     "This is the default subcommand.",
+                     (addCollectorOptions,)),
+        PLOT:       ("Plot data stored previously in the database.",
+                     (addReadOptions, addStoreOptions, addPlotOptions, addDebugOptions)),
+        TOTAL:      ("Calculate the total data over a period of time.",
+                     (addReadOptions, addStoreOptions, addTotalOptions, addDebugOptions)),
+        EXPORT:     ("Export the records added to the database since the last export to Parquet files in the --store folder.",
+                     (addStoreOptions, addDebugOptions)),
+        CONFIG:     ("Configure the database config.",
+                     (addDebugOptions,)),
+        ROLLUP:     ("Rebuild the rollup tables from the samples stored previously in the database.",
+                     (addDebugOptions,)),
+        ALIGN:      ("Read the LB2120 signal strength at a high rate to align an antenna. Nothing is stored in the database. "\
+                     "Use with --status to send the RX power to the Aligner app.",
+                     (addCollectorOptions, addAlignOptions))
+    }
+    #The options that import the poller, client and servers modules.
+    POLLER_OPTIONS  = (addCollectorOptions, addAlignOptions)
+
+    #Before subcommands were added these options selected what was done.
+    #They are checked in this order and are still accepted. When one is used
+    #in place of a subcommand every option is accepted as it was then.
+    LEGACY_OPTIONS = (("--config",  CONFIG),
+                      ("--rollup",  ROLLUP),
+                      ("--align",   ALIGN),
+                      ("--export",  EXPORT),
+                      ("--total",   TOTAL),
+                      ("--plot",    PLOT),
+                      ("--cplot",   PLOT))
+
+    @staticmethod
+    def Get(argList):
+        """@brief Get the subcommand selected on the command line.
+           @param argList The command line arguments (excluding the program name).
+           @return A tuple containing the subcommand and the remaining arguments."""
+        if argList and argList[0] in Subcommand.OPTIONS:
+            return (argList[0], argList[1:])
+        for option, subcommand in Subcommand.LEGACY_OPTIONS:
+            if option in argList:
+                return (subcommand, argList)
+        return (Subcommand.COLLECT, argList)
+
+    @staticmethod
+    def IsLegacy(argList):
+        """@param argList The command line arguments (excluding the program name).
+           @return True if a legacy option is used in place of a subcommand."""
+        if argList and argList[0] in Subcommand.OPTIONS:
+            return False
+        return any(option in argList for option, _ in Subcommand.LEGACY_OPTIONS)
+
+    @staticmethod
+    def GetAllOptionParser(pollerOptions=True):
+        """@param pollerOptions If False the options that import the poller
+                                (see POLLER_OPTIONS) are left out and only the
+                                writer options of the collect subcommand are
+                                added (see addWriterOptions()).
+           @return An OptionParser holding the options of every subcommand."""
+        opts=OptionParser(conflict_handler="resolve")
+        addedSet = set()
+        if not pollerOptions:
+            addWriterOptions(opts)
+            addedSet.update(Subcommand.POLLER_OPTIONS)
+        for _, addOptionsList in Subcommand.OPTIONS.values():
+            for addOptions in addOptionsList:
+                if addOptions not in addedSet:
+                    addOptions(opts)
+                    addedSet.add(addOptions)
+        return opts
+
+    @staticmethod
+    def UsesPoller(subcommand):
+        """@param subcommand The subcommand.
+           @return True if the subcommand polls the LB2120."""
+        _, addOptionsList = Subcommand.OPTIONS[subcommand]
+        return any(addOptions in Subcommand.POLLER_OPTIONS for addOptions in addOptionsList)
+
+    @staticmethod
+    def GetOptionParser(subcommand, legacy=False):
+        """@param subcommand The subcommand.
+           @param legacy If True the parser holds the options of every
+                         subcommand (see LEGACY_OPTIONS).
+           @return An OptionParser holding the options of the subcommand."""
+        description, addOptionsList = Subcommand.OPTIONS[subcommand]
+        if legacy:
+            opts=Subcommand.GetAllOptionParser()
+        else:
+            opts=OptionParser(usage="%prog {} [options]".format(subcommand),
+                              version="1.0",
+                              description=description,
+                              epilog="Subcommands: {}. Use lb2120 <subcommand> --help to show the options of a subcommand.".format(", ".join(Subcommand.OPTIONS.keys())))
+            for addOptions in addOptionsList:
+                addOptions(opts)
+        #The legacy options are accepted but not shown.
+        for option, legacySubcommand in Subcommand.LEGACY_OPTIONS:
+            if (legacy or legacySubcommand == subcommand) and not opts.has_option(option):
+                opts.add_option(option, help=SUPPRESS_HELP, action="store_true", default=False)
+        return opts
+
+    @staticmethod
+    def GetOptions(subcommand, argList, legacy=False):
+        """@brief Parse the command line options of a subcommand. UsageLogger
+                  reads the options of every subcommand so those that the
+                  subcommand does not have are set to their default values.
+                  The options of the subcommands that poll the LB2120 are
+                  left out of the others (see POLLER_OPTIONS).
+           @param subcommand The subcommand.
+           @param argList The command line arguments following the subcommand.
+           @param legacy If True the options of every subcommand are accepted (see IsLegacy()).
+           @return The options."""
+        subcommandOpts = Subcommand.GetOptionParser(subcommand, legacy)
+        (subcommandOptions, args) = subcommandOpts.parse_args(argList)
+        if args:
+            subcommandOpts.error("{} is not a subcommand or option.".format(args[0]))
+        options = Subcommand.GetAllOptionParser(legacy or Subcommand.UsesPoller(subcommand)).get_default_values()
+        for option, _ in Subcommand.LEGACY_OPTIONS:
+            setattr(options, option[2:], False)
+        for name, value in vars(subcommandOptions).items():
+            setattr(options, name, value)
+        options.total = subcommand == Subcommand.TOTAL
+        return options
+
+    @staticmethod
+    def UsesDBConfig(subcommand, options):
+        """@param subcommand The subcommand.
+           @param options The subcommand options.
+           @return True if the subcommand reads the (encrypted) database config."""
+        #The --config option of the collect and align subcommands configures it.
+        if subcommand == Subcommand.CONFIG or options.config:
+            return True
+        if subcommand == Subcommand.ALIGN:
+            return False
+        if subcommand in (Subcommand.PLOT, Subcommand.TOTAL):
+            return not options.offline
+        return True
+
+def main():
+    uio = UIO()
+    options = None
+
+    try:
+        subcommand, argList = Subcommand.Get(sys.argv[1:])
+        options = Subcommand.GetOptions(subcommand, argList, Subcommand.IsLegacy(sys.argv[1:]))
+        uio.enableDebug(options.debug)
+
+        dbClientConfig = None
+        if Subcommand.UsesDBConfig(subcommand, options):
+            dbClientConfig = DBClientConfig(uio, DBClientConfig.CFG_FILENAME)
+
+        if subcommand == Subcommand.CONFIG or options.config:
+            dbClientConfig.configure()
+
+        else:
+            usageLogger = UsageLogger(uio, options, dbClientConfig)
+
+            if subcommand == Subcommand.ROLLUP:
+                usageLogger.rebuildRollups()
+
+            elif subcommand == Subcommand.ALIGN:
+                usageLogger.align()
+
+            elif subcommand == Subcommand.EXPORT:
+                usageLogger.export()
+
+            elif subcommand == Subcommand.TOTAL:
+                usageLogger.total()
+
+            elif subcommand == Subcommand.PLOT:
+                usageLogger.plot()
+            else:
+                usageLogger.run()
+
+    #If the program throws a system exit exception
+    except SystemExit:
+      pass
+    #Don't print error information if CTRL C pressed
+    except KeyboardInterrupt:
+      pass
+    except Exception as error:
+     if options and options.debug:
+       raise
+
+     else:
+       uio.error(error)
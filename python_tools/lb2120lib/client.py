@@ -0,0 +1,511 @@
+import  os
+import  re
+import  json
+import  asyncio
+import  http.client
+
+from    threading import Lock
+from    http.cookies import SimpleCookie
+from    urllib.parse import urlencode
+
+#webbot takes a long time to import and is only used with --browser so it
+#is imported by the code that uses it.
+
+class LB2120AuthError(Exception):
+    """@brief Raised when the LB2120 rejects our login or our session has expired."""
+    pass
+
+class LB2120HTTPClient(object):
+    """@brief Responsible for reading the LB2120 web API directly over a single
+              keep-alive HTTP connection. The session cookie issued at login is
+              held and sent with every request so no browser is required."""
+
+    INDEX_PAGE          = "/index.html"
+    LOGIN_FORM          = "/Forms/config"
+    MODEL_JSON          = "/api/model.json?internalapi=1&x=11228"
+    TIMEOUT_SECONDS     = 10
+    GUEST_ROLE          = "Guest"
+    TOKEN_REGEX         = re.compile(r'name="token" value="([^"]*)"')
+
+    @staticmethod
+    def IsGuest(jsonText):
+        """@param jsonText The model.json text.
+           @return True if model.json was read without a logged in session."""
+        return json.loads(jsonText).get('session', {}).get('userRole') == LB2120HTTPClient.GUEST_ROLE
+
+    def __init__(self, address, password, timeout=TIMEOUT_SECONDS):
+        """@brief Constructor
+           @param address The address of the LB2120 4G modem.
+           @param password The LB2120 web interface password.
+           @param timeout The socket timeout in seconds."""
+        self._address   = address
+        self._password  = password
+        self._timeout   = timeout
+        self._conn      = None
+        self._cookies   = {}
+        #True until model.json has been read using a session passed to setSession().
+        self._checkSession = False
+
+    def _getConnection(self):
+        """@return The HTTPConnection to the LB2120, created if required."""
+        if not self._conn:
+            self._conn = http.client.HTTPConnection(self._address, timeout=self._timeout)
+        return self._conn
+
+    def _request(self, method, path, body=None, contentType=None):
+        """@brief Send a request to the LB2120 and read the response.
+           @param method The HTTP method (GET or POST).
+           @param path The path of the resource on the LB2120.
+           @param body The request body or None.
+           @param contentType The request body content type or None.
+           @return A tuple containing the HTTP status code and the response body (bytes)."""
+        headers = {"Connection": "keep-alive"}
+        if self._cookies:
+            headers["Cookie"] = "; ".join("{}={}".format(key, value) for key, value in self._cookies.items())
+        if contentType:
+            headers["Content-Type"] = contentType
+
+        #If the LB2120 has closed an idle keep-alive connection retry once on a new connection.
+        attempt = 0
+        while True:
+            conn = self._getConnection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                attempt = attempt + 1
+                if attempt > 1:
+                    raise
+
+        for setCookie in response.msg.get_all("Set-Cookie") or []:
+            for key, morsel in SimpleCookie(setCookie).items():
+                self._cookies[key] = morsel.value
+
+        if response.will_close:
+            self.close()
+
+        return (response.status, content)
+
+    def _getToken(self, indexPage):
+        """@brief Get the security token that must be sent with the login form.
+           @param indexPage The content of the LB2120 index.html page.
+           @return The security token."""
+        match = LB2120HTTPClient.TOKEN_REGEX.search(indexPage.decode("utf-8", "replace"))
+        if match:
+            return match.group(1)
+        #Fall back to the token held in the session section of model.json
+        data = json.loads(self.getModelJSON())
+        return data['session']['secToken']
+
+    def getSession(self):
+        """@return The cookies of the session (a dict) to pass to setSession()
+                   to reuse the session without logging in."""
+        return dict(self._cookies)
+
+    def setSession(self, cookies):
+        """@brief Use a session from an earlier login in place of logging in.
+                  If the LB2120 no longer accepts the session the next
+                  getModelJSON() raises a LB2120AuthError.
+           @param cookies The cookies returned by getSession().
+           @return True as the session is used."""
+        self._cookies = dict(cookies)
+        self._checkSession = True
+        return True
+
+    def login(self):
+        """@brief Login to the LB2120 web interface."""
+        self._cookies = {}
+        self._checkSession = False
+        status, content = self._request("GET", LB2120HTTPClient.INDEX_PAGE)
+        if status != 200:
+            raise Exception("Failed to read {} from {} (HTTP status = {})".format(LB2120HTTPClient.INDEX_PAGE, self._address, status))
+
+        body = urlencode({"session.password": self._password, "token": self._getToken(content)})
+        status, content = self._request("POST", LB2120HTTPClient.LOGIN_FORM, body, "application/x-www-form-urlencoded")
+        if status >= 400:
+            raise LB2120AuthError("Failed to login to {} (HTTP status = {})".format(self._address, status))
+
+        if LB2120HTTPClient.IsGuest(self.getModelJSON()):
+            raise LB2120AuthError("Failed to login to {}. Check the password.".format(self._address))
+
+    def getModelJSON(self):
+        """@brief Read the model.json document from the LB2120.
+           @return The model.json text."""
+        status, content = self._request("GET", LB2120HTTPClient.MODEL_JSON)
+        if status in (401, 403):
+            raise LB2120AuthError("{} rejected the session (HTTP status = {})".format(self._address, status))
+        if status != 200:
+            raise Exception("Failed to read model.json from {} (HTTP status = {})".format(self._address, status))
+        jsonText = content.decode("utf-8")
+        #An expired session is not rejected, model.json is read as a guest.
+        if self._checkSession:
+            if LB2120HTTPClient.IsGuest(jsonText):
+                raise LB2120AuthError("{} did not accept the saved session.".format(self._address))
+            self._checkSession = False
+        return jsonText
+
+    def close(self):
+        """@brief Close the connection to the LB2120."""
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+class AsyncLB2120HTTPClient(object):
+    """@brief Responsible for reading the LB2120 web API over a single
+              keep-alive HTTP connection using asyncio streams so that many
+              LB2120 devices can be read concurrently from one event loop.
+              This follows the same login sequence as LB2120HTTPClient."""
+
+    def __init__(self, address, password, timeout=LB2120HTTPClient.TIMEOUT_SECONDS):
+        """@brief Constructor
+           @param address The address of the LB2120 4G modem.
+           @param password The LB2120 web interface password.
+           @param timeout The request timeout in seconds."""
+        self._address   = address
+        self._password  = password
+        self._timeout   = timeout
+        self._reader    = None
+        self._writer    = None
+        self._cookies   = {}
+        #True until model.json has been read using a session passed to setSession().
+        self._checkSession = False
+
+    async def _getConnection(self):
+        """@return A tuple containing the StreamReader and StreamWriter
+                   connected to the LB2120, connecting if required."""
+        if not self._writer:
+            #As with http.client the address may include the port.
+            host, sep, port = self._address.rpartition(":")
+            if not sep or not port.isdigit():
+                host, port = self._address, http.client.HTTP_PORT
+            self._reader, self._writer = await asyncio.open_connection(host, int(port))
+        return (self._reader, self._writer)
+
+    async def _readResponse(self, reader):
+        """@brief Read a HTTP response.
+           @param reader The StreamReader connected to the LB2120.
+           @return A tuple containing the HTTP status code, a list of the
+                   Set-Cookie header values, the response body (bytes) and
+                   True if the LB2120 will close the connection."""
+        statusLine = await reader.readline()
+        if not statusLine:
+            raise ConnectionError("{} closed the connection.".format(self._address))
+        version, status = statusLine.split(None, 2)[:2]
+        status = int(status)
+
+        headerDict = {}
+        setCookies = []
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            value = value.strip()
+            if name == "set-cookie":
+                setCookies.append(value)
+            headerDict[name] = value
+
+        willClose = headerDict.get("connection", "").lower() == "close" or version == b"HTTP/1.0"
+        if headerDict.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    #Skip any trailer
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b"".join(chunks)
+        elif "content-length" in headerDict:
+            content = await reader.readexactly(int(headerDict["content-length"]))
+        else:
+            content = await reader.read()
+            willClose = True
+
+        return (status, setCookies, content, willClose)
+
+    async def _request(self, method, path, body=None, contentType=None):
+        """@brief Send a request to the LB2120 and read the response.
+           @param method The HTTP method (GET or POST).
+           @param path The path of the resource on the LB2120.
+           @param body The request body or None.
+           @param contentType The request body content type or None.
+           @return A tuple containing the HTTP status code and the response body (bytes)."""
+        lines = ["{} {} HTTP/1.1".format(method, path),
+                 "Host: {}".format(self._address),
+                 "Connection: keep-alive"]
+        if self._cookies:
+            lines.append("Cookie: " + "; ".join("{}={}".format(key, value) for key, value in self._cookies.items()))
+        bodyBytes = body.encode("utf-8") if body else b""
+        if contentType:
+            lines.append("Content-Type: {}".format(contentType))
+        if bodyBytes or method == "POST":
+            lines.append("Content-Length: {}".format(len(bodyBytes)))
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + bodyBytes
+
+        #If the LB2120 has closed an idle keep-alive connection retry once on a new connection.
+        attempt = 0
+        while True:
+            try:
+                reader, writer = await asyncio.wait_for(self._getConnection(), self._timeout)
+                writer.write(request)
+                await writer.drain()
+                status, setCookies, content, willClose = await asyncio.wait_for(self._readResponse(reader), self._timeout)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                attempt = attempt + 1
+                if attempt > 1:
+                    raise
+            except:
+                #The connection is left part way through a response.
+                self.close()
+                raise
+
+        for setCookie in setCookies:
+            for key, morsel in SimpleCookie(setCookie).items():
+                self._cookies[key] = morsel.value
+
+        if willClose:
+            self.close()
+
+        return (status, content)
+
+    def getSession(self):
+        """@return The cookies of the session (see LB2120HTTPClient.getSession())."""
+        return dict(self._cookies)
+
+    def setSession(self, cookies):
+        """@brief Use a session from an earlier login in place of logging in
+                  (see LB2120HTTPClient.setSession()).
+           @param cookies The cookies returned by getSession().
+           @return True as the session is used."""
+        self._cookies = dict(cookies)
+        self._checkSession = True
+        return True
+
+    async def login(self):
+        """@brief Login to the LB2120 web interface."""
+        self._cookies = {}
+        self._checkSession = False
+        status, content = await self._request("GET", LB2120HTTPClient.INDEX_PAGE)
+        if status != 200:
+            raise Exception("Failed to read {} from {} (HTTP status = {})".format(LB2120HTTPClient.INDEX_PAGE, self._address, status))
+
+        match = LB2120HTTPClient.TOKEN_REGEX.search(content.decode("utf-8", "replace"))
+        if match:
+            token = match.group(1)
+        else:
+            token = json.loads(await self.getModelJSON())['session']['secToken']
+
+        body = urlencode({"session.password": self._password, "token": token})
+        status, content = await self._request("POST", LB2120HTTPClient.LOGIN_FORM, body, "application/x-www-form-urlencoded")
+        if status >= 400:
+            raise LB2120AuthError("Failed to login to {} (HTTP status = {})".format(self._address, status))
+
+        if LB2120HTTPClient.IsGuest(await self.getModelJSON()):
+            raise LB2120AuthError("Failed to login to {}. Check the password.".format(self._address))
+
+    async def getModelJSON(self):
+        """@brief Read the model.json document from the LB2120.
+           @return The model.json text."""
+        status, content = await self._request("GET", LB2120HTTPClient.MODEL_JSON)
+        if status in (401, 403):
+            raise LB2120AuthError("{} rejected the session (HTTP status = {})".format(self._address, status))
+        if status != 200:
+            raise Exception("Failed to read model.json from {} (HTTP status = {})".format(self._address, status))
+        jsonText = content.decode("utf-8")
+        if self._checkSession:
+            if LB2120HTTPClient.IsGuest(jsonText):
+                raise LB2120AuthError("{} did not accept the saved session.".format(self._address))
+            self._checkSession = False
+        return jsonText
+
+    def close(self):
+        """@brief Close the connection to the LB2120."""
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+class LB2120BrowserClient(object):
+    """@brief Responsible for reading the LB2120 web API by driving a Chrome
+              browser through the web interface (webbot)."""
+
+    HTML_PREFIX = "<html xmlns=\"http://www.w3.org/1999/xhtml\"><head></head><body><pre style=\"word-wrap: break-word; white-space: pre-wrap;\">"
+    HTML_SUFFIX = "</pre></body></html>"
+
+    def __init__(self, address, password):
+        """@brief Constructor
+           @param address The address of the LB2120 4G modem.
+           @param password The LB2120 web interface password."""
+        self._address   = address
+        self._password  = password
+        self._web       = None
+
+    def login(self):
+        """@brief Start the browser and login to the LB2120 web interface."""
+        from webbot import Browser
+        #Close the browser left by an earlier login so browsers are not leaked.
+        self.close()
+        self._web = Browser()
+        self._web.go_to('http://{}/index.html'.format(self._address))
+        self._web.click(id='session_password')
+        self._web.type(self._password)
+        self._web.click('Sign In')
+        self._web.click(id='session_password')
+
+    def getSession(self):
+        """@return None. The browser session is not saved, each new browser logs in."""
+        return None
+
+    def setSession(self, cookies):
+        """@brief The browser session cannot be reused (see getSession()).
+           @param cookies The cookies returned by getSession().
+           @return False as login() must be called."""
+        return False
+
+    def getModelJSON(self):
+        """@brief Read the model.json document from the LB2120.
+           @return The page source containing the model.json text. This is
+                   still wrapped in the browsers HTML (see HTML_PREFIX and
+                   HTML_SUFFIX). ModelJSONExtractor skips the wrapper so it
+                   is not stripped here."""
+        self._web.go_to("http://{}{}".format(self._address, LB2120HTTPClient.MODEL_JSON))
+        return self._web.get_page_source()
+
+    def close(self):
+        """@brief Close the browser."""
+        if self._web:
+            self._web.driver.quit()
+            self._web = None
+
+class SessionCache(object):
+    """@brief Responsible for holding the LB2120 login sessions (the session
+              cookies of each LB2120 address) so that a poller that is
+              restarted, or the next run of the program, reads model.json
+              using the session rather than logging in again. The sessions
+              are saved to a JSON file that only the user can read or write
+              as the cookies give access to the LB2120."""
+
+    DEFAULT_SESSION_FILE    = os.path.join(os.path.expanduser("~"), ".lb2120_sessions.json")
+    FILE_MODE               = 0o600
+
+    def __init__(self, filename=DEFAULT_SESSION_FILE, uio=None):
+        """@brief Constructor
+           @param filename The session file. If None or empty the sessions are only held in memory.
+           @param uio A UIO instance used to report session file errors or None."""
+        self._filename      = filename
+        self._uio           = uio
+        self._lock          = Lock()
+        self._sessionDict   = self._load()
+
+    def _load(self):
+        """@return The dict of address: cookies read from the session file."""
+        if not self._filename or not os.path.isfile(self._filename):
+            return {}
+        try:
+            with open(self._filename) as fd:
+                sessionDict = json.load(fd)
+            if isinstance(sessionDict, dict):
+                return sessionDict
+        except (OSError, ValueError):
+            pass
+        #A damaged session file only means that we login again.
+        return {}
+
+    def _save(self):
+        """@brief Save the sessions. The file is written in full and renamed
+                  so that a partly written file is never read."""
+        if not self._filename:
+            return
+        tmpFilename = self._filename + ".tmp"
+        try:
+            fd = os.open(tmpFilename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, SessionCache.FILE_MODE)
+            with os.fdopen(fd, "w") as fp:
+                #os.open() only sets the mode of a new file.
+                if hasattr(os, "fchmod"):
+                    os.fchmod(fp.fileno(), SessionCache.FILE_MODE)
+                json.dump(self._sessionDict, fp, sort_keys=True)
+            os.replace(tmpFilename, self._filename)
+        except OSError as ex:
+            #The sessions are still held in memory.
+            if self._uio:
+                self._uio.warn("Failed to save the LB2120 sessions to {}: {}".format(self._filename, str(ex)))
+
+    def get(self, address):
+        """@param address The address of the LB2120.
+           @return The session cookies (a dict) or None if no session is held."""
+        with self._lock:
+            cookies = self._sessionDict.get(address)
+            return dict(cookies) if cookies else None
+
+    def set(self, address, cookies):
+        """@brief Hold the session of an LB2120 after a login.
+           @param address The address of the LB2120.
+           @param cookies The session cookies. If None or empty the session held is removed."""
+        if not cookies:
+            self.clear(address)
+            return
+        with self._lock:
+            self._sessionDict[address] = dict(cookies)
+            self._save()
+
+    def clear(self, address):
+        """@brief Remove the session of an LB2120 as it is no longer accepted.
+           @param address The address of the LB2120."""
+        with self._lock:
+            if self._sessionDict.pop(address, None) is not None:
+                self._save()
+
+class ModelJSONExtractor(object):
+    """@brief Responsible for pulling the fields we are interested in out of the
+              LB2120 model.json text. The JSON object is sliced out of any
+              browser HTML wrapper and parsed with json.loads(). Searching the
+              text for the fields (rather than parsing it) was not found to
+              be materially faster once the text had been checked for braces
+              and quotes in string values (E.G an SMS) that would mislead the
+              search."""
+
+    #The model.json field paths that we read from the LB2120.
+    DATA_RX             = ('wwan', 'dataTransferredRx')
+    DATA_TX             = ('wwan', 'dataTransferredTx')
+    DEV_TEMPERATURE     = ('general', 'devTemperature')
+    DEV_TEMP_CRITICAL   = ('power', 'deviceTempCritical')
+    SIGNAL_RSSI         = ('wwan', 'signalStrength', 'rssi')
+    SIGNAL_RSRP         = ('wwan', 'signalStrength', 'rsrp')
+    SIGNAL_RSRQ         = ('wwan', 'signalStrength', 'rsrq')
+    SIGNAL_SINR         = ('wwan', 'signalStrength', 'sinr')
+    DEFAULT_FIELDS      = (DATA_RX, DATA_TX, DEV_TEMPERATURE, DEV_TEMP_CRITICAL)
+
+    def __init__(self, fields=DEFAULT_FIELDS):
+        """@brief Constructor
+           @param fields A list/tuple of field paths. Each field path is a tuple of keys."""
+        self._fields        = tuple(tuple(field) for field in fields)
+
+    def extract(self, text):
+        """@brief Extract the fields from model.json text.
+           @param text The model.json text. This may be wrapped in HTML as
+                       returned by a browser.
+           @return A tuple holding the value of each field (in the order the
+                   fields were passed to the constructor)."""
+        #Slicing out the object copies the text once rather than once for each
+        #part of the HTML wrapper replaced.
+        start = text.find('{')
+        end = text.rfind('}') + 1
+        if start < 0 or end <= start:
+            raise ValueError("No JSON object found in the model.json text.")
+        data = json.loads(text[start:end])
+        values = []
+        for field in self._fields:
+            value = data
+            for key in field:
+                value = value[key]
+            values.append(value)
+        return tuple(values)
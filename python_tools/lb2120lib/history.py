@@ -0,0 +1,196 @@
+import  array
+
+from    collections import deque
+from    threading import Lock
+
+class RollingWindow(object):
+    """@brief Responsible for holding the sum, minimum and maximum of each
+              SampleRing field over the samples read in the last windowSeconds.
+              These are updated as each sample is added and removed so that
+              they are read in constant time. The minimum and maximum are
+              held in monotonic deques (amortised constant time updates)."""
+
+    __slots__ = ("windowSeconds", "count", "tail", "sums", "minDeques", "maxDeques")
+
+    def __init__(self, windowSeconds, fieldCount):
+        """@brief Constructor
+           @param windowSeconds The length of the window in seconds.
+           @param fieldCount The number of fields held for each sample."""
+        self.windowSeconds  = windowSeconds
+        self.count          = 0
+        #The index of the oldest sample in the window (counting every sample added to the ring).
+        self.tail           = 0
+        self.sums           = [0.0] * fieldCount
+        #Each deque holds (sample index, value) tuples.
+        self.minDeques      = [deque() for _ in range(fieldCount)]
+        self.maxDeques      = [deque() for _ in range(fieldCount)]
+
+    def add(self, index, values):
+        """@brief Add a sample to the window.
+           @param index The index of the sample.
+           @param values The field values of the sample."""
+        self.count = self.count + 1
+        for field, value in enumerate(values):
+            self.sums[field] = self.sums[field] + value
+            minDeque = self.minDeques[field]
+            while minDeque and minDeque[-1][1] >= value:
+                minDeque.pop()
+            minDeque.append((index, value))
+            maxDeque = self.maxDeques[field]
+            while maxDeque and maxDeque[-1][1] <= value:
+                maxDeque.pop()
+            maxDeque.append((index, value))
+
+    def remove(self, values):
+        """@brief Remove the oldest sample from the window.
+           @param values The field values of the oldest sample."""
+        self.count = self.count - 1
+        for field, value in enumerate(values):
+            self.sums[field] = self.sums[field] - value
+            if self.minDeques[field][0][0] == self.tail:
+                self.minDeques[field].popleft()
+            if self.maxDeques[field][0][0] == self.tail:
+                self.maxDeques[field].popleft()
+        self.tail = self.tail + 1
+
+    def getMean(self, field):
+        """@param field The field index.
+           @return The mean value of the field over the window or None if the window is empty."""
+        if self.count == 0:
+            return None
+        return self.sums[field] / self.count
+
+    def getMin(self, field):
+        """@param field The field index.
+           @return The minimum value of the field over the window or None if the window is empty."""
+        if self.count == 0:
+            return None
+        return self.minDeques[field][0][1]
+
+    def getMax(self, field):
+        """@param field The field index.
+           @return The maximum value of the field over the window or None if the window is empty."""
+        if self.count == 0:
+            return None
+        return self.maxDeques[field][0][1]
+
+class SampleRing(object):
+    """@brief Responsible for holding the latest samples read from one LB2120
+              in fixed size arrays (a ring buffer) along with the rolling
+              statistics of each field over one or more time windows. A
+              window holds at most capacity samples."""
+
+    FIELD_DOWNMBPS      = 0
+    FIELD_UPMBPS        = 1
+    FIELD_TEMPC         = 2
+    FIELD_NAMES         = ("DOWNMBPS", "UPMBPS", "TEMPC")
+    DEFAULT_CAPACITY    = 3600
+    DEFAULT_WINDOWS     = (300, 3600)
+    DEFAULT_SHOW_SECONDS = 60
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, windowSecondsList=DEFAULT_WINDOWS):
+        """@brief Constructor
+           @param capacity The maximum number of samples held.
+           @param windowSecondsList The length in seconds of each rolling window."""
+        self._capacity      = max(1, capacity)
+        self._times         = array.array("d", bytes(8 * self._capacity))
+        self._fields        = [array.array("d", bytes(8 * self._capacity)) for _ in SampleRing.FIELD_NAMES]
+        #The number of samples added. The next sample is stored at _count % _capacity.
+        self._count         = 0
+        self._windowDict    = {windowSeconds: RollingWindow(windowSeconds, len(SampleRing.FIELD_NAMES)) for windowSeconds in windowSecondsList}
+
+    def __len__(self):
+        return min(self._count, self._capacity)
+
+    def _getValues(self, index):
+        """@param index The index of a sample held.
+           @return A list of the field values of the sample."""
+        position = index % self._capacity
+        return [values[position] for values in self._fields]
+
+    def add(self, lb2120Stats):
+        """@brief Add a sample. If the ring is full the oldest sample is overwritten.
+           @param lb2120Stats The LB2120Stats instance."""
+        index = self._count
+        sampleTime = lb2120Stats.sampleTime.timestamp()
+        values = (float(lb2120Stats.downMbps), float(lb2120Stats.upMbps), float(lb2120Stats.tempC))
+        for window in self._windowDict.values():
+            #The oldest sample is about to be overwritten.
+            while window.tail <= index - self._capacity:
+                window.remove(self._getValues(window.tail))
+
+        position = index % self._capacity
+        self._times[position] = sampleTime
+        for field, value in enumerate(values):
+            self._fields[field][position] = value
+        self._count = index + 1
+
+        for window in self._windowDict.values():
+            window.add(index, values)
+            startTime = sampleTime - window.windowSeconds
+            while window.tail < index and self._times[window.tail % self._capacity] <= startTime:
+                window.remove(self._getValues(window.tail))
+
+    def getWindow(self, windowSeconds):
+        """@param windowSeconds The length of the window in seconds.
+           @return The RollingWindow instance."""
+        return self._windowDict[windowSeconds]
+
+    def getWindowSecondsList(self):
+        """@return The length in seconds of each window."""
+        return list(self._windowDict.keys())
+
+    def getRecent(self, maxCount):
+        """@param maxCount The maximum number of samples to return.
+           @return A list of the latest samples held (oldest first). Each
+                   sample is a tuple of the sample time (seconds since the
+                   epoch) followed by the field values."""
+        count = min(len(self), maxCount)
+        samples = []
+        for index in range(self._count-count, self._count):
+            position = index % self._capacity
+            samples.append((self._times[position],) + tuple(values[position] for values in self._fields))
+        return samples
+
+class SampleHistory(object):
+    """@brief Responsible for holding a SampleRing for each LB2120 so that
+              recent statistics can be read from memory."""
+
+    def __init__(self, capacity=SampleRing.DEFAULT_CAPACITY, windowSecondsList=SampleRing.DEFAULT_WINDOWS):
+        """@brief Constructor
+           @param capacity The maximum number of samples held for each LB2120.
+           @param windowSecondsList The length in seconds of each rolling window."""
+        self._capacity          = capacity
+        self._windowSecondsList = windowSecondsList
+        self._lock              = Lock()
+        self._ringDict          = {}
+
+    @staticmethod
+    def GetWindowSecondsList(windowsText):
+        """@param windowsText A comma separated list of window lengths in seconds.
+           @return A tuple of the window lengths."""
+        try:
+            windowSecondsList = tuple(int(windowSeconds) for windowSeconds in windowsText.split(","))
+        except ValueError:
+            raise Exception("{} is not a comma separated list of seconds.".format(windowsText))
+        if not windowSecondsList or min(windowSecondsList) <= 0:
+            raise Exception("{} is not a comma separated list of seconds.".format(windowsText))
+        return windowSecondsList
+
+    def add(self, lb2120Stats):
+        """@brief Add a sample to the SampleRing of the LB2120 it was read from.
+           @param lb2120Stats The LB2120Stats instance.
+           @return The SampleRing instance."""
+        with self._lock:
+            ring = self._ringDict.get(lb2120Stats.deviceID)
+            if ring is None:
+                ring = SampleRing(self._capacity, self._windowSecondsList)
+                self._ringDict[lb2120Stats.deviceID] = ring
+            ring.add(lb2120Stats)
+        return ring
+
+    def getRecent(self, maxCount):
+        """@param maxCount The maximum number of samples to return for each LB2120.
+           @return A dict of LB2120 ID: SampleRing.getRecent() list."""
+        with self._lock:
+            return {deviceID: ring.getRecent(maxCount) for deviceID, ring in self._ringDict.items()}
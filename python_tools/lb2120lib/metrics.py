@@ -0,0 +1,382 @@
+import  io
+import  random
+import  cProfile
+import  pstats
+
+from    collections import deque
+from    bisect import bisect_left
+from    time import monotonic
+from    threading import Lock, current_thread
+
+class CollectorMetrics(object):
+    """@brief Responsible for holding the metrics of a running collector (the
+              latest stats read from each LB2120 and the collector internals)
+              and presenting them in the Prometheus text exposition format.
+              Updating a metric is a dict update under a lock so the pollers
+              and database writers can update them on every sample."""
+
+    COUNTER             = "counter"
+    GAUGE               = "gauge"
+    HISTOGRAM           = "histogram"
+
+    POLL_BUCKETS        = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    PARSE_BUCKETS       = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025)
+    INSERT_BUCKETS      = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+    BATCH_BUCKETS       = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+    #The stages each sample passes through and the number of stage times kept.
+    STAGE_FETCH         = "fetch"
+    STAGE_PARSE         = "parse"
+    STAGE_QUEUE         = "queue"
+    STAGE_LOG           = "log"
+    STAGE_STORE         = "store"
+    STAGE_INSERT        = "insert"
+    STAGES              = (STAGE_FETCH, STAGE_PARSE, STAGE_QUEUE, STAGE_LOG, STAGE_STORE, STAGE_INSERT)
+    MAX_STAGE_TIMES     = 10000
+    STAGE_PERCENTILES   = (50, 90, 99)
+
+    #The type, help text and histogram buckets of each metric.
+    METRIC_DEFS = {
+        "lb2120_down_mbps":                 (GAUGE,     "The latest download rate in Mbps.", None),
+        "lb2120_up_mbps":                   (GAUGE,     "The latest upload rate in Mbps.", None),
+        "lb2120_temperature_celsius":       (GAUGE,     "The latest LB2120 temperature.", None),
+        "lb2120_temp_critical":             (GAUGE,     "1 if the LB2120 reports a critical temperature.", None),
+        "lb2120_sample_timestamp_seconds":  (GAUGE,     "The time of the latest sample (seconds since the epoch).", None),
+        "lb2120_window_down_mbps":          (GAUGE,     "The mean, min and max download rate over each --windows time window.", None),
+        "lb2120_window_up_mbps":            (GAUGE,     "The mean, min and max upload rate over each --windows time window.", None),
+        "lb2120_window_temperature_celsius": (GAUGE,    "The mean, min and max LB2120 temperature over each --windows time window.", None),
+        "lb2120_poll_seconds":              (HISTOGRAM, "The time taken to read model.json from the LB2120.", POLL_BUCKETS),
+        "lb2120_parse_seconds":             (HISTOGRAM, "The time taken to extract the fields from model.json.", PARSE_BUCKETS),
+        "lb2120_poll_errors_total":         (COUNTER,   "The number of LB2120 reads that failed.", None),
+        "lb2120_logins_total":              (COUNTER,   "The number of logins to the LB2120 web interface.", None),
+        "lb2120_queue_depth":               (GAUGE,     "The number of samples waiting in the queue to the database writer.", None),
+        "lb2120_pending_rows":              (GAUGE,     "The number of samples buffered in memory waiting to be written to the database.", None),
+        "lb2120_insert_seconds":            (HISTOGRAM, "The time taken to write a batch of samples to the database.", INSERT_BUCKETS),
+        "lb2120_insert_batch_rows":         (HISTOGRAM, "The number of samples written to the database in each batch.", BATCH_BUCKETS),
+        "lb2120_db_reconnects_total":       (COUNTER,   "The number of times the collector reconnected to the database.", None),
+        "lb2120_spooled_samples_total":     (COUNTER,   "The number of samples saved to the spool file while the database was unavailable.", None),
+        "lb2120_dropped_samples_total":     (COUNTER,   "The number of samples read that could not be stored.", None),
+        "lb2120_coalesced_samples_total":   (COUNTER,   "The number of samples combined with a queued sample as the queue was full.", None),
+        "lb2120_component_state":           (GAUGE,     "The circuit breaker state of each collector component (0 = closed, 1 = half open, 2 = open).", None),
+        "lb2120_component_failures_total":  (COUNTER,   "The number of failures of each collector component.", None),
+        "lb2120_poller_restarts_total":     (COUNTER,   "The number of times the thread reading the LB2120 was restarted after it stopped.", None),
+    }
+
+    @staticmethod
+    def GetLabelText(labels):
+        """@param labels A tuple of (name, value) label tuples.
+           @return The labels in the exposition format (E.G {device="home"})."""
+        if not labels:
+            return ""
+        return "{" + ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                              for name, value in labels) + "}"
+
+    def __init__(self):
+        """@brief Constructor"""
+        self._lock          = Lock()
+        #The value of each metric keyed by the metric name and then the labels.
+        #Histogram values are a list of the bucket counts followed by the sum and count.
+        self._valueDict     = {name: {} for name in CollectorMetrics.METRIC_DEFS}
+        self._callbackDict  = {}
+        self._stageDict     = {stage: deque(maxlen=CollectorMetrics.MAX_STAGE_TIMES) for stage in CollectorMetrics.STAGES}
+        self._breakerDict   = {}
+
+    def setGauge(self, name, value, **labels):
+        """@brief Set the value of a gauge.
+           @param name The metric name.
+           @param value The value.
+           @param labels The metric labels."""
+        with self._lock:
+            self._valueDict[name][tuple(sorted(labels.items()))] = value
+
+    def setGaugeCallback(self, name, callback):
+        """@brief Set a gauge from a method that is called when the metrics are read.
+           @param name The metric name.
+           @param callback The method that returns the value."""
+        self._callbackDict[name] = callback
+
+    def addCircuitBreaker(self, breaker):
+        """@brief Add a component whose health is reported by getHealth().
+                  This replaces a component of the same name.
+           @param breaker The CircuitBreaker of the component."""
+        with self._lock:
+            self._breakerDict[breaker.name] = breaker
+
+    def getHealth(self):
+        """@return A tuple containing True if no component is failing (no
+                   circuit breaker is open) and a dict holding the state of
+                   each component."""
+        with self._lock:
+            breakers = list(self._breakerDict.values())
+        componentDict = {breaker.name: breaker.getHealth() for breaker in breakers}
+        healthy = all(health["state"] != CircuitBreaker.OPEN for health in componentDict.values())
+        return (healthy, componentDict)
+
+    def incCounter(self, name, amount=1, **labels):
+        """@brief Increment a counter.
+           @param name The metric name.
+           @param amount The amount to add to the counter.
+           @param labels The metric labels."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._valueDict[name]
+            values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """@brief Add a value to a histogram.
+           @param name The metric name.
+           @param value The value.
+           @param labels The metric labels."""
+        buckets = CollectorMetrics.METRIC_DEFS[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._valueDict[name].get(key)
+            if values is None:
+                values = [0] * (len(buckets) + 2)
+                self._valueDict[name][key] = values
+            #Bucket counts are not cumulative here, they are summed when read.
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                values[index] = values[index] + 1
+            values[-2] = values[-2] + value
+            values[-1] = values[-1] + 1
+
+    def recordStage(self, stage, seconds):
+        """@brief Record the time taken by one stage of handling a sample. The
+                  latest MAX_STAGE_TIMES times of each stage are kept.
+           @param stage One of the STAGES.
+           @param seconds The time taken in seconds."""
+        with self._lock:
+            self._stageDict[stage].append(seconds)
+
+    def getStageReport(self):
+        """@return A list of lines reporting the time taken by each stage
+                   of handling a sample (mean, percentiles and max)."""
+        import numpy as np
+        lines = ["{:<8} {:>7} {:>10}".format("STAGE", "COUNT", "MEAN ms") +
+                 "".join("{:>10}".format("P{} ms".format(p)) for p in CollectorMetrics.STAGE_PERCENTILES) +
+                 "{:>10}".format("MAX ms")]
+        for stage in CollectorMetrics.STAGES:
+            with self._lock:
+                times = np.array(self._stageDict[stage]) * 1000
+            if len(times) == 0:
+                continue
+            lines.append("{:<8} {:>7} {:>10.3f}".format(stage, len(times), times.mean()) +
+                         "".join("{:>10.3f}".format(value) for value in np.percentile(times, CollectorMetrics.STAGE_PERCENTILES)) +
+                         "{:>10.3f}".format(times.max()))
+        return lines
+
+    def getText(self):
+        """@return The metrics in the Prometheus text exposition format."""
+        for name, callback in self._callbackDict.items():
+            self.setGauge(name, callback())
+
+        lines = []
+        with self._lock:
+            for name, (metricType, helpText, buckets) in CollectorMetrics.METRIC_DEFS.items():
+                values = self._valueDict[name]
+                if not values:
+                    continue
+                lines.append("# HELP {} {}".format(name, helpText))
+                lines.append("# TYPE {} {}".format(name, metricType))
+                for labels, value in sorted(values.items()):
+                    if metricType == CollectorMetrics.HISTOGRAM:
+                        count = 0
+                        for bucket, bucketCount in zip(buckets, value):
+                            count = count + bucketCount
+                            lines.append("{}_bucket{} {}".format(name, CollectorMetrics.GetLabelText(labels + (("le", bucket),)), count))
+                        lines.append("{}_bucket{} {}".format(name, CollectorMetrics.GetLabelText(labels + (("le", "+Inf"),)), value[-1]))
+                        lines.append("{}_sum{} {}".format(name, CollectorMetrics.GetLabelText(labels), value[-2]))
+                        lines.append("{}_count{} {}".format(name, CollectorMetrics.GetLabelText(labels), value[-1]))
+                    else:
+                        lines.append("{}{} {}".format(name, CollectorMetrics.GetLabelText(labels), value))
+        return "\n".join(lines) + "\n"
+
+class SampleProfiler(object):
+    """@brief Responsible for profiling (cProfile) the threads that read and
+              store samples until a number of samples have been stored."""
+
+    SORT_KEY            = "cumulative"
+    REPORT_FUNCTIONS    = 25
+
+    def __init__(self, sampleCount):
+        """@brief Constructor
+           @param sampleCount The number of samples to profile."""
+        self._sampleCount   = sampleCount
+        self._count         = 0
+        self._lock          = Lock()
+        self._profileDict   = {}
+
+    def enable(self):
+        """@brief Start profiling the calling thread."""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            #From python 3.12 a single profile records every thread so the
+            #profile already enabled by another thread covers this one.
+            return
+        with self._lock:
+            self._profileDict[current_thread().name] = profile
+
+    def disable(self):
+        """@brief Stop profiling the calling thread."""
+        with self._lock:
+            profile = self._profileDict.get(current_thread().name)
+        if profile:
+            profile.disable()
+
+    def addSample(self):
+        """@brief Count a sample stored.
+           @return True when the required number of samples have been stored."""
+        self._count = self._count + 1
+        return self._count >= self._sampleCount
+
+    def getReport(self):
+        """@return A list of lines reporting the functions that took the most
+                   time in each thread profiled."""
+        lines = []
+        with self._lock:
+            profileDict = dict(self._profileDict)
+        for threadName, profile in profileDict.items():
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats(SampleProfiler.SORT_KEY).print_stats(SampleProfiler.REPORT_FUNCTIONS)
+            lines.append("Profile of the {} thread ({} samples)".format(threadName, self._count))
+            lines = lines + stream.getvalue().split("\n")
+        return lines
+
+class CircuitBreaker(object):
+    """@brief Responsible for deciding when a failing collector component (an
+              LB2120, the poller thread or the database) is tried again.
+              After failureThreshold consecutive failures the breaker opens
+              and no attempt is made until the retry delay has passed. The
+              delay doubles each time the breaker opens (up to maxSeconds)
+              and is reduced by a random jitter so that components that fail
+              together do not retry together. One attempt is then allowed
+              (half open). A success closes the breaker, a failure opens it
+              again."""
+
+    CLOSED                      = "closed"
+    HALF_OPEN                   = "half_open"
+    OPEN                        = "open"
+    #The value of the lb2120_component_state metric in each state.
+    STATE_VALUES                = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    DEFAULT_FAILURE_THRESHOLD   = 3
+    DEFAULT_MIN_SECONDS         = 5
+    DEFAULT_MAX_SECONDS         = 300
+    #The retry delay is between (1-JITTER_FRACTION) and 1 times the backoff delay.
+    JITTER_FRACTION             = 0.5
+
+    @staticmethod
+    def GetRetrySeconds(openCount, minSeconds, maxSeconds):
+        """@brief Get the time to wait before trying a component again.
+           @param openCount The number of times the breaker has opened since it was last closed.
+           @param minSeconds The delay after the breaker first opens.
+           @param maxSeconds The maximum delay.
+           @return The delay in seconds including the jitter."""
+        delay = min(maxSeconds, minSeconds * 2 ** min(openCount-1, 32))
+        return random.uniform(delay * (1-CircuitBreaker.JITTER_FRACTION), delay)
+
+    def __init__(self, name, uio=None, metrics=None, failureThreshold=DEFAULT_FAILURE_THRESHOLD, minSeconds=DEFAULT_MIN_SECONDS, maxSeconds=DEFAULT_MAX_SECONDS):
+        """@brief Constructor
+           @param name The name of the component.
+           @param uio A UIO instance to report state changes or None.
+           @param metrics A CollectorMetrics instance to show the state of the component or None.
+           @param failureThreshold The number of consecutive failures that open the breaker.
+           @param minSeconds The retry delay after the breaker first opens.
+           @param maxSeconds The maximum retry delay."""
+        self.name               = name
+        self._uio               = uio
+        self._metrics           = metrics
+        self._failureThreshold  = max(1, failureThreshold)
+        self._minSeconds        = minSeconds
+        self._maxSeconds        = maxSeconds
+        self._lock              = Lock()
+        self._state             = CircuitBreaker.CLOSED
+        self._failureCount      = 0
+        self._totalFailureCount = 0
+        self._openCount         = 0
+        self._retryTime         = None
+        self._lastError         = None
+        if metrics:
+            metrics.addCircuitBreaker(self)
+            self._updateMetrics()
+
+    def _updateMetrics(self):
+        """@brief Update the metric that shows the state of the component."""
+        if self._metrics:
+            self._metrics.setGauge("lb2120_component_state", CircuitBreaker.STATE_VALUES[self._state], component=self.name)
+
+    def isAttemptAllowed(self):
+        """@brief Check if the component may be used. Once the retry delay of
+                  an open breaker has passed it becomes half open and one
+                  attempt is allowed.
+           @return True if the component may be used."""
+        with self._lock:
+            if self._state == CircuitBreaker.OPEN:
+                if monotonic() < self._retryTime:
+                    return False
+                self._state = CircuitBreaker.HALF_OPEN
+                self._updateMetrics()
+            return True
+
+    def getRetrySeconds(self):
+        """@return The time until the component may be used (0 if it may be used now)."""
+        with self._lock:
+            if self._state != CircuitBreaker.OPEN:
+                return 0
+            return max(0.0, self._retryTime - monotonic())
+
+    def getState(self):
+        """@return The breaker state (CLOSED, HALF_OPEN or OPEN)."""
+        return self._state
+
+    def recordSuccess(self):
+        """@brief Record that the component was used successfully."""
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED and self._failureCount == 0:
+                return
+            recovered = self._state != CircuitBreaker.CLOSED
+            failureCount = self._failureCount
+            self._state = CircuitBreaker.CLOSED
+            self._failureCount = 0
+            self._openCount = 0
+            self._retryTime = None
+            self._updateMetrics()
+        if recovered and self._uio:
+            self._uio.info("{}: Recovered after {} consecutive failures.".format(self.name, failureCount))
+
+    def recordFailure(self, error=None):
+        """@brief Record that the component failed.
+           @param error The exception or error message or None.
+           @return True if this failure opened the breaker."""
+        with self._lock:
+            self._failureCount = self._failureCount + 1
+            self._totalFailureCount = self._totalFailureCount + 1
+            if error is not None:
+                self._lastError = str(error)
+            if self._metrics:
+                self._metrics.incCounter("lb2120_component_failures_total", component=self.name)
+            if self._state != CircuitBreaker.HALF_OPEN and self._failureCount < self._failureThreshold:
+                return False
+            self._openCount = self._openCount + 1
+            retrySeconds = CircuitBreaker.GetRetrySeconds(self._openCount, self._minSeconds, self._maxSeconds)
+            self._retryTime = monotonic() + retrySeconds
+            self._state = CircuitBreaker.OPEN
+            failureCount = self._failureCount
+            self._updateMetrics()
+        if self._uio:
+            self._uio.warn("{}: {} consecutive failures, retry in {:.1f} seconds.".format(self.name, failureCount, retrySeconds))
+        return True
+
+    def getHealth(self):
+        """@return A dict holding the state of the component."""
+        with self._lock:
+            retrySeconds = 0
+            if self._state == CircuitBreaker.OPEN:
+                retrySeconds = round(max(0.0, self._retryTime - monotonic()), 3)
+            return {"state":                self._state,
+                    "consecutive_failures": self._failureCount,
+                    "failures":             self._totalFailureCount,
+                    "retry_seconds":        retrySeconds,
+                    "last_error":           self._lastError}
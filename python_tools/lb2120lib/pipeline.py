@@ -0,0 +1,332 @@
+import  os
+import  json
+
+from    queue import Queue
+from    time import monotonic
+from    threading import Thread, Lock, Event
+
+from    .stats import LB2120Stats
+
+class SampleSpool(object):
+    """@brief Responsible for holding database rows in a local append only file
+              while the database cannot be reached. Rows are stored one JSON
+              object per line. The offset of the first row not yet written to
+              the database is held in a position file alongside the spool file
+              so that rows are not lost or replayed if the program is restarted."""
+
+    DEFAULT_SPOOL_FILE  = os.path.join(os.path.expanduser("~"), ".lb2120_spool.jsonl")
+    POS_FILE_SUFFIX     = ".pos"
+
+    def __init__(self, filename=DEFAULT_SPOOL_FILE):
+        """@brief Constructor
+           @param filename The spool file."""
+        self._filename      = filename
+        self._posFilename   = filename + SampleSpool.POS_FILE_SUFFIX
+        self._lock          = Lock()
+        self._readPos       = self._loadReadPos()
+
+    def _loadReadPos(self):
+        """@return The offset in the spool file of the first row not yet written to the database."""
+        try:
+            with open(self._posFilename) as fd:
+                return int(fd.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _saveReadPos(self):
+        """@brief Save the offset of the first row not yet written to the database."""
+        tmpFilename = self._posFilename + ".tmp"
+        with open(tmpFilename, 'w') as fd:
+            fd.write(str(self._readPos))
+            fd.flush()
+            os.fsync(fd.fileno())
+        os.replace(tmpFilename, self._posFilename)
+
+    def _getSize(self):
+        """@return The size of the spool file in bytes."""
+        try:
+            return os.path.getsize(self._filename)
+        except OSError:
+            return 0
+
+    def isEmpty(self):
+        """@return True if the spool holds no rows waiting to be written to the database."""
+        with self._lock:
+            return self._readPos >= self._getSize()
+
+    def append(self, rows):
+        """@brief Append rows to the spool file. The file is synced to disk
+                  once for all the rows.
+           @param rows A list of row dicts."""
+        lines = "".join(json.dumps(row, default=str) + "\n" for row in rows)
+        with self._lock:
+            with open(self._filename, 'a') as fd:
+                fd.write(lines)
+                fd.flush()
+                os.fsync(fd.fileno())
+
+    def read(self, maxRows):
+        """@brief Read the oldest rows not yet written to the database.
+           @param maxRows The maximum number of rows to read.
+           @return A tuple containing a list of row dicts and the spool file
+                   offset after the last row read. Pass the offset to commit()
+                   once the rows have been written to the database."""
+        rows = []
+        with self._lock:
+            pos = self._readPos
+            if pos >= self._getSize():
+                return (rows, pos)
+            with open(self._filename, 'r') as fd:
+                fd.seek(pos)
+                while len(rows) < maxRows:
+                    line = fd.readline()
+                    #Stop at the end of the file or a partly written last line.
+                    if not line.endswith("\n"):
+                        break
+                    pos = fd.tell()
+                    if line.strip():
+                        rows.append(json.loads(line))
+        return (rows, pos)
+
+    def commit(self, pos):
+        """@brief Record that the rows up to pos have been written to the database.
+                  Once all rows have been written the spool file is emptied.
+           @param pos The offset returned by read()."""
+        with self._lock:
+            self._readPos = pos
+            if self._readPos >= self._getSize():
+                with open(self._filename, 'w'):
+                    pass
+                self._readPos = 0
+            self._saveReadPos()
+
+    def getPendingCount(self):
+        """@return The number of rows in the spool not yet written to the database."""
+        count = 0
+        with self._lock:
+            if self._readPos >= self._getSize():
+                return 0
+            with open(self._filename, 'rb') as fd:
+                fd.seek(self._readPos)
+                for line in fd:
+                    count = count + 1
+        return count
+
+class SpoolDrainer(Thread):
+    """@brief Responsible for reconnecting to the database after it has become
+              unreachable and writing the rows held in the SampleSpool to it in
+              bulk inserts. Reconnect attempts are made through the database
+              CircuitBreaker so they back off exponentially (with jitter) and
+              a database server that is down is not hammered."""
+
+    MAX_ROWS_PER_INSERT     = 500
+    MIN_RETRY_SECONDS       = 2
+    MAX_RETRY_SECONDS       = 120
+
+    def __init__(self, uio, spool, connect, insertRows, onDrained, breaker):
+        """@brief Constructor
+           @param uio A UIO instance.
+           @param spool The SampleSpool to drain.
+           @param connect A function that connects to the database.
+           @param insertRows A function that inserts a list of row dicts into the database.
+           @param onDrained A function called once all the spooled rows have been written.
+           @param breaker The CircuitBreaker of the database."""
+        Thread.__init__(self)
+        self.daemon         = True
+        self._uio           = uio
+        self._spool         = spool
+        self._connect       = connect
+        self._insertRows    = insertRows
+        self._onDrained     = onDrained
+        self._breaker       = breaker
+        self._wakeEvent     = Event()
+        self._running       = True
+
+    def wake(self):
+        """@brief Start draining the spool now rather than waiting for the next retry."""
+        self._wakeEvent.set()
+
+    def run(self):
+        """@brief Drain the spool into the database whenever it holds rows."""
+        connected = False
+        while self._running:
+            self._wakeEvent.wait(self._breaker.getRetrySeconds() or SpoolDrainer.MIN_RETRY_SECONDS)
+            self._wakeEvent.clear()
+            if not self._running:
+                break
+            if self._spool.isEmpty() or not self._breaker.isAttemptAllowed():
+                continue
+            try:
+                if not connected:
+                    self._connect()
+                    connected = True
+                while self._running:
+                    rows, pos = self._spool.read(SpoolDrainer.MAX_ROWS_PER_INSERT)
+                    if not rows:
+                        break
+                    self._insertRows(rows)
+                    self._spool.commit(pos)
+                #Check for rows appended while the last insert was in progress.
+                self._breaker.recordSuccess()
+                if self._running and self._onDrained():
+                    connected = False
+                    self._uio.info("All spooled samples written to the database.")
+            except Exception as ex:
+                connected = False
+                self._uio.error("Database unavailable: {}".format(str(ex)))
+                self._breaker.recordFailure(ex)
+
+    def shutdown(self):
+        """@brief Stop the thread running."""
+        self._running = False
+        self._wakeEvent.set()
+
+class SampleQueue(Queue):
+    """@brief Responsible for passing LB2120Stats from the poller thread to the
+              database writer. The queue is bounded so that memory use does
+              not grow if the database writer falls behind. When the queue is
+              full a new sample is handled by the overflow policy.
+              block:    The poller waits for space in the queue.
+              drop:     The oldest sample in the queue is dropped.
+              coalesce: The new sample is combined with the newest queued
+                        sample from the same LB2120."""
+
+    POLICY_BLOCK        = "block"
+    POLICY_DROP         = "drop"
+    POLICY_COALESCE     = "coalesce"
+    POLICIES            = (POLICY_BLOCK, POLICY_DROP, POLICY_COALESCE)
+    DEFAULT_POLICY      = POLICY_COALESCE
+    DEFAULT_MAX_SIZE    = 1000
+
+    def __init__(self, maxSize=DEFAULT_MAX_SIZE, policy=DEFAULT_POLICY, metrics=None):
+        """@brief Constructor
+           @param maxSize The maximum number of samples held.
+           @param policy One of the POLICIES.
+           @param metrics A CollectorMetrics instance to update or None."""
+        if policy not in SampleQueue.POLICIES:
+            raise Exception("{} is not a valid queue overflow policy ({}).".format(policy, ", ".join(SampleQueue.POLICIES)))
+        super().__init__(max(1, maxSize))
+        self._policy        = policy
+        self._metrics       = metrics
+        self._interrupted   = False
+        self.droppedCount   = 0
+        self.coalescedCount = 0
+
+    def _drop(self):
+        """@brief Count a sample dropped. Called holding the queue mutex."""
+        self.droppedCount = self.droppedCount + 1
+        if self._metrics:
+            self._metrics.incCounter("lb2120_dropped_samples_total")
+
+    def _coalesce(self, lb2120Stats):
+        """@brief Combine a sample with the newest queued sample from the same
+                  LB2120. Called holding the queue mutex.
+           @param lb2120Stats The LB2120Stats instance.
+           @return True if the sample was combined."""
+        for index in range(len(self.queue)-1, -1, -1):
+            if self.queue[index].deviceID == lb2120Stats.deviceID:
+                self.queue[index] = LB2120Stats.Coalesce(self.queue[index], lb2120Stats)
+                self.coalescedCount = self.coalescedCount + 1
+                if self._metrics:
+                    self._metrics.incCounter("lb2120_coalesced_samples_total")
+                return True
+        return False
+
+    def put(self, lb2120Stats, block=True, timeout=None):
+        """@brief Add a sample to the queue. If the queue is full the sample is
+                  handled by the overflow policy.
+           @param lb2120Stats The LB2120Stats instance.
+           @param block Not used. The overflow policy decides if the caller waits.
+           @param timeout Not used."""
+        with self.not_full:
+            while self._qsize() >= self.maxsize:
+                if self._interrupted:
+                    self._drop()
+                    return
+                if self._policy == SampleQueue.POLICY_BLOCK:
+                    self.not_full.wait()
+                elif self._policy == SampleQueue.POLICY_COALESCE and self._coalesce(lb2120Stats):
+                    return
+                else:
+                    #Samples from other LB2120 devices fill the queue so the oldest is dropped.
+                    self.queue.popleft()
+                    self._drop()
+            self._put(lb2120Stats)
+            self.unfinished_tasks = self.unfinished_tasks + 1
+            self.not_empty.notify()
+
+    def interrupt(self):
+        """@brief Stop a poller that is blocked waiting for space in the queue.
+                  Until resume() is called samples that do not fit are dropped."""
+        with self.not_full:
+            self._interrupted = True
+            self.not_full.notify_all()
+
+    def resume(self):
+        """@brief Resume the overflow policy after interrupt()."""
+        with self.not_full:
+            self._interrupted = False
+
+class BatchedRowWriter(object):
+    """@brief Responsible for buffering database rows so that they are written
+              to the database in multi row inserts rather than one insert per
+              sample. The buffered rows are written when the number buffered
+              reaches maxRows or the oldest buffered row has been waiting for
+              maxLatencySeconds."""
+
+    DEFAULT_MAX_ROWS            = 10
+    DEFAULT_MAX_LATENCY_SECONDS = 60
+
+    def __init__(self, insertRows, maxRows=DEFAULT_MAX_ROWS, maxLatencySeconds=DEFAULT_MAX_LATENCY_SECONDS):
+        """@brief Constructor
+           @param insertRows A function that inserts a list of row dicts into the database.
+           @param maxRows The maximum number of rows to buffer before writing them.
+           @param maxLatencySeconds The maximum time (seconds) a row may be buffered before it is written."""
+        self._insertRows        = insertRows
+        self._maxRows           = max(1, maxRows)
+        self._maxLatencySeconds = maxLatencySeconds
+        self._rows              = []
+        self._deadline          = None
+
+    def add(self, row):
+        """@brief Add a row to be written to the database. The buffered rows
+                  are written if the size threshold or deadline is reached.
+           @param row A dict holding the row to be written.
+           @return The number of rows written to the database."""
+        if not self._rows:
+            self._deadline = monotonic() + self._maxLatencySeconds
+        self._rows.append(row)
+        if self.isFlushDue():
+            return self.flush()
+        return 0
+
+    def isFlushDue(self):
+        """@return True if the buffered rows should be written now."""
+        if not self._rows:
+            return False
+        return len(self._rows) >= self._maxRows or monotonic() >= self._deadline
+
+    def getSecondsToDeadline(self):
+        """@return The number of seconds until the buffered rows must be written
+                   or None if no rows are buffered."""
+        if not self._rows:
+            return None
+        return max(0.0, self._deadline - monotonic())
+
+    def getPendingCount(self):
+        """@return The number of rows waiting to be written to the database."""
+        return len(self._rows)
+
+    def flush(self):
+        """@brief Pass all buffered rows to the insertRows function. The
+                  UsageLogger function (_storeRows()) saves the rows in the
+                  spool file if the database write fails, so the rows are only
+                  kept here if the insertRows function raises an exception.
+           @return The number of rows passed to the insertRows function."""
+        if not self._rows:
+            return 0
+        rows = self._rows
+        self._insertRows(rows)
+        self._rows = []
+        self._deadline = None
+        return len(rows)
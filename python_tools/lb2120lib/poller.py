@@ -0,0 +1,714 @@
+import  os
+import  json
+import  asyncio
+import  datetime
+import  traceback
+
+from    collections import deque
+from    time import sleep, monotonic
+from    threading import Thread, Event
+
+from    .stats import LB2120Stats, StatsTable
+from    .client import LB2120AuthError, LB2120HTTPClient, AsyncLB2120HTTPClient, LB2120BrowserClient, SessionCache, ModelJSONExtractor
+from    .metrics import CollectorMetrics, CircuitBreaker
+from    .servers import StatusCache
+
+class PollScheduler(object):
+    """@brief Responsible for scheduling polls at a fixed period on the
+              monotonic clock. Each poll is due at a deadline a whole number of
+              periods after the first so the time taken by a poll does not
+              delay the polls after it. If a poll overruns the deadlines that
+              were missed are skipped rather than polling late back to back.
+              The jitter (the time between the deadline and the poll starting)
+              is recorded so that it can be reported."""
+
+    #The period between jitter reports.
+    REPORT_SECONDS      = 300
+
+    def __init__(self, periodSeconds):
+        """@brief Constructor
+           @param periodSeconds The poll period in seconds."""
+        self._periodSeconds     = periodSeconds
+        self._deadline          = monotonic()
+        self._reportTime        = self._deadline + PollScheduler.REPORT_SECONDS
+        self._resetJitter()
+
+    def _resetJitter(self):
+        """@brief Reset the jitter recorded since the last report."""
+        self._tickCount         = 0
+        self._jitterSum         = 0.0
+        self._maxJitter         = 0.0
+        self._skippedCount      = 0
+
+    def getDelay(self):
+        """@brief Get the time until the next poll is due. Deadlines already
+                  missed are skipped.
+           @return The delay in seconds (0 if the poll is due now)."""
+        delay = self._deadline - monotonic()
+        if delay < -self._periodSeconds:
+            missed = int(-delay // self._periodSeconds)
+            self._deadline = self._deadline + missed * self._periodSeconds
+            self._skippedCount = self._skippedCount + missed
+            delay = delay + missed * self._periodSeconds
+        return max(delay, 0.0)
+
+    def wait(self, stopEvent=None):
+        """@brief Block until the next poll is due and then call tick().
+           @param stopEvent If not None an Event that ends the wait when set.
+           @return False if the wait was ended by stopEvent."""
+        delay = self.getDelay()
+        if stopEvent:
+            if stopEvent.wait(delay):
+                return False
+        elif delay > 0:
+            sleep(delay)
+        self.tick()
+        return True
+
+    def pollNow(self):
+        """@brief Make the next poll due now (E.G to retry a poll at once)."""
+        self._deadline = min(self._deadline, monotonic())
+
+    def tick(self):
+        """@brief Record that the poll due has started and move to the next deadline."""
+        jitter = monotonic() - self._deadline
+        self._tickCount = self._tickCount + 1
+        self._jitterSum = self._jitterSum + jitter
+        self._maxJitter = max(self._maxJitter, jitter)
+        self._deadline = self._deadline + self._periodSeconds
+
+    def isReportDue(self):
+        """@return True if the jitter should be reported."""
+        return monotonic() >= self._reportTime
+
+    def getReport(self):
+        """@brief Get the jitter recorded since the last report and start recording again.
+           @return A report string."""
+        self._reportTime = monotonic() + PollScheduler.REPORT_SECONDS
+        meanJitter = self._jitterSum / self._tickCount if self._tickCount else 0.0
+        report = "Poll schedule: {} polls, jitter mean {:.1f} ms, max {:.1f} ms, {} skipped.".format(self._tickCount,
+                                                                                                   meanJitter * 1000,
+                                                                                                   self._maxJitter * 1000,
+                                                                                                   self._skippedCount)
+        self._resetJitter()
+        return report
+
+class LB2120Sampler(object):
+    """@brief Responsible for converting successive model.json reads from one
+              LB2120 into LB2120Stats instances. The rates are calculated from
+              the change in the byte counters between reads."""
+
+    def __init__(self, uio, deviceID=None, statusCache=None, metrics=None):
+        """@brief Constructor
+           @param uio A UIO instance.
+           @param deviceID The ID of the LB2120 the samples are read from.
+           @param statusCache A StatusCache instance to update on every read or None.
+           @param metrics A CollectorMetrics instance to update on every read or None."""
+        self._uio           = uio
+        self._deviceID      = deviceID
+        self._statusCache   = statusCache
+        self._metrics       = metrics
+        fields = ModelJSONExtractor.DEFAULT_FIELDS
+        if statusCache:
+            fields = fields + (ModelJSONExtractor.SIGNAL_RSRP,)
+        self._extractor     = ModelJSONExtractor(fields)
+        self._lastFetchTime = None
+        self._lastDataRX    = -1
+        self._lastDataTX    = -1
+
+    def _info(self, msg):
+        """@brief Show an info message, prefixed with the device ID if set."""
+        if self._deviceID:
+            msg = "{}: {}".format(self._deviceID, msg)
+        self._uio.info(msg)
+
+    def _updateMetrics(self, lb2120Stats):
+        """@brief Update the metrics that hold the latest stats.
+           @param lb2120Stats The LB2120Stats instance read."""
+        self._metrics.setGauge("lb2120_down_mbps", lb2120Stats.downMbps, device=self._deviceID)
+        self._metrics.setGauge("lb2120_up_mbps", lb2120Stats.upMbps, device=self._deviceID)
+        self._metrics.setGauge("lb2120_temperature_celsius", lb2120Stats.tempC, device=self._deviceID)
+        self._metrics.setGauge("lb2120_temp_critical", 1 if lb2120Stats.tempCrticial else 0, device=self._deviceID)
+        self._metrics.setGauge("lb2120_sample_timestamp_seconds", lb2120Stats.sampleTime.timestamp(), device=self._deviceID)
+
+    @staticmethod
+    def GetFetchTime(requestTime, responseTime):
+        """@brief Get the time at which the LB2120 read its counters.
+           @param requestTime The monotonic time the model.json request was made.
+           @param responseTime The monotonic time the model.json response was read.
+           @return The monotonic time half way through the request."""
+        return (requestTime + responseTime) / 2
+
+    @staticmethod
+    def GetRSRP(value):
+        """@brief Get the RSRP (RX power) read from model.json.
+           @param value The RSRP value read.
+           @return The RSRP as an int or None if the value is not a number."""
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def getStats(self, jsonContent, fetchTime):
+        """@brief Get the stats from a model.json read.
+           @param jsonContent The model.json text read from the LB2120.
+           @param fetchTime The monotonic time at which model.json was read (see GetFetchTime()).
+           @return A LB2120Stats instance or None if this is the first read."""
+        #The rates use the monotonic time of each read so they are not
+        #affected by the wall clock changing.
+        elapsedTime = None
+        if self._lastFetchTime is not None:
+            elapsedTime = fetchTime - self._lastFetchTime
+        self._lastFetchTime = fetchTime
+
+        #Grab the values associated with throughput
+        parseStart = monotonic()
+        values = self._extractor.extract(jsonContent)
+        if self._metrics:
+            parseSeconds = monotonic()-parseStart
+            self._metrics.recordStage(CollectorMetrics.STAGE_PARSE, parseSeconds)
+            self._metrics.observe("lb2120_parse_seconds", parseSeconds, device=self._deviceID)
+        dataRX, dataTX, tempC, devTempCritical = values[:4]
+        if self._statusCache:
+            rsrp = LB2120Sampler.GetRSRP(values[4])
+            #The status is left as it was if the RSRP is not known (E.G when
+            #the LB2120 has no signal) so that the stats are still read.
+            if rsrp is not None:
+                self._statusCache.update(self._deviceID, {StatusCache.RXP_KEY: rsrp})
+        dataRX = int(dataRX)
+        dataTX = int(dataTX)
+        tempC  = float(tempC)
+
+        lb2120Stats = None
+        if self._lastDataRX != -1 and elapsedTime and elapsedTime > 0:
+            deltaDataRX, rxChange = LB2120Stats.GetCounterDelta(self._lastDataRX, dataRX)
+            deltaDataTX, txChange = LB2120Stats.GetCounterDelta(self._lastDataTX, dataTX)
+            if rxChange:
+                self._info("RX byte counter {} ({} -> {})".format(rxChange, self._lastDataRX, dataRX))
+            if txChange:
+                self._info("TX byte counter {} ({} -> {})".format(txChange, self._lastDataTX, dataTX))
+
+            downLoadBps = (deltaDataRX/elapsedTime) * 8
+            upLoadBps = (deltaDataTX/elapsedTime) * 8
+            downLoadMBps = float(downLoadBps)/1E6
+            upLoadMBps   = float(upLoadBps/1E6)
+
+            lb2120Stats = LB2120Stats()
+            lb2120Stats.downMbps = downLoadMBps
+            lb2120Stats.upMbps = upLoadMBps
+            lb2120Stats.tempC = tempC
+            lb2120Stats.tempCrticial = devTempCritical
+            lb2120Stats.rxBytes = dataRX
+            lb2120Stats.txBytes = dataTX
+            lb2120Stats.deviceID = self._deviceID
+            lb2120Stats.sampleTime = datetime.datetime.now() - datetime.timedelta(seconds=monotonic()-fetchTime)
+            if self._metrics:
+                self._updateMetrics(lb2120Stats)
+
+        #Save the last results for use next time around
+        self._lastDataRX = dataRX
+        self._lastDataTX = dataTX
+        return lb2120Stats
+
+class LB2120(Thread):
+    """@brief Responsibile for connecting to the Netgear LB2120 4G modem and
+              reading stats from it.
+       @param uio A UIO instance.
+       @param options An optparse OptionParser instance."""
+
+    DEFAULT_ADDRESS     = "192.168.5.1"
+    PASSWORD_ENV_VAR    = "NETGEAR_LB2120_PASSWORD"
+    POLL_DELAY_SECONDS  = 10
+
+    @staticmethod
+    def GetPassword(uio):
+        """@brief Get the LB2120 web interface password from the environment,
+                  prompting the user if it is not defined there.
+           @param uio A UIO instance.
+           @return The password."""
+        password = os.environ.get(LB2120.PASSWORD_ENV_VAR)
+        if not password:
+            uio.info("{} environmental variable undefined.".format(LB2120.PASSWORD_ENV_VAR))
+            password = uio.getInput("Enter the password of the Netgear LB2120 4G router", noEcho=True)
+        return password
+
+    @staticmethod
+    def ResumeSession(client, sessionCache, address):
+        """@brief Pass the saved login session of an LB2120 to a client so
+                  that it reads model.json without logging in.
+           @param client The client used to read the LB2120 web API.
+           @param sessionCache A SessionCache instance or None.
+           @param address The address of the LB2120.
+           @return True if the client is using the saved session."""
+        if not sessionCache:
+            return False
+        cookies = sessionCache.get(address)
+        return bool(cookies) and client.setSession(cookies)
+
+    @staticmethod
+    def CreateClient(options, password):
+        """@brief Create the client used to read the LB2120 web API.
+           @param options The command line options.
+           @param password The LB2120 web interface password.
+           @return A LB2120HTTPClient or LB2120BrowserClient instance."""
+        if options.browser:
+            return LB2120BrowserClient(options.address, password)
+        return LB2120HTTPClient(options.address, password)
+
+    def __init__(self, uio, options, queue, statusCache=None, metrics=None, profiler=None, password=None, sessionCache=None):
+        """@brief Constructor
+           @param uio A UIO instance for user input and output.
+           @param options An instance of argparse options.
+           @param queue The queue to push LB2120Stats object into.
+           @param statusCache A StatusCache instance to update on every read or None.
+           @param metrics A CollectorMetrics instance to update on every read or None.
+           @param profiler A SampleProfiler instance to profile this thread or None.
+           @param password The LB2120 web interface password. If None the user is prompted (see GetPassword()).
+           @param sessionCache A SessionCache instance holding the login session to reuse or None to always login.
+           """
+        Thread.__init__(self)
+        self._uio       = uio
+        self._options   = options
+        self._queue     = queue
+        self._statusCache = statusCache
+        self._metrics   = metrics
+        self._profiler  = profiler
+        self._sessionCache = sessionCache
+        self._stopEvent = Event()
+        self.running    = False
+        #The exception that stopped the thread or None.
+        self.error      = None
+
+        self._password = password or LB2120.GetPassword(uio)
+
+    def getPassword(self):
+        """@return The LB2120 web interface password."""
+        return self._password
+
+    def run(self):
+        """@brief A thread that reads stats from the LB2120 4G modem"""
+        try:
+            self._poll()
+        except Exception as ex:
+            self.error = ex
+            self._uio.error("The LB2120 poller stopped: {}".format(repr(ex)))
+
+    def _poll(self):
+        """@brief Read stats from the LB2120 4G modem until shutdown."""
+        client = LB2120.CreateClient(self._options, self._password)
+        deviceID = self._options.address
+        sampler = LB2120Sampler(self._uio, deviceID, self._statusCache, self._metrics)
+        scheduler = PollScheduler(self._options.psec)
+        breaker = CircuitBreaker(deviceID, self._uio, self._metrics)
+        if self._profiler:
+            self._profiler.enable()
+        try:
+            #A session saved by an earlier poller (or run) is used until the LB2120 rejects it.
+            sessionResumed = LB2120.ResumeSession(client, self._sessionCache, self._options.address)
+            loggedIn = sessionResumed
+            self.running = True
+            while self.running:
+                if not scheduler.wait(self._stopEvent):
+                    break
+                #While the LB2120 is failing polls are skipped until the retry delay has passed.
+                if not breaker.isAttemptAllowed():
+                    continue
+                try:
+                    if not loggedIn:
+                        client.login()
+                        loggedIn = True
+                        if self._sessionCache:
+                            self._sessionCache.set(self._options.address, client.getSession())
+                        if self._metrics:
+                            self._metrics.incCounter("lb2120_logins_total", device=deviceID)
+
+                    requestTime = monotonic()
+                    jsonContent = client.getModelJSON()
+                    responseTime = monotonic()
+                    sessionResumed = False
+                    if self._metrics:
+                        self._metrics.recordStage(CollectorMetrics.STAGE_FETCH, responseTime-requestTime)
+                        self._metrics.observe("lb2120_poll_seconds", responseTime-requestTime, device=deviceID)
+                    lb2120Stats = sampler.getStats(jsonContent, LB2120Sampler.GetFetchTime(requestTime, responseTime))
+                    breaker.recordSuccess()
+                    if lb2120Stats:
+                        lb2120Stats.queuedTime = monotonic()
+                        self._queue.put(lb2120Stats)
+
+                except LB2120AuthError as ex:
+                    #The session has expired, login again next time around.
+                    loggedIn = False
+                    if self._sessionCache:
+                        self._sessionCache.clear(self._options.address)
+                    if sessionResumed:
+                        #The saved session has expired, this is not a failure of the LB2120.
+                        self._uio.info(str(ex))
+                        sessionResumed = False
+                        scheduler.pollNow()
+                        continue
+                    self._uio.error(str(ex))
+                    if self._metrics:
+                        self._metrics.incCounter("lb2120_poll_errors_total", device=deviceID)
+                    breaker.recordFailure(ex)
+
+                except Exception as ex:
+                    if self._metrics:
+                        self._metrics.incCounter("lb2120_poll_errors_total", device=deviceID)
+                    lines = traceback.format_exc().split('\n')
+                    for l in lines:
+                        self._uio.error(l)
+                    #Once the LB2120 is considered down its connection (or
+                    #browser) is closed and a new one is opened when it is tried again.
+                    #The saved session (if any) is tried before logging in again.
+                    if breaker.recordFailure(ex):
+                        client.close()
+                        sessionResumed = LB2120.ResumeSession(client, self._sessionCache, self._options.address)
+                        loggedIn = sessionResumed
+
+                if scheduler.isReportDue():
+                    self._uio.info(scheduler.getReport())
+
+        finally:
+            if self._profiler:
+                self._profiler.disable()
+            client.close()
+
+    def shutdown(self):
+        """@brief Stop the thread running"""
+        self.running = False
+        self._stopEvent.set()
+
+class LB2120Device(object):
+    """@brief Holds the details of one LB2120 read by LB2120Fleet."""
+
+    def __init__(self, deviceID, address, password, pollSeconds):
+        """@brief Constructor
+           @param deviceID The ID stored with the samples read from the LB2120.
+           @param address The address of the LB2120 4G modem.
+           @param password The LB2120 web interface password.
+           @param pollSeconds The poll period in seconds."""
+        self.deviceID       = deviceID
+        self.address        = address
+        self.password       = password
+        self.pollSeconds    = pollSeconds
+
+class LB2120Fleet(Thread):
+    """@brief Responsible for reading stats from many LB2120 4G modems. Each
+              LB2120 is read by a task on an asyncio event loop run by this
+              thread so that one process can poll dozens of devices.
+              The LB2120Stats read are pushed into the same queue as the
+              LB2120 thread."""
+
+    #The keys in the devices file.
+    ID_KEY              = "id"
+    ADDRESS_KEY         = "address"
+    PASSWORD_KEY        = "password"
+    PSEC_KEY            = "psec"
+
+    @staticmethod
+    def LoadDevices(uio, devicesFile, defaultPollSeconds):
+        """@brief Load the LB2120 devices from a JSON file. The file holds a
+                  list of objects, E.G
+                  [{"id": "home", "address": "192.168.5.1", "password": "secret", "psec": 10}]
+                  The id, password and psec are optional. The id defaults to
+                  the address and the password to the NETGEAR_LB2120_PASSWORD
+                  environmental variable.
+           @param uio A UIO instance.
+           @param devicesFile The devices file.
+           @param defaultPollSeconds The poll period for devices without a psec.
+           @return A list of LB2120Device instances."""
+        with open(devicesFile) as fd:
+            deviceList = json.load(fd)
+
+        defaultPassword = None
+        devices = []
+        deviceIDs = set()
+        for deviceDict in deviceList:
+            address = deviceDict.get(LB2120Fleet.ADDRESS_KEY)
+            if not address:
+                raise Exception("{}: A device has no {}.".format(devicesFile, LB2120Fleet.ADDRESS_KEY))
+            deviceID = str(deviceDict.get(LB2120Fleet.ID_KEY, address))
+            if deviceID in deviceIDs:
+                raise Exception("{}: {} is not a unique device {}.".format(devicesFile, deviceID, LB2120Fleet.ID_KEY))
+            deviceIDs.add(deviceID)
+
+            password = deviceDict.get(LB2120Fleet.PASSWORD_KEY)
+            if not password:
+                if not defaultPassword:
+                    defaultPassword = os.environ.get(LB2120.PASSWORD_ENV_VAR)
+                if not defaultPassword:
+                    uio.info("{} environmental variable undefined.".format(LB2120.PASSWORD_ENV_VAR))
+                    defaultPassword = uio.getInput("Enter the password of the Netgear LB2120 4G routers", noEcho=True)
+                password = defaultPassword
+
+            devices.append(LB2120Device(deviceID, address, password, deviceDict.get(LB2120Fleet.PSEC_KEY, defaultPollSeconds)))
+
+        if not devices:
+            raise Exception("{}: No devices defined.".format(devicesFile))
+        return devices
+
+    def __init__(self, uio, devices, queue, statusCache=None, metrics=None, profiler=None, sessionCache=None):
+        """@brief Constructor
+           @param uio A UIO instance for user input and output.
+           @param devices A list of LB2120Device instances.
+           @param queue The queue to push LB2120Stats object into.
+           @param statusCache A StatusCache instance to update on every read or None.
+           @param metrics A CollectorMetrics instance to update on every read or None.
+           @param profiler A SampleProfiler instance to profile this thread or None.
+           @param sessionCache A SessionCache instance holding the login sessions to reuse or None to always login."""
+        Thread.__init__(self)
+        self._uio       = uio
+        self._devices   = devices
+        self._queue     = queue
+        self._statusCache = statusCache
+        self._metrics   = metrics
+        self._profiler  = profiler
+        self._sessionCache = sessionCache
+        self._loop      = None
+        self._stopEvent = None
+        self.running    = False
+        #The exception that stopped the thread or None.
+        self.error      = None
+
+    async def _pollDevice(self, device):
+        """@brief Read stats from one LB2120 until shutdown.
+           @param device The LB2120Device to read."""
+        client = AsyncLB2120HTTPClient(device.address, device.password)
+        sampler = LB2120Sampler(self._uio, device.deviceID, self._statusCache, self._metrics)
+        scheduler = PollScheduler(device.pollSeconds)
+        breaker = CircuitBreaker(device.deviceID, self._uio, self._metrics)
+        #Calls that may block (writing the session file or waiting for space
+        #in the queue) are made from the default executor so that the other
+        #devices are still read.
+        loop = asyncio.get_running_loop()
+        try:
+            #A session saved by an earlier poller (or run) is used until the LB2120 rejects it.
+            sessionResumed = LB2120.ResumeSession(client, self._sessionCache, device.address)
+            loggedIn = sessionResumed
+            while self.running:
+                try:
+                    await asyncio.wait_for(self._stopEvent.wait(), scheduler.getDelay())
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                scheduler.tick()
+                #While the LB2120 is failing polls are skipped until the retry delay has passed.
+                if not breaker.isAttemptAllowed():
+                    continue
+
+                try:
+                    if not loggedIn:
+                        await client.login()
+                        loggedIn = True
+                        if self._sessionCache:
+                            await loop.run_in_executor(None, self._sessionCache.set, device.address, client.getSession())
+                        if self._metrics:
+                            self._metrics.incCounter("lb2120_logins_total", device=device.deviceID)
+
+                    requestTime = monotonic()
+                    jsonContent = await client.getModelJSON()
+                    responseTime = monotonic()
+                    sessionResumed = False
+                    if self._metrics:
+                        self._metrics.recordStage(CollectorMetrics.STAGE_FETCH, responseTime-requestTime)
+                        self._metrics.observe("lb2120_poll_seconds", responseTime-requestTime, device=device.deviceID)
+                    lb2120Stats = sampler.getStats(jsonContent, LB2120Sampler.GetFetchTime(requestTime, responseTime))
+                    breaker.recordSuccess()
+                    if lb2120Stats:
+                        lb2120Stats.queuedTime = monotonic()
+                        await loop.run_in_executor(None, self._queue.put, lb2120Stats)
+
+                except LB2120AuthError as ex:
+                    #The session has expired, login again next time around.
+                    loggedIn = False
+                    if self._sessionCache:
+                        await loop.run_in_executor(None, self._sessionCache.clear, device.address)
+                    if sessionResumed:
+                        #The saved session has expired, this is not a failure of the LB2120.
+                        self._uio.info("{}: {}".format(device.deviceID, str(ex)))
+                        sessionResumed = False
+                        scheduler.pollNow()
+                        continue
+                    self._uio.error("{}: {}".format(device.deviceID, str(ex)))
+                    if self._metrics:
+                        self._metrics.incCounter("lb2120_poll_errors_total", device=device.deviceID)
+                    breaker.recordFailure(ex)
+
+                except asyncio.CancelledError:
+                    raise
+
+                except Exception as ex:
+                    if self._metrics:
+                        self._metrics.incCounter("lb2120_poll_errors_total", device=device.deviceID)
+                    self._uio.error("{}: {}".format(device.deviceID, repr(ex)))
+                    if breaker.recordFailure(ex):
+                        client.close()
+                        sessionResumed = LB2120.ResumeSession(client, self._sessionCache, device.address)
+                        loggedIn = sessionResumed
+
+                if scheduler.isReportDue():
+                    self._uio.info("{}: {}".format(device.deviceID, scheduler.getReport()))
+
+        finally:
+            client.close()
+
+    async def _pollDevices(self):
+        """@brief Read stats from all the LB2120 devices until shutdown."""
+        self._stopEvent = asyncio.Event()
+        await asyncio.gather(*(self._pollDevice(device) for device in self._devices))
+
+    def run(self):
+        """@brief A thread that runs the event loop reading the LB2120 devices."""
+        self._loop = asyncio.new_event_loop()
+        self.running = True
+        if self._profiler:
+            self._profiler.enable()
+        try:
+            self._loop.run_until_complete(self._pollDevices())
+        except Exception as ex:
+            self.error = ex
+            self._uio.error("The LB2120 poller stopped: {}".format(repr(ex)))
+        finally:
+            if self._profiler:
+                self._profiler.disable()
+            self._loop.close()
+
+    def shutdown(self):
+        """@brief Stop the thread running"""
+        self.running = False
+        if self._loop and self._stopEvent and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._stopEvent.set)
+            except RuntimeError:
+                #The event loop has already closed.
+                pass
+
+class LB2120Aligner(object):
+    """@brief Responsible for reading the LB2120 signal strength at a high rate
+              while an antenna is aligned. Only the signal strength fields are
+              extracted from model.json and nothing is stored in the database.
+              The values are smoothed and shown along with the poll rate
+              achieved and the time taken to read model.json."""
+
+    DEFAULT_POLL_SECONDS    = 0.25
+    DEFAULT_ALPHA           = 0.5
+    SIGNAL_FIELDS           = (ModelJSONExtractor.SIGNAL_RSSI,
+                               ModelJSONExtractor.SIGNAL_RSRP,
+                               ModelJSONExtractor.SIGNAL_RSRQ,
+                               ModelJSONExtractor.SIGNAL_SINR)
+    SIGNAL_NAMES            = ("RSSI", "RSRP", "RSRQ", "SINR")
+    SIGNAL_UNITS            = ("dBm", "dBm", "dB", "dB")
+    #The number of polls over which the poll rate is measured.
+    RATE_POLLS              = 20
+
+    @staticmethod
+    def GetSmoothedValues(smoothedValues, values, alpha):
+        """@brief Apply an exponential moving average to the signal values.
+           @param smoothedValues The previous smoothed values or None for the first read.
+           @param values The values read.
+           @param alpha The weight (0 - 1) of the values read. 1 = no smoothing.
+           @return A tuple of the smoothed values."""
+        if smoothedValues is None:
+            return tuple(float(value) for value in values)
+        return tuple(smoothed + alpha * (float(value) - smoothed) for smoothed, value in zip(smoothedValues, values))
+
+    def __init__(self, uio, options, statusCache=None):
+        """@brief Constructor
+           @param uio A UIO instance.
+           @param options The command line options.
+           @param statusCache A StatusCache instance to publish the values to or None."""
+        self._uio           = uio
+        self._options       = options
+        self._statusCache   = statusCache
+        self._extractor     = ModelJSONExtractor(LB2120Aligner.SIGNAL_FIELDS)
+        self._pollTimes     = deque(maxlen=LB2120Aligner.RATE_POLLS)
+        #Set by shutdown() to end the wait for the next poll.
+        self._stopEvent     = Event()
+        self.running        = False
+
+    def getPollRate(self):
+        """@return The number of polls per second measured over the last
+                   RATE_POLLS polls or None if not yet known."""
+        if len(self._pollTimes) < 2:
+            return None
+        return (len(self._pollTimes)-1) / (self._pollTimes[-1] - self._pollTimes[0])
+
+    def _publish(self, smoothedValues, sampleTime, pollSeconds):
+        """@brief Publish the latest smoothed values.
+           @param smoothedValues A tuple of the smoothed signal values.
+           @param sampleTime The time the values were read.
+           @param pollSeconds The time taken to read model.json."""
+        if self._statusCache:
+            status = {name: round(value, 1) for name, value in zip(LB2120Aligner.SIGNAL_NAMES, smoothedValues)}
+            #The Aligner app reads the RX power as an integer.
+            status[StatusCache.RXP_KEY] = int(round(smoothedValues[1]))
+            status[StatsTable.TIMESTAMP] = sampleTime.isoformat()
+            self._statusCache.update(self._options.address, status)
+
+        pollRate = self.getPollRate()
+        signalText = "  ".join("{} {:6.1f} {:<3}".format(name, value, units) for name, value, units in zip(LB2120Aligner.SIGNAL_NAMES,
+                                                                                                           smoothedValues,
+                                                                                                           LB2120Aligner.SIGNAL_UNITS))
+        self._uio.info("{}  {}  ({} Hz, poll {:.0f} ms)".format(sampleTime.strftime("%H:%M:%S.%f")[:-3],
+                                                               signalText,
+                                                               "{:.1f}".format(pollRate) if pollRate else "-",
+                                                               pollSeconds * 1000))
+
+    def run(self):
+        """@brief A blocking method that reads the signal strength until shutdown() is called."""
+        password = LB2120.GetPassword(self._uio)
+        client = LB2120.CreateClient(self._options, password)
+        sessionCache = SessionCache(self._options.session, self._uio)
+        smoothedValues = None
+        scheduler = PollScheduler(self._options.asec)
+        try:
+            sessionResumed = LB2120.ResumeSession(client, sessionCache, self._options.address)
+            loggedIn = sessionResumed
+            self._stopEvent.clear()
+            self.running = True
+            while self.running:
+                if not scheduler.wait(self._stopEvent):
+                    break
+                try:
+                    if not loggedIn:
+                        client.login()
+                        loggedIn = True
+                        sessionCache.set(self._options.address, client.getSession())
+
+                    pollStart = monotonic()
+                    jsonContent = client.getModelJSON()
+                    pollSeconds = monotonic() - pollStart
+                    sessionResumed = False
+                    self._pollTimes.append(pollStart)
+                    sampleTime = datetime.datetime.now() - datetime.timedelta(seconds=pollSeconds/2)
+                    smoothedValues = LB2120Aligner.GetSmoothedValues(smoothedValues,
+                                                                     self._extractor.extract(jsonContent),
+                                                                     self._options.alpha)
+                    self._publish(smoothedValues, sampleTime, pollSeconds)
+
+                except LB2120AuthError as ex:
+                    #The session has expired, login again next time around.
+                    loggedIn = False
+                    sessionCache.clear(self._options.address)
+                    if sessionResumed:
+                        self._uio.info(str(ex))
+                        sessionResumed = False
+                        scheduler.pollNow()
+                        continue
+                    self._uio.error(str(ex))
+
+                except Exception as ex:
+                    self._uio.error(str(ex))
+                    if self._options.debug:
+                        raise
+
+                if scheduler.isReportDue():
+                    self._uio.info(scheduler.getReport())
+
+        finally:
+            client.close()
+
+    def shutdown(self):
+        """@brief Stop the run() method."""
+        self.running = False
+        self._stopEvent.set()
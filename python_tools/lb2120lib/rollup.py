@@ -0,0 +1,209 @@
+from    .stats import LB2120Stats, StatsTable
+
+class RollupTable(object):
+    """@brief Responsible for defining a table that holds the LB2120_STATS
+              samples aggregated over a fixed time period (bucket). The
+              rollup tables are updated as samples are added so that long
+              time periods can be read without reading every sample. Each
+              LB2120 device has its own rows."""
+
+    #Rollup table columns. The averages are held as sums so that a bucket can
+    #be updated incrementally as samples arrive. The DEVICE column is empty
+    #when the LB2120_STATS table has no DEVICE column.
+    TABLE_SCHEMA = {
+        "TIMESTAMP":        "DATETIME NOT NULL",
+        "DEVICE":           "VARCHAR(64) NOT NULL DEFAULT ''",
+        "FIRSTSAMPLE":      "DATETIME(6)",
+        "LASTSAMPLE":       "DATETIME(6)",
+        "SAMPLES":          "INT",
+        "MISSING":          "INT",
+        "SUMDOWNMBPS":      "DOUBLE",
+        "MINDOWNMBPS":      "FLOAT(24)",
+        "MAXDOWNMBPS":      "FLOAT(24)",
+        "SUMUPMBPS":        "DOUBLE",
+        "MINUPMBPS":        "FLOAT(24)",
+        "MAXUPMBPS":        "FLOAT(24)",
+        "SUMTEMPC":         "DOUBLE",
+        "MINTEMPC":         "FLOAT(24)",
+        "MAXTEMPC":         "FLOAT(24)",
+        "RXBYTES":          "BIGINT",
+        "TXBYTES":          "BIGINT"
+    }
+    PRIMARY_KEY     = ("TIMESTAMP", "DEVICE")
+
+    #How each column is combined when a bucket that already exists is updated.
+    SUM_COLUMNS     = ("SAMPLES", "MISSING", "SUMDOWNMBPS", "SUMUPMBPS", "SUMTEMPC", "RXBYTES", "TXBYTES")
+    MIN_COLUMNS     = ("FIRSTSAMPLE", "MINDOWNMBPS", "MINUPMBPS", "MINTEMPC")
+    MAX_COLUMNS     = ("LASTSAMPLE", "MAXDOWNMBPS", "MAXUPMBPS", "MAXTEMPC")
+
+    def __init__(self, resolution, tableName, bucketSeconds):
+        """@brief Constructor
+           @param resolution The name of the resolution (minute, hour or day).
+           @param tableName The database table name.
+           @param bucketSeconds The period of time (seconds) each row covers."""
+        self.resolution     = resolution
+        self.tableName      = tableName
+        self.bucketSeconds  = bucketSeconds
+
+    def getBucketStart(self, timestamp):
+        """@param timestamp A datetime instance.
+           @return The start of the bucket that timestamp falls in."""
+        if self.bucketSeconds >= 86400:
+            return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.bucketSeconds >= 3600:
+            return timestamp.replace(minute=0, second=0, microsecond=0)
+        return timestamp.replace(second=0, microsecond=0)
+
+    def isAligned(self, timestamp):
+        """@return True if timestamp is on a bucket boundary."""
+        return self.getBucketStart(timestamp) == timestamp
+
+    def getBuckets(self, rows, lastCounters):
+        """@brief Aggregate samples into buckets.
+           @param rows A list of LB2120_STATS row dicts in TIMESTAMP order.
+           @param lastCounters A dict holding a tuple of the RX and TX byte
+                               counters of the sample before the first row
+                               for each device ID. This is not changed.
+           @return A list of rollup row dicts."""
+        lastCounters = dict(lastCounters)
+        bucketDict = {}
+        for row in rows:
+            timestamp = row["TIMESTAMP"]
+            deviceID = row.get(StatsTable.DEVICE)
+            bucketKey = (self.getBucketStart(timestamp), deviceID or "")
+            bucket = bucketDict.get(bucketKey)
+            if not bucket:
+                bucket = {"TIMESTAMP":      bucketKey[0],
+                          "DEVICE":         bucketKey[1],
+                          "FIRSTSAMPLE":    timestamp,
+                          "LASTSAMPLE":     timestamp,
+                          "SAMPLES":        0,
+                          "MISSING":        0,
+                          "SUMDOWNMBPS":    0.0,
+                          "MINDOWNMBPS":    row["DOWNMBPS"],
+                          "MAXDOWNMBPS":    row["DOWNMBPS"],
+                          "SUMUPMBPS":      0.0,
+                          "MINUPMBPS":      row["UPMBPS"],
+                          "MAXUPMBPS":      row["UPMBPS"],
+                          "SUMTEMPC":       0.0,
+                          "MINTEMPC":       row["TEMPC"],
+                          "MAXTEMPC":       row["TEMPC"],
+                          "RXBYTES":        0,
+                          "TXBYTES":        0}
+                bucketDict[bucketKey] = bucket
+            bucket["FIRSTSAMPLE"]   = min(bucket["FIRSTSAMPLE"], timestamp)
+            bucket["LASTSAMPLE"]    = max(bucket["LASTSAMPLE"], timestamp)
+            bucket["SAMPLES"]       = bucket["SAMPLES"] + 1
+            bucket["SUMDOWNMBPS"]   = bucket["SUMDOWNMBPS"] + row["DOWNMBPS"]
+            bucket["MINDOWNMBPS"]   = min(bucket["MINDOWNMBPS"], row["DOWNMBPS"])
+            bucket["MAXDOWNMBPS"]   = max(bucket["MAXDOWNMBPS"], row["DOWNMBPS"])
+            bucket["SUMUPMBPS"]     = bucket["SUMUPMBPS"] + row["UPMBPS"]
+            bucket["MINUPMBPS"]     = min(bucket["MINUPMBPS"], row["UPMBPS"])
+            bucket["MAXUPMBPS"]     = max(bucket["MAXUPMBPS"], row["UPMBPS"])
+            bucket["SUMTEMPC"]      = bucket["SUMTEMPC"] + row["TEMPC"]
+            bucket["MINTEMPC"]      = min(bucket["MINTEMPC"], row["TEMPC"])
+            bucket["MAXTEMPC"]      = max(bucket["MAXTEMPC"], row["TEMPC"])
+
+            #The byte counters of each device are independent.
+            rxBytes = row.get("RXBYTES")
+            txBytes = row.get("TXBYTES")
+            if rxBytes is None or txBytes is None:
+                bucket["MISSING"] = bucket["MISSING"] + 1
+                lastCounters.pop(deviceID, None)
+                continue
+            if deviceID in lastCounters:
+                bucket["RXBYTES"] = bucket["RXBYTES"] + LB2120Stats.GetCounterDelta(lastCounters[deviceID][0], rxBytes)[0]
+                bucket["TXBYTES"] = bucket["TXBYTES"] + LB2120Stats.GetCounterDelta(lastCounters[deviceID][1], txBytes)[0]
+            lastCounters[deviceID] = (rxBytes, txBytes)
+
+        return [bucketDict[bucketKey] for bucketKey in sorted(bucketDict)]
+
+    def upsert(self, backend, buckets):
+        """@brief Add buckets to the table, combining them with any rows already
+                  held for the same buckets.
+           @param backend The StorageBackend instance.
+           @param buckets A list of rollup row dicts returned by getBuckets()."""
+        backend.upsertRows(self.tableName,
+                           RollupTable.PRIMARY_KEY,
+                           list(RollupTable.TABLE_SCHEMA.keys()),
+                           buckets,
+                           RollupTable.SUM_COLUMNS,
+                           RollupTable.MIN_COLUMNS,
+                           RollupTable.MAX_COLUMNS)
+
+    def getRebuildSQLCmds(self, backend, sourceTableName, hasCounters, hasDevice=False):
+        """@brief Get the SQL CMDs that rebuild this table from all the samples
+                  held in the source table.
+           @param backend The StorageBackend instance.
+           @param sourceTableName The table holding the samples (LB2120_STATS).
+           @param hasCounters True if the source table has the RXBYTES and TXBYTES columns.
+           @param hasDevice True if the source table has the DEVICE column.
+           @return A list of SQL CMDs."""
+        bucketCol = backend.bucketStart("TIMESTAMP", self.bucketSeconds)
+        if hasDevice:
+            deviceCol = "COALESCE(DEVICE, '') AS DEVICE"
+        else:
+            deviceCol = "'' AS DEVICE"
+
+        if hasCounters:
+            counterCols = "{} AS RXDELTA, {} AS TXDELTA, (RXBYTES IS NULL OR TXBYTES IS NULL) AS MISSING".format(StatsTable.GetCounterDeltaSQL(backend, "RXBYTES"),
+                                                                                                                 StatsTable.GetCounterDeltaSQL(backend, "TXBYTES"))
+        else:
+            counterCols = "NULL AS RXDELTA, NULL AS TXDELTA, 1 AS MISSING"
+
+        sqlCmd = "INSERT INTO `{}` ({}) "\
+                 "SELECT {} AS BUCKET, DEVICE, MIN(TIMESTAMP), MAX(TIMESTAMP), COUNT(*), SUM(MISSING), "\
+                 "SUM(DOWNMBPS), MIN(DOWNMBPS), MAX(DOWNMBPS), "\
+                 "SUM(UPMBPS), MIN(UPMBPS), MAX(UPMBPS), "\
+                 "SUM(TEMPC), MIN(TEMPC), MAX(TEMPC), "\
+                 "COALESCE(SUM(RXDELTA), 0), COALESCE(SUM(TXDELTA), 0) "\
+                 "FROM (SELECT TIMESTAMP, {}, DOWNMBPS, UPMBPS, TEMPC, {} FROM `{}` {}) d "\
+                 "GROUP BY BUCKET, DEVICE;".format(self.tableName,
+                                                   ", ".join(RollupTable.TABLE_SCHEMA.keys()),
+                                                   bucketCol,
+                                                   deviceCol,
+                                                   counterCols,
+                                                   sourceTableName,
+                                                   StatsTable.GetWindowSQL(hasDevice))
+        return ["DELETE FROM `{}`;".format(self.tableName), sqlCmd]
+
+    def getReadSQLCmd(self, backend, start, stop, deviceID=None):
+        """@brief Get the SQL CMD to read the rows between two times. The
+                  averages are returned in the DOWNMBPS, UPMBPS and TEMPC
+                  columns so the rows can be used in place of samples.
+           @param backend The StorageBackend instance.
+           @param start The start date/time.
+           @param stop The stop date/time.
+           @param deviceID If not None only the rows of this device are read.
+                           Otherwise the rows of all devices are combined.
+           @return The SQL CMD."""
+        return "SELECT TIMESTAMP, SUM(SUMDOWNMBPS)/SUM(SAMPLES) AS DOWNMBPS, SUM(SUMUPMBPS)/SUM(SAMPLES) AS UPMBPS, SUM(SUMTEMPC)/SUM(SAMPLES) AS TEMPC, "\
+               "MIN(MINDOWNMBPS) AS MINDOWNMBPS, MAX(MAXDOWNMBPS) AS MAXDOWNMBPS, MIN(MINUPMBPS) AS MINUPMBPS, MAX(MAXUPMBPS) AS MAXUPMBPS, "\
+               "MIN(MINTEMPC) AS MINTEMPC, MAX(MAXTEMPC) AS MAXTEMPC, SUM(SAMPLES) AS SAMPLES, SUM(RXBYTES) AS RXBYTES, SUM(TXBYTES) AS TXBYTES "\
+               "FROM `{}` WHERE TIMESTAMP >= '{}' AND TIMESTAMP < '{}'{} "\
+               "GROUP BY TIMESTAMP ORDER BY TIMESTAMP;".format(self.tableName, start, stop, StatsTable.GetDeviceSQL(backend, deviceID))
+
+    def getTotalsSQLCmd(self, backend, start, stop, period=None, deviceID=None):
+        """@brief Get the SQL CMD that calculates the data transferred over a
+                  period of time. This returns the same columns as
+                  StatsTable.GetTotalsSQLCmd().
+           @param backend The StorageBackend instance.
+           @param start The start date/time. This should be on a bucket boundary.
+           @param stop The stop date/time. This should be on a bucket boundary.
+           @param period None, 'day' or 'week'.
+           @param deviceID If not None only the rows of this device are read.
+           @return The SQL CMD."""
+        if period:
+            periodCol = backend.periodName("TIMESTAMP", period)
+        else:
+            periodCol = "'ALL'"
+
+        return "SELECT {} AS PERIOD, "\
+               "SUM(SAMPLES) AS SAMPLES, MIN(FIRSTSAMPLE) AS START, MAX(LASTSAMPLE) AS STOP, "\
+               "SUM(RXBYTES) AS RXBYTES, SUM(TXBYTES) AS TXBYTES, SUM(MISSING) AS MISSING, "\
+               "NULL AS RXESTBYTES, NULL AS TXESTBYTES, "\
+               "SUM(SUMDOWNMBPS)/SUM(SAMPLES) AS AVGDOWNMBPS, MAX(MAXDOWNMBPS) AS MAXDOWNMBPS, "\
+               "SUM(SUMUPMBPS)/SUM(SAMPLES) AS AVGUPMBPS, MAX(MAXUPMBPS) AS MAXUPMBPS, "\
+               "MIN(MINTEMPC) AS MINTEMPC, MAX(MAXTEMPC) AS MAXTEMPC "\
+               "FROM `{}` WHERE TIMESTAMP >= '{}' AND TIMESTAMP < '{}'{} "\
+               "GROUP BY PERIOD ORDER BY START;".format(periodCol, self.tableName, start, stop, StatsTable.GetDeviceSQL(backend, deviceID))
@@ -0,0 +1,457 @@
+import  json
+import  struct
+import  asyncio
+import  datetime
+import  http.server
+
+from    queue import Queue, Empty, Full
+from    threading import Thread, Lock
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """@brief Responsible for serving the collector metrics over HTTP."""
+
+    METRICS_PATH        = "/metrics"
+    HEALTH_PATH         = "/health"
+    CONTENT_TYPE        = "text/plain; version=0.0.4; charset=utf-8"
+    JSON_CONTENT_TYPE   = "application/json"
+
+    def do_GET(self):
+        """@brief Serve the metrics or the health of each collector component.
+                  /health returns HTTP status 503 if a component is failing."""
+        path = self.path.split("?")[0]
+        if path == MetricsRequestHandler.METRICS_PATH:
+            status = 200
+            contentType = MetricsRequestHandler.CONTENT_TYPE
+            body = self.server.metrics.getText().encode("utf-8")
+        elif path == MetricsRequestHandler.HEALTH_PATH:
+            healthy, componentDict = self.server.metrics.getHealth()
+            status = 200 if healthy else 503
+            contentType = MetricsRequestHandler.JSON_CONTENT_TYPE
+            body = json.dumps({"healthy": healthy, "components": componentDict}, indent=2).encode("utf-8")
+        else:
+            self.send_error(404)
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """@brief Requests are not logged to the console."""
+        pass
+
+class DashboardRequestHandler(http.server.BaseHTTPRequestHandler):
+    """@brief Responsible for serving the live dashboard page and the stream
+              of samples that updates it."""
+
+    def _send(self, contentType, content, cacheSeconds=0):
+        """@brief Send a response.
+           @param contentType The content type.
+           @param content The response body (bytes).
+           @param cacheSeconds The time the browser may cache the response."""
+        self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(content)))
+        if cacheSeconds:
+            self.send_header("Cache-Control", "max-age={}".format(cacheSeconds))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        """@brief Serve the dashboard."""
+        dashboard = self.server.dashboard
+        path = self.path.split("?")[0]
+        if path == "/":
+            self._send("text/html; charset=utf-8", dashboard.getPage())
+        elif path == DashboardServer.PLOTLY_JS_PATH:
+            self._send("application/javascript", dashboard.getPlotlyJS(), DashboardServer.PLOTLY_JS_CACHE_SECONDS)
+        elif path == DashboardServer.EVENTS_PATH:
+            dashboard.streamEvents(self)
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        """@brief Requests are not logged to the console."""
+        pass
+
+class DashboardServer(Thread):
+    """@brief Responsible for serving a live dashboard of the samples read by
+              the collector. The page is drawn once and each new sample is
+              then pushed to the browser (server sent events) and appended to
+              the plot (Plotly.extendTraces). The browser holds at most
+              maxPoints samples of each trace."""
+
+    DEFAULT_POINTS          = 3600
+    EVENTS_PATH             = "/events"
+    PLOTLY_JS_PATH          = "/plotly.min.js"
+    PLOTLY_JS_CACHE_SECONDS = 86400
+    KEEPALIVE_SECONDS       = 15
+    #A browser that falls this many samples behind is disconnected. It then
+    #reconnects and is sent the recent samples again.
+    CLIENT_QUEUE_SIZE       = 1000
+    MAX_POINTS_TAG          = "MAX_POINTS_VALUE"
+    PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>LB2120 Live</title>
+<script src="/plotly.min.js"></script>
+</head>
+<body>
+<div id="plot" style="width:100%;height:90vh;"></div>
+<script>
+const MAX_POINTS = MAX_POINTS_VALUE;
+const traceDict = {};
+let traceCount = 0;
+let pendingSamples = [];
+
+Plotly.newPlot("plot", [], {title: {text: "4G Broadband (live)"},
+                            grid: {rows: 1, columns: 2, pattern: "independent"},
+                            yaxis: {title: {text: "Mbps"}},
+                            yaxis2: {title: {text: "C"}}});
+
+function getTraces(device) {
+    if (!(device in traceDict)) {
+        Plotly.addTraces("plot", [{x: [], y: [], name: device + " Down", mode: "lines"},
+                                  {x: [], y: [], name: device + " Up", mode: "lines"},
+                                  {x: [], y: [], name: device + " Temp", mode: "lines", xaxis: "x2", yaxis: "y2"}]);
+        traceDict[device] = [traceCount, traceCount+1, traceCount+2];
+        traceCount += 3;
+    }
+    return traceDict[device];
+}
+
+//Samples are appended once per frame however fast they arrive.
+function drawSamples() {
+    const deviceDict = {};
+    for (const sample of pendingSamples) {
+        (deviceDict[sample.device] = deviceDict[sample.device] || []).push(sample);
+    }
+    pendingSamples = [];
+    for (const device in deviceDict) {
+        const samples = deviceDict[device];
+        const times = samples.map(sample => sample.time);
+        Plotly.extendTraces("plot", {x: [times, times, times],
+                                     y: [samples.map(sample => sample.down), samples.map(sample => sample.up), samples.map(sample => sample.temp)]},
+                            getTraces(device), MAX_POINTS);
+    }
+}
+
+const events = new EventSource("/events");
+events.onmessage = function(event) {
+    if (pendingSamples.length == 0) {
+        window.requestAnimationFrame(drawSamples);
+    }
+    pendingSamples = pendingSamples.concat(JSON.parse(event.data));
+};
+</script>
+</body>
+</html>
+"""
+
+    @staticmethod
+    def GetSampleDict(deviceID, sampleTime, downMbps, upMbps, tempC):
+        """@return A dict holding a sample as sent to the browser."""
+        return {"device":   str(deviceID),
+                "time":     sampleTime.isoformat(sep=" ", timespec="milliseconds"),
+                "down":     round(downMbps, 3),
+                "up":       round(upMbps, 3),
+                "temp":     tempC}
+
+    @staticmethod
+    def GetEvent(sampleDicts):
+        """@param sampleDicts A list of sample dicts.
+           @return The server sent event holding the samples."""
+        return "data: {}\n\n".format(json.dumps(sampleDicts, separators=(",", ":"))).encode("utf-8")
+
+    def __init__(self, uio, port, history, maxPoints=DEFAULT_POINTS):
+        """@brief Constructor
+           @param uio A UIO instance.
+           @param port The TCP port to serve the dashboard on.
+           @param history The SampleHistory holding the recent samples sent
+                          to a browser when it connects.
+           @param maxPoints The maximum number of samples shown in each trace."""
+        Thread.__init__(self)
+        self.daemon         = True
+        self._uio           = uio
+        self._port          = port
+        self._history       = history
+        self._maxPoints     = maxPoints
+        self._lock          = Lock()
+        self._clientSet     = set()
+        self._plotlyJS      = None
+        self._running       = True
+        self._server        = http.server.ThreadingHTTPServer(("", port), DashboardRequestHandler)
+        self._server.daemon_threads = True
+        self._server.dashboard = self
+
+    def getPage(self):
+        """@return The dashboard page (bytes)."""
+        return DashboardServer.PAGE.replace(DashboardServer.MAX_POINTS_TAG, str(self._maxPoints)).encode("utf-8")
+
+    def getPlotlyJS(self):
+        """@return The plotly.js library (bytes) so that no internet access is required."""
+        if self._plotlyJS is None:
+            from plotly.offline import get_plotlyjs
+            self._plotlyJS = get_plotlyjs().encode("utf-8")
+        return self._plotlyJS
+
+    def _getRecentEvent(self):
+        """@return The server sent event holding the recent samples or None if there are none."""
+        sampleDicts = []
+        for deviceID, samples in self._history.getRecent(self._maxPoints).items():
+            for sampleTime, downMbps, upMbps, tempC in samples:
+                sampleDicts.append(DashboardServer.GetSampleDict(deviceID, datetime.datetime.fromtimestamp(sampleTime), downMbps, upMbps, tempC))
+        if not sampleDicts:
+            return None
+        return DashboardServer.GetEvent(sampleDicts)
+
+    def streamEvents(self, handler):
+        """@brief Send the recent samples and then each new sample to a browser
+                  until it disconnects or the dashboard is shut down.
+           @param handler The DashboardRequestHandler of the browser request."""
+        clientQueue = Queue(DashboardServer.CLIENT_QUEUE_SIZE)
+        with self._lock:
+            self._clientSet.add(clientQueue)
+        try:
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.send_header("Cache-Control", "no-cache")
+            handler.end_headers()
+            recentEvent = self._getRecentEvent()
+            if recentEvent:
+                handler.wfile.write(recentEvent)
+            while self._running:
+                try:
+                    event = clientQueue.get(timeout=DashboardServer.KEEPALIVE_SECONDS)
+                except Empty:
+                    #Lets us find browsers that have gone.
+                    event = b": keepalive\n\n"
+                with self._lock:
+                    if event is None or clientQueue not in self._clientSet:
+                        break
+                handler.wfile.write(event)
+                handler.wfile.flush()
+
+        except (ConnectionError, OSError):
+            pass
+
+        finally:
+            with self._lock:
+                self._clientSet.discard(clientQueue)
+
+    def publish(self, lb2120Stats):
+        """@brief Send a sample to every browser showing the dashboard.
+           @param lb2120Stats The LB2120Stats instance."""
+        with self._lock:
+            if not self._clientSet:
+                return
+            event = DashboardServer.GetEvent([DashboardServer.GetSampleDict(lb2120Stats.deviceID,
+                                                                            lb2120Stats.sampleTime,
+                                                                            lb2120Stats.downMbps,
+                                                                            lb2120Stats.upMbps,
+                                                                            lb2120Stats.tempC)])
+            for clientQueue in list(self._clientSet):
+                try:
+                    clientQueue.put_nowait(event)
+                except Full:
+                    self._clientSet.discard(clientQueue)
+
+    def run(self):
+        """@brief A thread that serves the dashboard until shutdown."""
+        self._uio.info("Serving the live dashboard on http://0.0.0.0:{}/".format(self._port))
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """@brief Stop serving the dashboard."""
+        self._running = False
+        with self._lock:
+            for clientQueue in self._clientSet:
+                try:
+                    clientQueue.put_nowait(None)
+                except Full:
+                    pass
+            self._clientSet.clear()
+        self._server.shutdown()
+        self._server.server_close()
+
+class MetricsServer(Thread):
+    """@brief Responsible for serving the CollectorMetrics on a HTTP /metrics
+              endpoint for Prometheus (or any OpenMetrics scraper)."""
+
+    def __init__(self, uio, metrics, port):
+        """@brief Constructor
+           @param uio A UIO instance.
+           @param metrics The CollectorMetrics instance to serve.
+           @param port The TCP port to serve the metrics on."""
+        Thread.__init__(self)
+        self.daemon         = True
+        self._uio           = uio
+        self._server        = http.server.ThreadingHTTPServer(("", port), MetricsRequestHandler)
+        self._server.metrics = metrics
+        self._port          = port
+
+    def run(self):
+        """@brief A thread that serves the metrics until shutdown."""
+        self._uio.info("Serving metrics on http://0.0.0.0:{}{}".format(self._port, MetricsRequestHandler.METRICS_PATH))
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """@brief Stop serving the metrics."""
+        self._server.shutdown()
+        self._server.server_close()
+
+class StatusCache(object):
+    """@brief Holds the latest status read from the LB2120 as the reply sent
+              to the Aligner Android app. The reply is serialised once when
+              the status changes rather than for every request."""
+
+    RXP_KEY             = "RXP"
+
+    def __init__(self, deviceID=None):
+        """@brief Constructor
+           @param deviceID The ID of the LB2120 whose status is held. Updates
+                           from other devices are ignored. If None the status
+                           of any device is held."""
+        self._deviceID  = deviceID
+        self._status    = None
+        self._reply     = None
+
+    def update(self, deviceID, status):
+        """@brief Update the status. Called by the poller after each read.
+           @param deviceID The ID of the LB2120 the status was read from.
+           @param status A dict holding the status."""
+        if self._deviceID is not None and deviceID != self._deviceID:
+            return
+        if status == self._status:
+            return
+        msg = json.dumps(status).encode("utf-8")
+        self._status = status
+        #The app reads a 4 byte (big endian) length followed by the JSON message.
+        #The reply is replaced in a single assignment so no lock is required.
+        self._reply = struct.pack(">i", len(msg)) + msg
+
+    def getReply(self):
+        """@return The reply holding the latest status or None if no status has been read."""
+        return self._reply
+
+class AYTProtocol(asyncio.DatagramProtocol):
+    """@brief Receives the AYT (are you there) UDP broadcast messages sent by the Aligner app."""
+
+    def __init__(self, onMessage):
+        """@brief Constructor
+           @param onMessage The method called with the message (bytes) and sender address."""
+        self._onMessage = onMessage
+
+    def datagram_received(self, data, addr):
+        """@brief Called by the event loop when a message is received."""
+        self._onMessage(data, addr)
+
+class StatusResponder(Thread):
+    """@brief Responsible for answering the status requests that the Aligner
+              Android app broadcasts (every 250 ms) with the latest status in
+              the StatusCache. Each app sends the TCP port that it listens on
+              in the request. A TCP connection is opened to each app and the
+              reply is written on it for every request received. No LB2120
+              read is made for a request so any number of apps may be served."""
+
+    DEFAULT_PORT        = 18912
+    AYT_KEY             = "AYT"
+    AYT_MESSAGE         = "GET_LB2120_STATUS"
+    TCP_PORT_KEY        = "TCP_PORT"
+    CONNECT_TIMEOUT     = 5
+    #If an app is not reading the replies they are dropped once this many bytes are waiting.
+    MAX_WRITE_BUFFER    = 4096
+
+    def __init__(self, uio, statusCache, port=DEFAULT_PORT):
+        """@brief Constructor
+           @param uio A UIO instance.
+           @param statusCache The StatusCache holding the replies.
+           @param port The UDP port to listen on."""
+        Thread.__init__(self)
+        self._uio           = uio
+        self._statusCache   = statusCache
+        self._port          = port
+        self._loop          = None
+        self._stopEvent     = None
+        self._writerDict    = {}
+
+    def _onAYT(self, data, addr):
+        """@brief Called when a UDP message is received.
+           @param data The message.
+           @param addr The address of the sender."""
+        try:
+            request = json.loads(data)
+            if request.get(StatusResponder.AYT_KEY) != StatusResponder.AYT_MESSAGE:
+                return
+            appAddress = (addr[0], int(request[StatusResponder.TCP_PORT_KEY]))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return
+
+        reply = self._statusCache.getReply()
+        if not reply:
+            return
+
+        if appAddress in self._writerDict:
+            writer = self._writerDict[appAddress]
+            if writer is None:
+                #Still connecting
+                return
+            if writer.is_closing():
+                del self._writerDict[appAddress]
+            elif writer.transport.get_write_buffer_size() < StatusResponder.MAX_WRITE_BUFFER:
+                writer.write(reply)
+                return
+            else:
+                return
+
+        self._writerDict[appAddress] = None
+        self._loop.create_task(self._connect(appAddress, reply))
+
+    async def _connect(self, appAddress, reply):
+        """@brief Connect to an app and send it a reply.
+           @param appAddress A tuple containing the address and TCP port of the app.
+           @param reply The reply to send once connected."""
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(*appAddress), StatusResponder.CONNECT_TIMEOUT)
+            self._uio.info("Connected to the Aligner app at {}:{}".format(*appAddress))
+            writer.write(reply)
+            self._writerDict[appAddress] = writer
+        except (OSError, asyncio.TimeoutError) as ex:
+            self._uio.debug("Failed to connect to {}:{}: {}".format(appAddress[0], appAddress[1], str(ex)))
+            self._writerDict.pop(appAddress, None)
+
+    async def _serve(self):
+        """@brief Answer requests until shutdown."""
+        self._stopEvent = asyncio.Event()
+        transport, _ = await self._loop.create_datagram_endpoint(lambda: AYTProtocol(self._onAYT),
+                                                                 local_addr=("0.0.0.0", self._port))
+        self._uio.info("Listening on UDP port {}".format(self._port))
+        try:
+            await self._stopEvent.wait()
+        finally:
+            transport.close()
+            for writer in self._writerDict.values():
+                if writer:
+                    writer.close()
+            self._writerDict = {}
+
+    def run(self):
+        """@brief A thread that runs the event loop answering the requests."""
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except OSError as ex:
+            self._uio.error("Failed to listen on UDP port {}: {}".format(self._port, str(ex)))
+        finally:
+            self._loop.close()
+
+    def shutdown(self):
+        """@brief Stop the thread running"""
+        if self._loop and self._stopEvent and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._stopEvent.set)
+            except RuntimeError:
+                #The event loop has already closed.
+                pass
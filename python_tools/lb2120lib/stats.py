@@ -0,0 +1,386 @@
+#numpy takes a long time to import and is only used by some subcommands
+#so it is imported by the code that uses it.
+
+class LB2120Stats(object):
+    """@brief Responsible for holding the LB2120 parameters that we are interested in."""
+
+    #The sizes of counter that the LB2120 byte counters may wrap at.
+    COUNTER_WRAP_VALUES     = (2**32, 2**64)
+    #A counter that goes backwards from above this fraction of a wrap value is
+    #treated as having wrapped rather than having been reset.
+    COUNTER_WRAP_FRACTION   = 0.75
+
+    #Many samples may be held in memory (see SampleRing) so no per instance dict is created.
+    __slots__ = ("sampleTime", "downMbps", "upMbps", "tempC", "tempCrticial", "rxBytes", "txBytes", "deviceID", "queuedTime", "sampleCount")
+
+    @staticmethod
+    def GetCounterDelta(lastCount, count):
+        """@brief Get the number of bytes transferred between two readings of
+                  a cumulative LB2120 byte counter.
+           @param lastCount The previous counter value.
+           @param count The current counter value.
+           @return A tuple containing the number of bytes transferred and a
+                   string that is None if the counter increased, 'wrap' if the
+                   counter wrapped or 'reset' if the counter was reset (E.G the
+                   LB2120 rebooted). After a reset the bytes transferred since
+                   the reset (the current count) are returned."""
+        if count >= lastCount:
+            return (count - lastCount, None)
+
+        for wrapValue in LB2120Stats.COUNTER_WRAP_VALUES:
+            if lastCount < wrapValue:
+                if lastCount >= wrapValue * LB2120Stats.COUNTER_WRAP_FRACTION:
+                    return (count + wrapValue - lastCount, 'wrap')
+                break
+
+        return (count, 'reset')
+
+    def __init__(self):
+        self.sampleTime   = None
+        self.downMbps     = None
+        self.upMbps       = None
+        self.tempC        = None
+        self.tempCrticial = None
+        self.rxBytes      = None
+        self.txBytes      = None
+        self.deviceID     = None
+        #The monotonic time the stats were added to the queue to the database writer.
+        self.queuedTime   = None
+        #The number of samples these stats were coalesced from.
+        self.sampleCount  = 1
+
+    @staticmethod
+    def Coalesce(olderStats, newerStats):
+        """@brief Combine two samples from the same LB2120 into one. The byte
+                  counters are cumulative so the newer counters hold the data
+                  transferred by both samples. The rates are averaged.
+           @param olderStats The older LB2120Stats instance.
+           @param newerStats The newer LB2120Stats instance.
+           @return A LB2120Stats instance holding both samples."""
+        sampleCount = olderStats.sampleCount + newerStats.sampleCount
+        stats = LB2120Stats()
+        stats.sampleTime    = newerStats.sampleTime
+        stats.downMbps      = (olderStats.downMbps*olderStats.sampleCount + newerStats.downMbps*newerStats.sampleCount) / sampleCount
+        stats.upMbps        = (olderStats.upMbps*olderStats.sampleCount + newerStats.upMbps*newerStats.sampleCount) / sampleCount
+        stats.tempC         = max(olderStats.tempC, newerStats.tempC)
+        stats.tempCrticial  = newerStats.tempCrticial or olderStats.tempCrticial
+        stats.rxBytes       = newerStats.rxBytes
+        stats.txBytes       = newerStats.txBytes
+        stats.deviceID      = newerStats.deviceID
+        stats.queuedTime    = olderStats.queuedTime
+        stats.sampleCount   = sampleCount
+        return stats
+
+class StatsTable(object):
+    """@brief Responsible for defining the LB2120_STATS table that holds the
+              samples and the SQL used to read it on any StorageBackend."""
+
+    TIMESTAMP               = "TIMESTAMP"
+    TABLE_NAME              = "LB2120_STATS"
+    #The column holding the ID of the LB2120 that a sample was read from.
+    #This is added to the table schema when reading many LB2120 devices.
+    DEVICE                  = "DEVICE"
+    DEVICE_COL_TYPE         = "VARCHAR(64)"
+
+    @staticmethod
+    def GetTableSchema(tableSchemaString):
+        """@brief Get the table schema
+           @param tableSchemaString The string defining the database table schema.
+           @return A dictionary containing a database table schema."""
+        timestampFound=False
+        tableSchemaDict = {}
+        elems = tableSchemaString.split(" ")
+        if len(elems) > 0:
+            for elem in elems:
+                subElems = elem.split(":")
+                if len(subElems) == 2:
+                    colName = subElems[0]
+                    if colName == StatsTable.TIMESTAMP:
+                        timestampFound=True
+                    colType = subElems[1]
+                    tableSchemaDict[colName] = colType
+                else:
+                    raise Exception("{} is an invalid table schema column.".format(elem))
+            return tableSchemaDict
+        else:
+            raise Exception("Invalid Table schema. No elements found.")
+
+        if not timestampFound:
+            raise Exception("No {} table column defined.".format(StatsTable.TIMESTAMP))
+
+    @staticmethod
+    def GetWindowSQL(hasDevice):
+        """@brief Get the SQL that defines the window w used to read the
+                  previous sample.
+           @param hasDevice True if the table has the DEVICE column. The
+                            samples from each device are then kept apart.
+           @return The SQL WINDOW clause."""
+        if hasDevice:
+            return "WINDOW w AS (PARTITION BY DEVICE ORDER BY TIMESTAMP)"
+        return "WINDOW w AS (ORDER BY TIMESTAMP)"
+
+    @staticmethod
+    def GetDeviceSQL(backend, deviceID):
+        """@brief Get the SQL condition that selects the samples read from one device.
+           @param backend The StorageBackend instance.
+           @param deviceID The device ID or None to select all samples.
+           @return The SQL condition (appended to a WHERE clause) or an empty string."""
+        if deviceID is None:
+            return ""
+        return " AND DEVICE = {}".format(backend.quoteValue(deviceID))
+
+    @staticmethod
+    def GetCounterDeltaSQL(backend, colName):
+        """@brief Get the SQL expression for the bytes transferred since the
+                  previous sample from a byte counter column. This matches
+                  LB2120Stats.GetCounterDelta() (32 bit wraps are detected
+                  and a reset counts the bytes since the reset).
+           @param backend The StorageBackend instance.
+           @param colName The counter column name (RXBYTES or TXBYTES).
+           @return The SQL expression. The query must define the window w
+                   ordered by TIMESTAMP."""
+        wrapValue = LB2120Stats.COUNTER_WRAP_VALUES[0]
+        current = backend.castInt("`{}`".format(colName))
+        last = backend.castInt("LAG(`{}`) OVER w".format(colName))
+        return "CASE WHEN {last} IS NULL OR {current} IS NULL THEN NULL "\
+               "WHEN {current} >= {last} THEN {current} - {last} "\
+               "WHEN {last} >= {wrapMin} AND {last} < {wrapValue} THEN {current} + {wrapValue} - {last} "\
+               "ELSE {current} END".format(current=current,
+                                           last=last,
+                                           wrapMin=int(wrapValue * LB2120Stats.COUNTER_WRAP_FRACTION),
+                                           wrapValue=wrapValue)
+
+    @staticmethod
+    def GetTotalsSQLCmd(backend, tableName, start, stop, hasCounters, period=None, hasDevice=False, deviceID=None, seedStart=None):
+        """@brief Get the SQL CMD that calculates the data transferred over a
+                  period of time on the database server. The data transferred
+                  is calculated from the deltas of the RXBYTES and TXBYTES
+                  counters. The data transferred estimated from the DOWNMBPS
+                  and UPMBPS rates is also returned for older records that do
+                  not hold the counters.
+           @param backend The StorageBackend instance.
+           @param tableName The database table name.
+           @param start The start date/time.
+           @param stop The stop date/time.
+           @param hasCounters True if the table has the RXBYTES and TXBYTES columns.
+           @param period None to return one row for the whole time period or
+                         'day'/'week' to return one row per day/week.
+           @param hasDevice True if the table has the DEVICE column.
+           @param deviceID If not None only the samples from this device are read.
+           @param seedStart If not None the samples from this time are read so
+                            that the data transferred up to the first sample
+                            after start is calculated from the sample before
+                            it. Only the samples from start are totalled.
+           @return The SQL CMD."""
+        if hasCounters:
+            counterCols = "{} AS RXDELTA, {} AS TXDELTA, (RXBYTES IS NULL OR TXBYTES IS NULL) AS MISSING".format(StatsTable.GetCounterDeltaSQL(backend, "RXBYTES"),
+                                                                                                                 StatsTable.GetCounterDeltaSQL(backend, "TXBYTES"))
+        else:
+            counterCols = "NULL AS RXDELTA, NULL AS TXDELTA, 1 AS MISSING"
+
+        innerSQL = "SELECT TIMESTAMP, DOWNMBPS, UPMBPS, TEMPC, {}, "\
+                   "{} AS SECONDS "\
+                   "FROM `{}` WHERE TIMESTAMP >= '{}' AND TIMESTAMP < '{}'{} "\
+                   "{}".format(counterCols,
+                               backend.secondsBetween("LAG(TIMESTAMP) OVER w", "TIMESTAMP"),
+                               tableName,
+                               seedStart or start,
+                               stop,
+                               StatsTable.GetDeviceSQL(backend, deviceID),
+                               StatsTable.GetWindowSQL(hasDevice))
+
+        if period:
+            periodCol = backend.periodName("TIMESTAMP", period)
+        else:
+            periodCol = "'ALL'"
+
+        sqlCmd = "SELECT {} AS PERIOD, "\
+                 "COUNT(*) AS SAMPLES, MIN(TIMESTAMP) AS START, MAX(TIMESTAMP) AS STOP, "\
+                 "COALESCE(SUM(RXDELTA), 0) AS RXBYTES, COALESCE(SUM(TXDELTA), 0) AS TXBYTES, SUM(MISSING) AS MISSING, "\
+                 "COALESCE(SUM(DOWNMBPS*SECONDS), 0)*1E6/8 AS RXESTBYTES, COALESCE(SUM(UPMBPS*SECONDS), 0)*1E6/8 AS TXESTBYTES, "\
+                 "AVG(DOWNMBPS) AS AVGDOWNMBPS, MAX(DOWNMBPS) AS MAXDOWNMBPS, "\
+                 "AVG(UPMBPS) AS AVGUPMBPS, MAX(UPMBPS) AS MAXUPMBPS, "\
+                 "MIN(TEMPC) AS MINTEMPC, MAX(TEMPC) AS MAXTEMPC "\
+                 "FROM ({}) d WHERE TIMESTAMP >= '{}' GROUP BY PERIOD ORDER BY START;".format(periodCol, innerSQL, start)
+        return sqlCmd
+
+class StatsColumns(object):
+    """@brief Responsible for holding LB2120_STATS records in typed columns
+              (numpy arrays) rather than one dict per record."""
+
+    #The columns held and their types. Columns not in the records read are not held.
+    COLUMN_TYPES = {
+        "TIMESTAMP":    "datetime64[us]",
+        "DEVICE":       "object",
+        "DOWNMBPS":     "float32",
+        "UPMBPS":       "float32",
+        "TEMPC":        "float32",
+        "MAXDOWNMBPS":  "float32",
+        "MAXUPMBPS":    "float32",
+        "RXBYTES":      "float64",
+        "TXBYTES":      "float64"
+    }
+
+    def __init__(self):
+        """@brief Constructor"""
+        self._chunkDict     = {}
+        self._columnDict    = {}
+
+    def appendRows(self, colNames, rows):
+        """@brief Append rows to the columns.
+           @param colNames The column name of each value in the rows.
+           @param rows A sequence of row tuples."""
+        import numpy as np
+        #Convert the rows to a 2D array in one step and then convert each
+        #column to its type so there is no per row Python code.
+        rowArray = np.array(rows, dtype=object)
+        if rowArray.ndim != 2:
+            return
+        for index, colName in enumerate(colNames):
+            colType = StatsColumns.COLUMN_TYPES.get(colName)
+            if colType:
+                column = rowArray[:, index]
+                if colType.startswith("float"):
+                    #NULL values become NaN
+                    column = np.array(column, dtype="float64")
+                self._chunkDict.setdefault(colName, []).append(column.astype(colType))
+
+    def finish(self):
+        """@brief Join the appended chunks. Call once all rows have been appended."""
+        import numpy as np
+        for colName, chunks in self._chunkDict.items():
+            self._columnDict[colName] = np.concatenate(chunks)
+        self._chunkDict = {}
+
+    def setColumn(self, colName, column):
+        """@brief Set a column.
+           @param colName The column name.
+           @param column A numpy array holding the column values."""
+        self._columnDict[colName] = column.astype(StatsColumns.COLUMN_TYPES[colName], copy=False)
+
+    def getColumnNames(self):
+        """@return The names of the columns held."""
+        return list(self._columnDict.keys())
+
+    @staticmethod
+    def GetCounterDeltas(counts):
+        """@brief Get the bytes transferred between each sample from a byte
+                  counter column. This matches LB2120Stats.GetCounterDelta().
+           @param counts A numpy array of counter values (NaN if not known).
+           @return A numpy array holding the bytes transferred up to each
+                   sample (0 for the first sample and when the counter of the
+                   sample or of the sample before it is not known, as the SQL
+                   NULL delta is counted as 0)."""
+        import numpy as np
+        deltas = np.zeros(len(counts))
+        if len(counts) < 2:
+            return deltas
+        last = counts[:-1]
+        current = counts[1:]
+        wrapValue = float(LB2120Stats.COUNTER_WRAP_VALUES[0])
+        wrapped = (last >= wrapValue * LB2120Stats.COUNTER_WRAP_FRACTION) & (last < wrapValue)
+        delta = np.where(current >= last, current - last, np.where(wrapped, current + wrapValue - last, current))
+        #As in the SQL the delta is 0 (not the whole count) after an unknown counter.
+        deltas[1:] = np.where(np.isnan(last) | np.isnan(current), 0.0, delta)
+        return deltas
+
+    def getTotals(self, period=None):
+        """@brief Calculate the data transferred. This returns the same
+                  values as the StatsTable.GetTotalsSQLCmd() query except
+                  that the data transferred up to the first record is not
+                  known as the record before it is not read. If the DEVICE
+                  column is held the counter deltas and the time between
+                  samples are calculated for each device in turn.
+           @param period None to calculate the totals over all records or
+                         'day'/'week' to calculate the totals per day/week.
+           @return A list of dicts, one per period."""
+        import numpy as np
+        count = len(self)
+        if count == 0:
+            return []
+
+        timestamps = self[StatsTable.TIMESTAMP]
+        days = timestamps.astype("datetime64[D]")
+        if period == 'day':
+            keys = days
+        elif period == 'week':
+            #The 1970-01-01 epoch was a Thursday, move each day back to its Monday.
+            keys = days - (days.astype(np.int64) + 3) % 7
+        else:
+            keys = np.zeros(count, dtype=np.int8)
+        #The records are in time order so each period is a contiguous block.
+        starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+        stops = np.concatenate((starts[1:], [count]))
+
+        hasCounters = "RXBYTES" in self and "TXBYTES" in self
+        seconds = np.zeros(count)
+        rxBytes = np.zeros(count)
+        txBytes = np.zeros(count)
+        #The samples of each device are interleaved (as the SQL PARTITION BY DEVICE).
+        if StatsTable.DEVICE in self:
+            deviceIDs = self[StatsTable.DEVICE]
+            deviceIndexes = [np.flatnonzero(deviceIDs == deviceID) for deviceID in set(deviceIDs.tolist())]
+        else:
+            deviceIndexes = [np.arange(count)]
+        for indexes in deviceIndexes:
+            seconds[indexes[1:]] = np.diff(timestamps[indexes]).astype("timedelta64[us]").astype(np.float64) / 1E6
+            if hasCounters:
+                rxBytes[indexes] = StatsColumns.GetCounterDeltas(self["RXBYTES"][indexes])
+                txBytes[indexes] = StatsColumns.GetCounterDeltas(self["TXBYTES"][indexes])
+
+        downMbps = self["DOWNMBPS"].astype(np.float64)
+        upMbps = self["UPMBPS"].astype(np.float64)
+        tempC = self["TEMPC"]
+        rxEstBytes = downMbps * seconds * 1E6 / 8
+        txEstBytes = upMbps * seconds * 1E6 / 8
+        if hasCounters:
+            missing = (np.isnan(self["RXBYTES"]) | np.isnan(self["TXBYTES"])).astype(np.int64)
+        else:
+            missing = np.ones(count, dtype=np.int64)
+
+        totals = []
+        for start, stop, samples, rx, tx, miss, rxEst, txEst, sumDown, maxDown, sumUp, maxUp, minTemp, maxTemp in zip(
+                starts, stops, stops - starts,
+                np.add.reduceat(rxBytes, starts), np.add.reduceat(txBytes, starts), np.add.reduceat(missing, starts),
+                np.add.reduceat(rxEstBytes, starts), np.add.reduceat(txEstBytes, starts),
+                np.add.reduceat(downMbps, starts), np.maximum.reduceat(downMbps, starts),
+                np.add.reduceat(upMbps, starts), np.maximum.reduceat(upMbps, starts),
+                np.minimum.reduceat(tempC, starts), np.maximum.reduceat(tempC, starts)):
+            firstSample = timestamps[start].item()
+            if period == 'day':
+                periodName = firstSample.strftime("%Y-%m-%d")
+            elif period == 'week':
+                isoYear, isoWeek, _ = firstSample.isocalendar()
+                periodName = "{} week {:02d}".format(isoYear, isoWeek)
+            else:
+                periodName = "ALL"
+            totals.append({"PERIOD":        periodName,
+                           "SAMPLES":       int(samples),
+                           "START":         firstSample,
+                           "STOP":          timestamps[stop-1].item(),
+                           "RXBYTES":       rx,
+                           "TXBYTES":       tx,
+                           "MISSING":       int(miss),
+                           "RXESTBYTES":    rxEst,
+                           "TXESTBYTES":    txEst,
+                           "AVGDOWNMBPS":   sumDown/samples,
+                           "MAXDOWNMBPS":   maxDown,
+                           "AVGUPMBPS":     sumUp/samples,
+                           "MAXUPMBPS":     maxUp,
+                           "MINTEMPC":      minTemp,
+                           "MAXTEMPC":      maxTemp})
+        return totals
+
+    def __len__(self):
+        """@return The number of records held."""
+        if StatsTable.TIMESTAMP in self._columnDict:
+            return len(self._columnDict[StatsTable.TIMESTAMP])
+        return 0
+
+    def __contains__(self, colName):
+        """@return True if the column is held."""
+        return colName in self._columnDict
+
+    def __getitem__(self, colName):
+        """@return The numpy array holding the column."""
+        return self._columnDict[colName]
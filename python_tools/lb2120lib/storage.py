@@ -0,0 +1,693 @@
+import  os
+import  datetime
+import  sqlite3
+
+from    contextlib import contextmanager
+
+from    p3lib.pconfig import ConfigManager
+
+from    .stats import StatsTable, StatsColumns
+
+#pyarrow takes a long time to import and is only used by some subcommands
+#so it is imported by the code that uses it. MySQLdb (mysqlclient) is only
+#imported when a MySQL database is used.
+
+class StorageBackend(object):
+    """@brief Defines the interface to the database that UsageLogger stores
+              samples in. Each backend also provides the SQL fragments that
+              differ between database engines so that the queries built by
+              UsageLogger and RollupTable run on any backend. Each backend
+              holds its DB-API connection in _dbCon (None when disconnected)
+              and sets _inTransaction while within transaction()."""
+
+    DEFAULT_CHUNK_ROWS = 10000
+    #The placeholder for a parameter in the SQL passed to executeMany().
+    PARAM_MARKER       = "?"
+
+    @staticmethod
+    def GetParamValue(value):
+        """@param value A value to be stored.
+           @return The value passed to the database as a parameter. Values are
+                   passed as text (as they were when stored as SQL literals)
+                   and converted to the column type by the database."""
+        if value is None:
+            return None
+        return str(value)
+
+    def connect(self):
+        """@brief Connect to the database."""
+        raise NotImplementedError()
+
+    def disconnect(self):
+        """@brief Disconnect from the database."""
+        raise NotImplementedError()
+
+    def ensureTableExists(self, tableName, tableSchemaDict, autoCreate, primaryKey=None):
+        """@brief Create a table if it does not exist.
+           @param tableName The table name.
+           @param tableSchemaDict The schema for the table in dict form.
+           @param autoCreate Unused, present for compatibility with the p3lib DatabaseIF.
+           @param primaryKey If not None a sequence of the primary key column names."""
+        colDefs = ", ".join("`{}` {}".format(colName, colType) for colName, colType in tableSchemaDict.items())
+        if primaryKey:
+            colDefs = colDefs + ", PRIMARY KEY ({})".format(", ".join("`{}`".format(colName) for colName in primaryKey))
+        self.executeSQL("CREATE TABLE IF NOT EXISTS `{}` ({});".format(tableName, colDefs))
+
+    def getColumnNames(self, tableName):
+        """@param tableName The table name.
+           @return A list of the column names in the table."""
+        raise NotImplementedError()
+
+    def ensureIndex(self, tableName, colName):
+        """@brief Create an index on a table column if one does not exist.
+           @param tableName The table name.
+           @param colName The column name.
+           @return True if the index was created."""
+        raise NotImplementedError()
+
+    def executeSQL(self, sqlCmd):
+        """@brief Execute an SQL cmd.
+           @param sqlCmd The SQL cmd.
+           @return A sequence of dicts, one per result row."""
+        raise NotImplementedError()
+
+    def executeSQLChunks(self, sqlCmd, chunkRows=DEFAULT_CHUNK_ROWS):
+        """@brief Execute an SQL cmd and read the result in chunks.
+           @param sqlCmd The SQL cmd.
+           @param chunkRows The maximum number of rows in each chunk.
+           @return A generator that yields a tuple containing the list of
+                   column names and a tuple of row tuples for each chunk."""
+        raise NotImplementedError()
+
+    def executeMany(self, sqlCmd, paramRows):
+        """@brief Execute an SQL cmd once for each set of parameters. Unless
+                  within transaction() the change is committed.
+           @param sqlCmd The SQL cmd holding a PARAM_MARKER for each parameter.
+           @param paramRows A list of parameter tuples."""
+        raise NotImplementedError()
+
+    @contextmanager
+    def _autoCommit(self):
+        """@brief A context manager that commits the SQL cmd executed within
+                  it unless it is part of a transaction()."""
+        try:
+            yield
+            if not self._inTransaction:
+                self._dbCon.commit()
+        except:
+            #Within transaction() the failed statement has no effect and
+            #the transaction is rolled back if the exception is not handled.
+            if not self._inTransaction:
+                self._dbCon.rollback()
+            raise
+
+    @contextmanager
+    def transaction(self):
+        """@brief Execute the SQL cmds within this context in one transaction
+                  so that a batch of samples and the rollup table updates are
+                  committed together. If an exception is raised all of them
+                  are rolled back."""
+        self._inTransaction = True
+        try:
+            yield
+            self._dbCon.commit()
+        except:
+            self._dbCon.rollback()
+            raise
+        finally:
+            self._inTransaction = False
+
+    def quoteValue(self, value):
+        """@param value A value used in an SQL cmd (E.G a WHERE clause).
+           @return The value as an SQL literal (standard SQL quoting)."""
+        if value is None:
+            return "NULL"
+        return "'{}'".format(str(value).replace("'", "''"))
+
+    def getParamRows(self, colNames, rows):
+        """@param colNames The names of the columns to store.
+           @param rows A list of dicts, one per row.
+           @return A list of parameter tuples, one per row."""
+        return [tuple(StorageBackend.GetParamValue(row[colName]) for colName in colNames) for row in rows]
+
+    def getParamMarkers(self, colNames):
+        """@param colNames The names of the columns to store.
+           @return The SQL for a row of parameters, E.G (?, ?, ?)."""
+        return "(" + ", ".join([self.PARAM_MARKER] * len(colNames)) + ")"
+
+    def insertRows(self, tableName, colNames, rows):
+        """@brief Insert rows into a table. The values are passed as parameters
+                  rather than SQL literals so that no value needs escaping.
+           @param tableName The table name.
+           @param colNames The names of the columns to store.
+           @param rows A list of dicts, one per row."""
+        sql = "INSERT INTO `{}` ({}) VALUES {};".format(tableName, ", ".join(colNames), self.getParamMarkers(colNames))
+        self.executeMany(sql, self.getParamRows(colNames, rows))
+
+    def upsertRows(self, tableName, keyColNames, colNames, rows, sumColNames, minColNames, maxColNames):
+        """@brief Insert rows into a table. Where a row with the same key
+                  already exists the new values are combined with it.
+           @param tableName The table name.
+           @param keyColNames The primary key column names.
+           @param colNames The names of the columns to store.
+           @param rows A list of dicts, one per row.
+           @param sumColNames The columns that hold the sum of the old and new values.
+           @param minColNames The columns that hold the minimum of the old and new values.
+           @param maxColNames The columns that hold the maximum of the old and new values."""
+        raise NotImplementedError()
+
+    def castInt(self, expr):
+        """@return The SQL to convert expr to a signed integer."""
+        raise NotImplementedError()
+
+    def secondsBetween(self, startExpr, stopExpr):
+        """@return The SQL for the number of seconds between two timestamps."""
+        raise NotImplementedError()
+
+    def timeBucket(self, expr, bucketSeconds):
+        """@return The SQL for the number of the bucketSeconds long time bucket
+                   (counted from the epoch) that a timestamp falls in."""
+        raise NotImplementedError()
+
+    def bucketStart(self, expr, bucketSeconds):
+        """@return The SQL for the start of the minute (60), hour (3600) or
+                   day (86400) bucket that a timestamp falls in."""
+        raise NotImplementedError()
+
+    def periodName(self, expr, period):
+        """@return The SQL for the name of the day ('day') or week ('week') that
+                   a timestamp falls in."""
+        raise NotImplementedError()
+
+class MySQLBackend(StorageBackend):
+    """@brief Responsible for storing samples in a MYSQL database server. This
+              reads large results in chunks using a server side cursor so
+              that the whole result is never held in memory as a tuple of dicts.
+              MySQLdb is imported when the database is used so that it is not
+              required when samples are stored in SQLite."""
+
+    NAME = "mysql"
+    PARAM_MARKER = "%s"
+
+    def __init__(self, dbConfig):
+        """@brief Constructor
+           @param dbConfig A p3lib DBConfig instance holding the database server details."""
+        self._dbConfig  = dbConfig
+        self._dbCon     = None
+        self._inTransaction = False
+
+    def _info(self, msg):
+        """@brief Display an info message if the config has a UIO instance."""
+        if self._dbConfig.uio:
+            self._dbConfig.uio.info(msg)
+
+    def _debug(self, msg):
+        """@brief Display a debug message if the config has a UIO instance."""
+        if self._dbConfig.uio and self._dbConfig.uio.debug:
+            self._dbConfig.uio.debug(msg)
+
+    def connect(self):
+        """@brief Connect to the database server."""
+        import MySQLdb
+        self._info("Connecting to {}:{} (database = {})".format(self._dbConfig.serverAddress, self._dbConfig.serverPort, self._dbConfig.dataBaseName))
+        self._dbCon = MySQLdb.Connection(host=self._dbConfig.serverAddress,
+                                         port=self._dbConfig.serverPort,
+                                         user=self._dbConfig.username,
+                                         passwd=self._dbConfig.password,
+                                         db=self._dbConfig.dataBaseName)
+        #Changes are committed by executeSQL() or at the end of transaction().
+        self._dbCon.autocommit(False)
+        self._info("Connected")
+
+    def disconnect(self):
+        """@brief Disconnect from the database server."""
+        if self._dbCon:
+            try:
+                self._dbCon.close()
+            except Exception:
+                #The connection may already have been lost.
+                pass
+            self._dbCon = None
+            self._info("Disconnected from {}:{}".format(self._dbConfig.serverAddress, self._dbConfig.serverPort))
+
+    def executeSQL(self, sqlCmd):
+        """@brief Execute an SQL cmd. Unless within transaction() the
+                  change is committed.
+           @param sqlCmd The SQL cmd.
+           @return A list of dicts, one per result row."""
+        import MySQLdb.cursors
+        self._debug("EXECUTE SQL: {}".format(sqlCmd))
+        with self._autoCommit():
+            cursor = self._dbCon.cursor(MySQLdb.cursors.DictCursor)
+            try:
+                cursor.execute(sqlCmd)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        return list(rows)
+
+    def executeMany(self, sqlCmd, paramRows):
+        """@brief See StorageBackend.executeMany(). MySQLdb sends the rows of
+                  an INSERT in one multi-row statement."""
+        self._debug("EXECUTE SQL: {} ({} rows)".format(sqlCmd, len(paramRows)))
+        with self._autoCommit():
+            cursor = self._dbCon.cursor()
+            try:
+                cursor.executemany(sqlCmd, paramRows)
+            finally:
+                cursor.close()
+
+    def quoteValue(self, value):
+        """@param value A value used in an SQL cmd (E.G a WHERE clause).
+           @return The value as an SQL literal escaped by the MySQL client
+                   library, which (unlike standard SQL) also escapes backslashes."""
+        if value is None:
+            return "NULL"
+        return "'{}'".format(self._dbCon.escape_string(str(value)).decode("utf-8"))
+
+    def getColumnNames(self, tableName):
+        """@param tableName The table name.
+           @return A list of the column names in the table."""
+        sql = "SELECT COLUMN_NAME FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = '{}';".format(tableName)
+        return [row["COLUMN_NAME"] for row in self.executeSQL(sql)]
+
+    def ensureIndex(self, tableName, colName):
+        """@brief Create an index on a table column if one does not exist.
+           @param tableName The table name.
+           @param colName The column name.
+           @return True if the index was created."""
+        sql = "SELECT COUNT(*) AS count FROM information_schema.statistics WHERE table_schema = DATABASE() "\
+              "AND table_name = '{}' AND column_name = '{}' AND seq_in_index = 1;".format(tableName, colName)
+        if self.executeSQL(sql)[0]["count"] > 0:
+            return False
+        self.executeSQL("CREATE INDEX `{0}_IDX` ON `{1}` (`{0}`);".format(colName, tableName))
+        return True
+
+    def executeSQLChunks(self, sqlCmd, chunkRows=StorageBackend.DEFAULT_CHUNK_ROWS):
+        """@brief Execute an SQL cmd and read the result in chunks.
+           @param sqlCmd The SQL cmd.
+           @param chunkRows The maximum number of rows in each chunk.
+           @return A generator that yields a tuple containing the list of
+                   column names and a tuple of row tuples for each chunk."""
+        import MySQLdb.cursors
+        self._debug("EXECUTE SQL: {}".format(sqlCmd))
+        cursor = self._dbCon.cursor(MySQLdb.cursors.SSCursor)
+        try:
+            cursor.execute(sqlCmd)
+            colNames = [desc[0] for desc in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunkRows)
+                if not rows:
+                    break
+                yield (colNames, rows)
+        finally:
+            cursor.close()
+
+    def upsertRows(self, tableName, keyColNames, colNames, rows, sumColNames, minColNames, maxColNames):
+        """@brief See StorageBackend.upsertRows()."""
+        updateList = []
+        for colName in sumColNames:
+            updateList.append("`{0}` = `{0}` + VALUES(`{0}`)".format(colName))
+        for colName in minColNames:
+            updateList.append("`{0}` = LEAST(`{0}`, VALUES(`{0}`))".format(colName))
+        for colName in maxColNames:
+            updateList.append("`{0}` = GREATEST(`{0}`, VALUES(`{0}`))".format(colName))
+
+        sql = "INSERT INTO `{}` ({}) VALUES {} ON DUPLICATE KEY UPDATE {};".format(tableName,
+                                                                                   ", ".join(colNames),
+                                                                                   self.getParamMarkers(colNames),
+                                                                                   ", ".join(updateList))
+        self.executeMany(sql, self.getParamRows(colNames, rows))
+
+    def castInt(self, expr):
+        """@return The SQL to convert expr to a signed integer."""
+        return "CAST({} AS SIGNED)".format(expr)
+
+    def secondsBetween(self, startExpr, stopExpr):
+        """@return The SQL for the number of seconds between two timestamps."""
+        return "TIMESTAMPDIFF(MICROSECOND, {}, {})/1E6".format(startExpr, stopExpr)
+
+    def timeBucket(self, expr, bucketSeconds):
+        """@return The SQL for the number of the time bucket that a timestamp falls in."""
+        return "FLOOR(UNIX_TIMESTAMP({})/{})".format(expr, bucketSeconds)
+
+    def bucketStart(self, expr, bucketSeconds):
+        """@return The SQL for the start of the bucket that a timestamp falls in."""
+        if bucketSeconds >= 86400:
+            return "DATE_FORMAT({}, '%Y-%m-%d 00:00:00')".format(expr)
+        if bucketSeconds >= 3600:
+            return "DATE_FORMAT({}, '%Y-%m-%d %H:00:00')".format(expr)
+        return "DATE_FORMAT({}, '%Y-%m-%d %H:%i:00')".format(expr)
+
+    def periodName(self, expr, period):
+        """@return The SQL for the name of the day or ISO week that a timestamp falls in."""
+        if period == 'week':
+            return "DATE_FORMAT({}, '%x week %v')".format(expr)
+        return "DATE_FORMAT({}, '%Y-%m-%d')".format(expr)
+
+class SQLiteBackend(StorageBackend):
+    """@brief Responsible for storing samples in an embedded SQLite database
+              file. The database uses write ahead logging so that reads (E.G
+              --plot) do not block the collector writing samples."""
+
+    NAME                = "sqlite"
+    DEFAULT_FILE        = os.path.join(os.path.expanduser("~"), "lb2120.db")
+    #The columns returned by queries that hold timestamps. SQLite holds these
+    #as text so they are converted to datetime instances when read.
+    TIMESTAMP_COLUMNS   = ("TIMESTAMP", "START", "STOP", "FIRSTSAMPLE", "LASTSAMPLE")
+
+    def __init__(self, filename=DEFAULT_FILE, uio=None):
+        """@brief Constructor
+           @param filename The SQLite database file.
+           @param uio A UIO instance or None."""
+        self._filename      = filename
+        self._uio           = uio
+        self._dbCon         = None
+        self._inTransaction = False
+
+    def connect(self):
+        """@brief Open the database file, creating it if required."""
+        if self._uio:
+            self._uio.info("Opening {}".format(self._filename))
+        #The connection is shared by the collector and SpoolDrainer threads
+        #which serialise their access to it.
+        self._dbCon = sqlite3.connect(self._filename, check_same_thread=False)
+        self._dbCon.execute("PRAGMA journal_mode=WAL;")
+        self._dbCon.execute("PRAGMA synchronous=NORMAL;")
+
+    def disconnect(self):
+        """@brief Close the database file."""
+        if self._dbCon:
+            self._dbCon.close()
+            self._dbCon = None
+
+    def getColumnNames(self, tableName):
+        """@param tableName The table name.
+           @return A list of the column names in the table."""
+        return [row[1] for row in self._dbCon.execute("PRAGMA table_info(`{}`);".format(tableName))]
+
+    def ensureIndex(self, tableName, colName):
+        """@brief Create an index on a table column if one does not exist.
+           @param tableName The table name.
+           @param colName The column name.
+           @return True if the index was created."""
+        for row in self._dbCon.execute("PRAGMA index_list(`{}`);".format(tableName)):
+            indexColNames = [indexRow[2] for indexRow in self._dbCon.execute("PRAGMA index_info(`{}`);".format(row[1]))]
+            if indexColNames and indexColNames[0] == colName:
+                return False
+        self.executeSQL("CREATE INDEX IF NOT EXISTS `{1}_{0}_IDX` ON `{1}` (`{0}`);".format(colName, tableName))
+        return True
+
+    @staticmethod
+    def _GetRowValues(colNames, row):
+        """@brief Convert the timestamp values held as text to datetime instances.
+           @param colNames The column names.
+           @param row A row tuple.
+           @return A row tuple."""
+        return tuple(datetime.datetime.fromisoformat(value) if colName in SQLiteBackend.TIMESTAMP_COLUMNS and isinstance(value, str) else value
+                     for colName, value in zip(colNames, row))
+
+    def executeSQL(self, sqlCmd):
+        """@brief Execute an SQL cmd. Unless within transaction() the
+                  change is committed.
+           @param sqlCmd The SQL cmd.
+           @return A list of dicts, one per result row."""
+        with self._autoCommit():
+            cursor = self._dbCon.execute(sqlCmd)
+            rows = cursor.fetchall()
+
+        if not cursor.description:
+            return []
+        colNames = [desc[0] for desc in cursor.description]
+        return [dict(zip(colNames, SQLiteBackend._GetRowValues(colNames, row))) for row in rows]
+
+    def executeSQLChunks(self, sqlCmd, chunkRows=StorageBackend.DEFAULT_CHUNK_ROWS):
+        """@brief See StorageBackend.executeSQLChunks()."""
+        cursor = self._dbCon.execute(sqlCmd)
+        try:
+            colNames = [desc[0] for desc in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunkRows)
+                if not rows:
+                    break
+                yield (colNames, [SQLiteBackend._GetRowValues(colNames, row) for row in rows])
+        finally:
+            cursor.close()
+
+    def executeMany(self, sqlCmd, paramRows):
+        """@brief See StorageBackend.executeMany()."""
+        with self._autoCommit():
+            self._dbCon.executemany(sqlCmd, paramRows)
+
+    def upsertRows(self, tableName, keyColNames, colNames, rows, sumColNames, minColNames, maxColNames):
+        """@brief See StorageBackend.upsertRows()."""
+        updateList = []
+        for colName in sumColNames:
+            updateList.append("`{0}` = `{0}` + excluded.`{0}`".format(colName))
+        for colName in minColNames:
+            updateList.append("`{0}` = MIN(`{0}`, excluded.`{0}`)".format(colName))
+        for colName in maxColNames:
+            updateList.append("`{0}` = MAX(`{0}`, excluded.`{0}`)".format(colName))
+
+        sql = "INSERT INTO `{}` ({}) VALUES {} ON CONFLICT({}) DO UPDATE SET {};".format(tableName,
+                                                                                         ", ".join(colNames),
+                                                                                         self.getParamMarkers(colNames),
+                                                                                         ", ".join("`{}`".format(colName) for colName in keyColNames),
+                                                                                           ", ".join(updateList))
+        self.executeMany(sql, self.getParamRows(colNames, rows))
+
+    def castInt(self, expr):
+        """@return The SQL to convert expr to a signed integer."""
+        return "CAST({} AS INTEGER)".format(expr)
+
+    def secondsBetween(self, startExpr, stopExpr):
+        """@return The SQL for the number of seconds between two timestamps."""
+        return "((julianday({}) - julianday({}))*86400.0)".format(stopExpr, startExpr)
+
+    def timeBucket(self, expr, bucketSeconds):
+        """@return The SQL for the number of the time bucket that a timestamp falls in.
+                   Integer division is used as FLOOR() is not always available."""
+        return "(CAST(strftime('%s', {}) AS INTEGER)/{})".format(expr, int(bucketSeconds))
+
+    def bucketStart(self, expr, bucketSeconds):
+        """@return The SQL for the start of the bucket that a timestamp falls in."""
+        if bucketSeconds >= 86400:
+            return "strftime('%Y-%m-%d 00:00:00', {})".format(expr)
+        if bucketSeconds >= 3600:
+            return "strftime('%Y-%m-%d %H:00:00', {})".format(expr)
+        return "strftime('%Y-%m-%d %H:%M:00', {})".format(expr)
+
+    def periodName(self, expr, period):
+        """@return The SQL for the name of the day or week that a timestamp falls in.
+                   Weeks start on Monday but SQLite numbers them from the first
+                   Monday of the year rather than by ISO week."""
+        if period == 'week':
+            return "strftime('%Y week %W', {})".format(expr)
+        return "strftime('%Y-%m-%d', {})".format(expr)
+
+class ParquetStore(object):
+    """@brief Responsible for holding LB2120_STATS records in compressed
+              columnar (Parquet) files so that they can be analysed without a
+              database connection. Each export appends a new file holding the
+              records added since the last export."""
+
+    DEFAULT_PATH        = os.path.join(os.path.expanduser("~"), "lb2120_export")
+    FILE_PREFIX         = "LB2120_STATS_"
+    FILE_SUFFIX         = ".parquet"
+    COMPRESSION         = "zstd"
+    FILENAME_TIME_FMT   = "%Y%m%dT%H%M%S%f"
+
+    def __init__(self, path=DEFAULT_PATH):
+        """@brief Constructor
+           @param path The folder holding the Parquet files."""
+        self._path = path
+
+    def _getFiles(self):
+        """@return The Parquet files in time order."""
+        if not os.path.isdir(self._path):
+            return []
+        filenames = [filename for filename in os.listdir(self._path) if filename.startswith(ParquetStore.FILE_PREFIX) and filename.endswith(ParquetStore.FILE_SUFFIX)]
+        return [os.path.join(self._path, filename) for filename in sorted(filenames)]
+
+    def getLastTimestamp(self):
+        """@return The TIMESTAMP of the last record held or None if no records are held.
+                   This is read from the Parquet file metadata so no records are read."""
+        import pyarrow.parquet as pq
+        lastTimestamp = None
+        for filename in self._getFiles():
+            metadata = pq.ParquetFile(filename).metadata
+            colIndex = metadata.schema.names.index(StatsTable.TIMESTAMP)
+            for rowGroup in range(metadata.num_row_groups):
+                statistics = metadata.row_group(rowGroup).column(colIndex).statistics
+                if statistics and statistics.has_min_max:
+                    if lastTimestamp is None or statistics.max > lastTimestamp:
+                        lastTimestamp = statistics.max
+        return lastTimestamp
+
+    def write(self, chunks):
+        """@brief Write records to a new file in the store.
+           @param chunks An iterable of StatsColumns instances. Each is written as a row group.
+           @return The number of records written."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(self._path, exist_ok=True)
+        tmpFilename = os.path.join(self._path, ".export.tmp")
+        writer = None
+        recordCount = 0
+        firstTimestamp = None
+        lastTimestamp = None
+        try:
+            for columns in chunks:
+                if len(columns) == 0:
+                    continue
+                colNames = columns.getColumnNames()
+                table = pa.table({colName: pa.array(columns[colName], from_pandas=True) for colName in colNames})
+                if not writer:
+                    writer = pq.ParquetWriter(tmpFilename, table.schema, compression=ParquetStore.COMPRESSION)
+                    firstTimestamp = columns[StatsTable.TIMESTAMP][0].item()
+                writer.write_table(table)
+                lastTimestamp = columns[StatsTable.TIMESTAMP][-1].item()
+                recordCount = recordCount + len(columns)
+        finally:
+            if writer:
+                writer.close()
+
+        if recordCount > 0:
+            filename = "{}{}_{}{}".format(ParquetStore.FILE_PREFIX,
+                                          firstTimestamp.strftime(ParquetStore.FILENAME_TIME_FMT),
+                                          lastTimestamp.strftime(ParquetStore.FILENAME_TIME_FMT),
+                                          ParquetStore.FILE_SUFFIX)
+            os.replace(tmpFilename, os.path.join(self._path, filename))
+        return recordCount
+
+    def read(self, start, stop, deviceID=None):
+        """@brief Read the records between two times. The files are memory
+                  mapped and only the row groups that hold records in the
+                  time period are read.
+           @param start The start date/time.
+           @param stop The stop date/time.
+           @param deviceID If not None only the records read from this device are read.
+           @return A StatsColumns instance."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = StatsColumns()
+        filenames = self._getFiles()
+        if not filenames:
+            return columns
+
+        #Files exported before the DEVICE column was added do not hold it.
+        schema = pa.unify_schemas([pq.read_schema(filename) for filename in filenames])
+        filters = [(StatsTable.TIMESTAMP, ">=", start), (StatsTable.TIMESTAMP, "<", stop)]
+        if deviceID:
+            if StatsTable.DEVICE not in schema.names:
+                raise Exception("The --device option cannot be used as the files in {} do not hold the {} column.".format(self._path, StatsTable.DEVICE))
+            filters.append((StatsTable.DEVICE, "=", deviceID))
+        table = pq.read_table(filenames,
+                              schema=schema,
+                              filters=filters,
+                              memory_map=True)
+        table = table.sort_by(StatsTable.TIMESTAMP)
+        for colName in table.column_names:
+            if colName in StatsColumns.COLUMN_TYPES:
+                columns.setColumn(colName, table.column(colName).to_numpy())
+        return columns
+
+class DBClientConfig(ConfigManager):
+    """@brief Responsible for managing the database configuration."""
+
+    CFG_FILENAME            = "4g_usage_db_config.cfg"
+
+    DB_BACKEND              = "DB_BACKEND"
+    DB_SQLITE_FILE          = "DB_SQLITE_FILE"
+    DB_HOST                 = "DB_HOST"
+    DB_PORT                 = "DB_PORT"
+    DB_USERNAME             = "DB_USERNAME"
+    DB_PASSWORD             = "DB_PASSWORD"
+    DB_NAME                 = "DB_NAME"
+    DB_TABLE_SCHEMA         = "DB_TABLE_SCHEMA"
+
+    DEFAULT_CONFIG = {
+        DB_BACKEND:                 MySQLBackend.NAME,
+        DB_SQLITE_FILE:             SQLiteBackend.DEFAULT_FILE,
+        DB_HOST:                    "127.0.0.1",
+        DB_PORT:                    3306,
+        DB_USERNAME:                "",
+        DB_PASSWORD:                "",
+        DB_NAME:                    "",
+        DB_TABLE_SCHEMA:            ""
+    }
+
+    def __init__(self, uio, configFile):
+        """@brief Constructor.
+           @param uio UIO instance.
+           @param configFile Config file instance."""
+        super().__init__(uio, configFile, DBClientConfig.DEFAULT_CONFIG, addDotToFilename=False, encrypt=True)
+        self._uio     = uio
+        self.load()
+
+    def configure(self):
+        """@brief configure the required parameters for normal operation."""
+
+        while True:
+            self.inputStr(DBClientConfig.DB_BACKEND, "Enter the database type ({} or {})".format(MySQLBackend.NAME, SQLiteBackend.NAME), False)
+            if self.getAttr(DBClientConfig.DB_BACKEND) in (MySQLBackend.NAME, SQLiteBackend.NAME):
+                break
+            self._uio.error("{} is not a supported database type.".format(self.getAttr(DBClientConfig.DB_BACKEND)))
+
+        if self.getAttr(DBClientConfig.DB_BACKEND) == SQLiteBackend.NAME:
+            self.inputStr(DBClientConfig.DB_SQLITE_FILE, "Enter the SQLite database file", False)
+
+        else:
+            self.inputStr(DBClientConfig.DB_HOST, "Enter the address of the MYSQL database server", False)
+
+            self.inputDecInt(DBClientConfig.DB_PORT, "Enter TCP port to connect to the MYSQL database server", minValue=1024, maxValue=65535)
+
+            self.inputStr(DBClientConfig.DB_USERNAME, "Enter the database username", False)
+
+            self.inputStr(DBClientConfig.DB_PASSWORD, "Enter the database password", False)
+
+            self.inputStr(DBClientConfig.DB_NAME, "Enter the database name to store the data into", False)
+
+        self._uio.info("Example table schema")
+        self._uio.info("TIMESTAMP:TIMESTAMP DOWNMBPS:FLOAT(24) UPMBPS:FLOAT(24) TEMPC:FLOAT(24) TEMPCRITICAL:VARCHAR(8) RXBYTES:BIGINT TXBYTES:BIGINT")
+        self.inputStr(DBClientConfig.DB_TABLE_SCHEMA, "Enter the database table schema", False)
+        #Check the validity of the schema
+        tableSchemaString = self.getAttr(DBClientConfig.DB_TABLE_SCHEMA)
+        StatsTable.GetTableSchema(tableSchemaString)
+        self._uio.info("Table schema string OK")
+
+        self.store()
+
+class ReadDBConfig(ConfigManager):
+    """@brief Responsible for managing the configuration used when reading values from the database."""
+
+    CFG_FILENAME            = "read_4g_usage.cfg"
+
+    START_TIMESTAMP         = "START_TIMESTAMP"
+    DAYS                    = "DAYS"
+    STRIDE                  = "STRIDE"
+
+    DEFAULT_CONFIG = {
+        START_TIMESTAMP: "",
+        DAYS:            "",
+        STRIDE:          ""
+    }
+
+    def __init__(self, uio, configFile):
+        """@brief Constructor.
+           @param uio UIO instance.
+           @param configFile Config file instance."""
+        super().__init__(uio, configFile, ReadDBConfig.DEFAULT_CONFIG, addDotToFilename=False, encrypt=True)
+        self._uio     = uio
+        self.load()
+
+    def configure(self):
+        """@brief configure the required parameters for normal operation."""
+
+        self.inputStr(ReadDBConfig.START_TIMESTAMP, "Enter the start date and time in the format 2020/aug/10 15:30:15", False)
+
+        self.inputDecInt(ReadDBConfig.DAYS, "Enter the number days data to read", False)
+
+        self.inputDecInt(ReadDBConfig.STRIDE, "The number of poll periods per point read (1 = every record, 2 = average of every two poll periods, etc)")
+
+        self.store()
@@ -0,0 +1,936 @@
+import  os
+import  datetime
+
+from    queue import Empty
+from    time import time, monotonic
+from    threading import Lock
+
+from    .stats import StatsTable, StatsColumns
+from    .storage import MySQLBackend, SQLiteBackend, ParquetStore, DBClientConfig, ReadDBConfig
+from    .rollup import RollupTable
+from    .metrics import CollectorMetrics, SampleProfiler, CircuitBreaker
+from    .history import SampleRing, SampleHistory
+from    .pipeline import SampleSpool, SpoolDrainer, SampleQueue, BatchedRowWriter
+
+#plotly and numpy take a long time to import and each is only used by some
+#subcommands so they are imported by the code that uses them. The poller,
+#client and servers modules (asyncio, http.client and http.server) are only
+#imported by the collect and align subcommands that run them.
+
+class UsageLogger(object):
+    """@brief Responsible reading and recording the usage of the 4G internet connection."""
+
+    #The LB2120_STATS table (see StatsTable).
+    TIMESTAMP               = StatsTable.TIMESTAMP
+    TABLE_NAME              = StatsTable.TABLE_NAME
+    DEVICE                  = StatsTable.DEVICE
+    DEVICE_COL_TYPE         = StatsTable.DEVICE_COL_TYPE
+
+    #The rollup tables (finest first) and the raw sample resolution.
+    RAW_RESOLUTION          = "raw"
+    AUTO_RESOLUTION         = "auto"
+    ROLLUP_TABLES           = (RollupTable("minute",  TABLE_NAME + "_1M", 60),
+                               RollupTable("hour",    TABLE_NAME + "_1H", 3600),
+                               RollupTable("day",     TABLE_NAME + "_1D", 86400))
+    #When the resolution is selected automatically the coarsest resolution
+    #that returns at least this many rows over the time period is used.
+    MIN_AUTO_ROWS           = 500
+    #The default maximum number of points plotted per trace.
+    DEFAULT_MAX_PLOT_POINTS = 4000
+    #Traces with more points than this are rendered using WebGL.
+    WEBGL_MIN_POINTS        = 1000
+    #The names of the components whose health is reported (see CircuitBreaker).
+    #Each LB2120 read is also a component named by its device ID.
+    DATABASE_COMPONENT      = "database"
+    POLLER_COMPONENT        = "poller"
+    #The retry delays of the poller thread if it stops.
+    MIN_RESTART_SECONDS     = 1
+    MAX_RESTART_SECONDS     = 60
+    #The maximum time between checks that the poller thread is running.
+    SUPERVISE_SECONDS       = 1
+
+    def __init__(self, uo, options, config):
+        """@Constructor
+            @param uo A UserOutput instance.
+            @param options Command line options from OptionParser."""
+        self._uio=uo
+        self._options=options
+        self._config=config
+        self._metrics = CollectorMetrics()
+        self._queue = SampleQueue(options.qsize, options.qpolicy, self._metrics)
+        self._dataBaseIF = None
+        self._addedCount = 0
+        self._tableSchema = None
+        self._rowWriter = BatchedRowWriter(self._storeRows, maxRows=options.batch, maxLatencySeconds=options.bsec)
+        self._spool = SampleSpool(options.spool)
+        self._dbLock = Lock()
+        self._dbAvailable = False
+        self._spoolDrainer = None
+        self._lastRollupCounters = {}
+        self._statusCache = None
+        self._statusResponder = None
+        self._metrics.setGaugeCallback("lb2120_queue_depth", self._queue.qsize)
+        self._metrics.setGaugeCallback("lb2120_pending_rows", self._rowWriter.getPendingCount)
+        self._metricsServer = None
+        self._profiler = SampleProfiler(options.profile) if options.profile else None
+        self._droppedCount = 0
+        self._coalescedCount = 0
+        self._history = SampleHistory(options.history, SampleHistory.GetWindowSecondsList(options.windows))
+        #The monotonic time the window statistics of each LB2120 were last shown.
+        self._historyShownTimes = {}
+        self._dashboardServer = None
+        self._lb2120 = None
+        self._password = None
+        #The login sessions are created when the collector runs and kept when the poller is restarted.
+        self._sessionCache = None
+        self._pollerFailed = False
+        self._dbBreaker = CircuitBreaker(UsageLogger.DATABASE_COMPONENT, uo, self._metrics, failureThreshold=1,
+                                         minSeconds=SpoolDrainer.MIN_RETRY_SECONDS, maxSeconds=SpoolDrainer.MAX_RETRY_SECONDS)
+        self._pollerBreaker = CircuitBreaker(UsageLogger.POLLER_COMPONENT, uo, self._metrics, failureThreshold=1,
+                                             minSeconds=UsageLogger.MIN_RESTART_SECONDS, maxSeconds=UsageLogger.MAX_RESTART_SECONDS)
+
+    def _shutdownDBSConnection(self):
+        """@brief Shutdown the connection to the DBS"""
+        if self._dataBaseIF:
+            self._dataBaseIF.disconnect()
+            self._dataBaseIF = None
+
+    def _setupDBConfig(self):
+        """@brief Setup the internal DB config and create the storage backend."""
+        self._dataBaseIF                    = None
+        if self._config.getAttr(DBClientConfig.DB_BACKEND) == SQLiteBackend.NAME:
+            self._dataBaseIF                = SQLiteBackend(os.path.expanduser(self._config.getAttr(DBClientConfig.DB_SQLITE_FILE)), self._uio)
+            return
+
+        from p3lib.database_if import DBConfig
+        self._dbConfig                      = DBConfig()
+        self._dbConfig.serverAddress        = self._config.getAttr(DBClientConfig.DB_HOST)
+        self._dbConfig.serverPort           = self._config.getAttr(DBClientConfig.DB_PORT)
+        self._dbConfig.username             = self._config.getAttr(DBClientConfig.DB_USERNAME)
+        self._dbConfig.password             = self._config.getAttr(DBClientConfig.DB_PASSWORD)
+        self._dbConfig.dataBaseName         = self._config.getAttr(DBClientConfig.DB_NAME)
+        self._dbConfig.autoCreateTable      = True
+        self._dbConfig.uio                  = self._uio
+        self._dataBaseIF                    = MySQLBackend(self._dbConfig)
+
+    def getTableSchema(self):
+        """@return the required MYSQL table schema"""
+        tableSchemaString = self._config.getAttr(DBClientConfig.DB_TABLE_SCHEMA)
+        tableSchema = StatsTable.GetTableSchema(tableSchemaString)
+        #Samples from many LB2120 devices must be tagged with the device they were read from.
+        if getattr(self._options, "devices", None) and UsageLogger.DEVICE not in tableSchema:
+            tableSchema[UsageLogger.DEVICE] = UsageLogger.DEVICE_COL_TYPE
+        return tableSchema
+
+    def _hasCounters(self):
+        """@return True if the table has the RXBYTES and TXBYTES columns."""
+        return "RXBYTES" in self._tableSchema and "TXBYTES" in self._tableSchema
+
+    def _hasDevice(self):
+        """@return True if the table has the DEVICE column."""
+        return UsageLogger.DEVICE in self._tableSchema
+
+    def _connectToDBS(self):
+        """@brief connect to the database server."""
+        self._shutdownDBSConnection()
+
+        self._setupDBConfig()
+
+        self._dataBaseIF.connect()
+        self._uio.info("Connected to database")
+
+        self._tableSchema = self.getTableSchema()
+        self._dataBaseIF.ensureTableExists(UsageLogger.TABLE_NAME, self._tableSchema, True)
+        self._ensureColumnsExist()
+        self._ensureTimestampIndex()
+        self._ensureRollupTables()
+
+    def _ensureRollupTables(self):
+        """@brief Create the rollup tables if they do not exist. Rollup tables
+                  created before the DEVICE column was added held the samples
+                  of all devices in each row so they are recreated and rebuilt
+                  from the LB2120_STATS table."""
+        for rollupTable in UsageLogger.ROLLUP_TABLES:
+            colNames = [colName.upper() for colName in self._dataBaseIF.getColumnNames(rollupTable.tableName)]
+            rebuild = bool(colNames) and UsageLogger.DEVICE not in colNames
+            if rebuild:
+                self._dataBaseIF.executeSQL("DROP TABLE `{}`;".format(rollupTable.tableName))
+            self._dataBaseIF.ensureTableExists(rollupTable.tableName, RollupTable.TABLE_SCHEMA, True, RollupTable.PRIMARY_KEY)
+            if rebuild:
+                self._rebuildRollupTable(rollupTable)
+
+    def _rebuildRollupTable(self, rollupTable):
+        """@brief Rebuild a rollup table from the samples held in the LB2120_STATS table.
+           @param rollupTable The RollupTable instance."""
+        for sql in rollupTable.getRebuildSQLCmds(self._dataBaseIF, UsageLogger.TABLE_NAME, self._hasCounters(), self._hasDevice()):
+            self._dataBaseIF.executeSQL(sql)
+        self._uio.info("Rebuilt the {} table.".format(rollupTable.tableName))
+
+    def _ensureTimestampIndex(self):
+        """@brief Create an index on the TIMESTAMP column of the LB2120_STATS table
+                  if it does not exist so that reading a time period does not
+                  scan the whole table."""
+        if self._dataBaseIF.ensureIndex(UsageLogger.TABLE_NAME, UsageLogger.TIMESTAMP):
+            self._uio.info("Created {} index on the {} table.".format(UsageLogger.TIMESTAMP, UsageLogger.TABLE_NAME))
+
+    def _ensureColumnsExist(self):
+        """@brief Add any columns in the table schema that are missing from an
+                  existing table (E.G the RXBYTES and TXBYTES columns)."""
+        existingColNames = [colName.upper() for colName in self._dataBaseIF.getColumnNames(UsageLogger.TABLE_NAME)]
+        for colName, colType in self._tableSchema.items():
+            if colName.upper() not in existingColNames:
+                self._dataBaseIF.executeSQL("ALTER TABLE `{}` ADD COLUMN `{}` {};".format(UsageLogger.TABLE_NAME, colName, colType))
+                self._uio.info("Added {} column to the {} table.".format(colName, UsageLogger.TABLE_NAME))
+
+    def _insertRows(self, rows):
+        """@brief Insert rows into the database table using a single INSERT statement.
+           @param rows A list of dicts. Each dict holds one row and all must have the same keys."""
+
+        if not self._dataBaseIF:
+            self._connectToDBS()
+
+        #Only store the columns defined in the table schema.
+        colNames = [colName for colName in rows[0].keys() if colName in self._tableSchema]
+        insertStart = monotonic()
+        #The samples and the rollup table updates are committed together. If
+        #either fails neither is stored and the rows are spooled by _storeRows().
+        with self._dataBaseIF.transaction():
+            self._dataBaseIF.insertRows(UsageLogger.TABLE_NAME, colNames, rows)
+            self._updateRollups(rows)
+        self._setLastRollupCounters(rows)
+        insertSeconds = monotonic()-insertStart
+        self._metrics.recordStage(CollectorMetrics.STAGE_INSERT, insertSeconds)
+        self._metrics.observe("lb2120_insert_seconds", insertSeconds)
+        self._metrics.observe("lb2120_insert_batch_rows", len(rows))
+        self._addedCount=self._addedCount + len(rows)
+        self._uio.info("{} TABLE: Added {} rows, count: {}".format(UsageLogger.TABLE_NAME, len(rows), self._addedCount) )
+
+    def _updateRollups(self, rows):
+        """@brief Add samples that are being stored in the LB2120_STATS table to
+                  the rollup tables. This is called within the transaction
+                  that stores the samples so if any rollup table update fails
+                  the exception is raised and the samples are not stored.
+           @param rows A list of LB2120_STATS row dicts in TIMESTAMP order."""
+        #Rows read from the spool file hold the TIMESTAMP as a string.
+        rows = [dict(row, TIMESTAMP=UsageLogger.GetDateTime(row["TIMESTAMP"])) for row in rows]
+        for rollupTable in UsageLogger.ROLLUP_TABLES:
+            buckets = rollupTable.getBuckets(rows, self._lastRollupCounters)
+            rollupTable.upsert(self._dataBaseIF, buckets)
+
+    def _setLastRollupCounters(self, rows):
+        """@brief Hold the byte counters of the last sample (from each device)
+                  once the samples and rollup table updates are committed.
+           @param rows A list of LB2120_STATS row dicts in TIMESTAMP order."""
+        for row in rows:
+            deviceID = row.get(UsageLogger.DEVICE)
+            if row.get("RXBYTES") is None or row.get("TXBYTES") is None:
+                self._lastRollupCounters.pop(deviceID, None)
+            else:
+                self._lastRollupCounters[deviceID] = (row["RXBYTES"], row["TXBYTES"])
+
+    @staticmethod
+    def GetDateTime(timestamp):
+        """@param timestamp A datetime instance or a string in ISO format.
+           @return A datetime instance."""
+        if isinstance(timestamp, str):
+            return datetime.datetime.fromisoformat(timestamp)
+        return timestamp
+
+    def rebuildRollups(self):
+        """@brief Rebuild the rollup tables from the samples held in the LB2120_STATS table."""
+        try:
+            self._connectToDBS()
+            for rollupTable in UsageLogger.ROLLUP_TABLES:
+                self._rebuildRollupTable(rollupTable)
+
+        finally:
+            self.shutDown()
+
+    def _storeRows(self, rows):
+        """@brief Store rows in the database. If the database is unavailable
+                  the rows are saved in the spool file and written to the
+                  database by the SpoolDrainer once it is available again.
+           @param rows A list of row dicts."""
+        with self._dbLock:
+            #Rows must not be written to the database ahead of rows already spooled.
+            if self._dbAvailable:
+                try:
+                    self._insertRows(rows)
+                    self._dbBreaker.recordSuccess()
+                    return
+                except Exception as ex:
+                    self._uio.error("Failed to write to the database, spooling samples: {}".format(str(ex)))
+                    self._dbAvailable = False
+                    self._shutdownDBSConnection()
+                    self._dbBreaker.recordFailure(ex)
+
+            self._spool.append(rows)
+            self._metrics.incCounter("lb2120_spooled_samples_total", len(rows))
+
+        if self._spoolDrainer:
+            self._spoolDrainer.wake()
+
+    def _connectToDBSLocked(self):
+        """@brief Connect to the database server holding the database lock."""
+        with self._dbLock:
+            self._connectToDBS()
+            self._loadLastRollupCounters()
+            self._metrics.incCounter("lb2120_db_reconnects_total")
+
+    def _loadLastRollupCounters(self):
+        """@brief Read the byte counters of the last sample stored (from each
+                  device) so that the data transferred up to the next sample
+                  is added to the rollup tables."""
+        self._lastRollupCounters = {}
+        if not self._hasCounters():
+            return
+        if self._hasDevice():
+            sql = "SELECT DEVICE, RXBYTES, TXBYTES FROM `{0}` WHERE (DEVICE, TIMESTAMP) IN "\
+                  "(SELECT DEVICE, MAX(TIMESTAMP) FROM `{0}` GROUP BY DEVICE);".format(UsageLogger.TABLE_NAME)
+        else:
+            sql = "SELECT RXBYTES, TXBYTES FROM `{}` ORDER BY TIMESTAMP DESC LIMIT 1;".format(UsageLogger.TABLE_NAME)
+        for record in self._dataBaseIF.executeSQL(sql):
+            if record["RXBYTES"] is not None and record["TXBYTES"] is not None:
+                self._lastRollupCounters[record.get(UsageLogger.DEVICE)] = (record["RXBYTES"], record["TXBYTES"])
+
+    def _insertRowsLocked(self, rows):
+        """@brief Insert rows into the database holding the database lock.
+           @param rows A list of row dicts."""
+        with self._dbLock:
+            self._insertRows(rows)
+
+    def _onSpoolDrained(self):
+        """@brief Called by the SpoolDrainer when it has written all spooled rows
+                  to the database. If no rows were spooled since then, the
+                  database is used directly again.
+           @return True if the database is now used directly."""
+        with self._dbLock:
+            if self._spool.isEmpty():
+                self._dbAvailable = True
+        return self._dbAvailable
+
+    def _updateDatabase(self, lb2120Stats):
+        """@brief Update the database with the data received from the LB2120 web interface.
+                  The data is buffered and written in batches.
+           @param lb2120Stats A LB2120Stats instance"""
+
+        dictToStore = {}
+        dictToStore["TIMESTAMP"]=lb2120Stats.sampleTime
+        dictToStore["DOWNMBPS"]=lb2120Stats.downMbps
+        dictToStore["UPMBPS"]=lb2120Stats.upMbps
+        dictToStore["TEMPC"]=lb2120Stats.tempC
+        dictToStore["TEMPCRITICAL"]=lb2120Stats.tempCrticial
+        dictToStore["RXBYTES"]=lb2120Stats.rxBytes
+        dictToStore["TXBYTES"]=lb2120Stats.txBytes
+        dictToStore[UsageLogger.DEVICE]=lb2120Stats.deviceID
+
+        self._rowWriter.add(dictToStore)
+
+    def getPendingCount(self):
+        """@return The number of samples waiting to be written to the database
+                   (buffered in memory and held in the spool file)."""
+        return self._rowWriter.getPendingCount() + self._spool.getPendingCount()
+
+    def _createPoller(self):
+        """@brief Create the thread that reads stats from the LB2120.
+           @return A LB2120Fleet instance if --devices was used, else a LB2120 instance."""
+        from    .poller import LB2120, LB2120Fleet
+        if self._options.devices:
+            if self._options.browser:
+                raise Exception("The --browser option cannot be used with the --devices option.")
+            return LB2120Fleet(self._uio, self._devices, self._queue, self._statusCache, self._metrics, self._profiler, self._sessionCache)
+        lb2120 = LB2120(self._uio, self._options, self._queue, self._statusCache, self._metrics, self._profiler, self._password, self._sessionCache)
+        #The password is only entered once however many times the poller is restarted.
+        self._password = lb2120.getPassword()
+        return lb2120
+
+    def _isHistoryShowDue(self, deviceID):
+        """@brief Determine if the window statistics of an LB2120 are due to be
+                  shown. They are shown at most once every --wsec seconds.
+           @param deviceID The ID of the LB2120.
+           @return True if the statistics should be shown."""
+        if self._options.wsec <= 0:
+            return False
+        now = monotonic()
+        shownTime = self._historyShownTimes.get(deviceID)
+        if shownTime is not None and now - shownTime < self._options.wsec:
+            return False
+        self._historyShownTimes[deviceID] = now
+        return True
+
+    def _showHistory(self, ring, deviceID):
+        """@brief Show the statistics over each window of the recent samples
+                  read from an LB2120 (see --wsec) and update the window metrics.
+           @param ring The SampleRing holding the samples read from the LB2120.
+           @param deviceID The ID of the LB2120."""
+        showHistory = self._isHistoryShowDue(deviceID)
+        for windowSeconds in ring.getWindowSecondsList():
+            window = ring.getWindow(windowSeconds)
+            if showHistory:
+                self._uio.info("LAST {:<9}DOWN {:.3f}/{:.3f} Mbps, UP {:.3f}/{:.3f} Mbps (mean/max), TEMP {:.1f} C (max)".format("{}s:".format(windowSeconds),
+                               window.getMean(SampleRing.FIELD_DOWNMBPS), window.getMax(SampleRing.FIELD_DOWNMBPS),
+                               window.getMean(SampleRing.FIELD_UPMBPS), window.getMax(SampleRing.FIELD_UPMBPS),
+                               window.getMax(SampleRing.FIELD_TEMPC)))
+            if self._metricsServer:
+                for name, field in (("lb2120_window_down_mbps", SampleRing.FIELD_DOWNMBPS),
+                                    ("lb2120_window_up_mbps", SampleRing.FIELD_UPMBPS),
+                                    ("lb2120_window_temperature_celsius", SampleRing.FIELD_TEMPC)):
+                    windowLabel = "{}s".format(windowSeconds)
+                    self._metrics.setGauge(name, window.getMean(field), device=deviceID, window=windowLabel, stat="mean")
+                    self._metrics.setGauge(name, window.getMin(field), device=deviceID, window=windowLabel, stat="min")
+                    self._metrics.setGauge(name, window.getMax(field), device=deviceID, window=windowLabel, stat="max")
+
+    def _stopPoller(self):
+        """@brief Stop the thread reading stats from the LB2120 and wait for it
+                  to exit so that only one poller feeds the queue."""
+        self._lb2120.shutdown()
+        #The poller may be waiting for space in the queue.
+        self._queue.interrupt()
+        self._lb2120.join()
+        self._queue.resume()
+
+    def _supervisePoller(self):
+        """@brief Restart the thread reading stats from the LB2120 if it has
+                  stopped. Restarts are made through the poller CircuitBreaker
+                  so they back off exponentially if the new thread also stops
+                  and the old thread is joined (closing its connection or
+                  browser) before the new thread is started."""
+        if self._lb2120.is_alive():
+            return
+        if not self._pollerFailed:
+            self._pollerFailed = True
+            self._pollerBreaker.recordFailure(self._lb2120.error or "The poller thread stopped.")
+        if self._pollerBreaker.isAttemptAllowed():
+            self._stopPoller()
+            self._lb2120 = self._createPoller()
+            self._lb2120.start()
+            self._pollerFailed = False
+            self._metrics.incCounter("lb2120_poller_restarts_total")
+            self._uio.info("Restarted the LB2120 poller.")
+
+    def _showQueueOverflow(self):
+        """@brief Show the number of samples dropped or coalesced since the
+                  last time this was called because the queue was full."""
+        droppedCount = self._queue.droppedCount
+        coalescedCount = self._queue.coalescedCount
+        if droppedCount != self._droppedCount or coalescedCount != self._coalescedCount:
+            self._uio.warn("The queue to the database writer is full ({} samples). {} samples dropped, {} samples coalesced.".format(self._queue.qsize(),
+                                                                                                                                 droppedCount - self._droppedCount,
+                                                                                                                                 coalescedCount - self._coalescedCount))
+            self._droppedCount = droppedCount
+            self._coalescedCount = coalescedCount
+
+    def _startStatusResponder(self, deviceID):
+        """@brief Start answering the status requests from the Aligner app.
+           @param deviceID The ID of the LB2120 whose status is sent."""
+        from    .servers import StatusCache, StatusResponder
+        self._statusCache = StatusCache(deviceID)
+        self._statusResponder = StatusResponder(self._uio, self._statusCache, self._options.sport)
+        self._statusResponder.start()
+
+    def align(self):
+        """@brief A blocking method that reads the LB2120 signal strength at a
+                  high rate while an antenna is aligned."""
+        from    .poller import LB2120Aligner
+        if self._options.status:
+            self._startStatusResponder(self._options.address)
+        try:
+            LB2120Aligner(self._uio, self._options, self._statusCache).run()
+        finally:
+            if self._statusResponder:
+                self._statusResponder.shutdown()
+
+    def run(self):
+        """@brief A blocking method that reads the internet usage from the LB2120 device
+                  and stores the data in a sqlite database."""
+        from    .client import SessionCache
+        from    .servers import DashboardServer, MetricsServer
+        from    .poller import LB2120Fleet
+        if self._options.devices:
+            self._devices = LB2120Fleet.LoadDevices(self._uio, self._options.devices, self._options.psec)
+            self._uio.info("Reading {} LB2120 devices.".format(len(self._devices)))
+        if self._options.status:
+            #The status of the first device is sent to the Aligner app.
+            self._startStatusResponder(self._devices[0].deviceID if self._options.devices else self._options.address)
+        if self._options.metrics:
+            self._metricsServer = MetricsServer(self._uio, self._metrics, self._options.metrics)
+            self._metricsServer.start()
+        if self._options.dashboard:
+            self._dashboardServer = DashboardServer(self._uio, self._options.dashboard, self._history, self._options.dpoints)
+            self._dashboardServer.start()
+        self._sessionCache = SessionCache(self._options.session, self._uio)
+        self._lb2120 = self._createPoller()
+        #Start the thread reading the internet usage from the LB2120 4G router
+        self._lb2120.start()
+
+        self._spoolDrainer = SpoolDrainer(self._uio, self._spool, self._connectToDBSLocked, self._insertRowsLocked, self._onSpoolDrained, self._dbBreaker)
+        self._spoolDrainer.start()
+
+        #Check we can connect to the database. If not, samples are spooled
+        #until the SpoolDrainer is able to connect.
+        if self._spool.isEmpty():
+            try:
+                self._connectToDBS()
+                self._loadLastRollupCounters()
+                self._dbAvailable = True
+            except Exception as ex:
+                self._uio.error("Failed to connect to the database, spooling samples: {}".format(str(ex)))
+                self._dbBreaker.recordFailure(ex)
+        else:
+            self._uio.info("{} spooled samples waiting to be written to the database.".format(self._spool.getPendingCount()))
+            self._spoolDrainer.wake()
+
+        if self._profiler:
+            self._uio.info("Profiling {} samples.".format(self._options.profile))
+            self._profiler.enable()
+
+        try:
+            while True:
+
+                try:
+
+                    self._supervisePoller()
+
+                    #Wake up when buffered samples are due to be written even if no new sample arrives.
+                    timeout = self._rowWriter.getSecondsToDeadline()
+                    if timeout is None or timeout > UsageLogger.SUPERVISE_SECONDS:
+                        timeout = UsageLogger.SUPERVISE_SECONDS
+                    try:
+                        lb2120Stats = self._queue.get(block=True, timeout=timeout)
+                    except Empty:
+                        if self._rowWriter.isFlushDue():
+                            self._rowWriter.flush()
+                        continue
+
+                    self._pollerBreaker.recordSuccess()
+                    logStart = monotonic()
+                    self._metrics.recordStage(CollectorMetrics.STAGE_QUEUE, logStart-lb2120Stats.queuedTime)
+                    self._showQueueOverflow()
+                    if self._options.devices:
+                        self._uio.info("DEVICE:        {}".format(lb2120Stats.deviceID))
+                    self._uio.info("DOWN:          {:.3f} Mbps".format(lb2120Stats.downMbps))
+                    self._uio.info("UP:            {:.3f} Mbps".format(lb2120Stats.upMbps))
+                    self._uio.info("TEMP:          {:.1f} C".format(lb2120Stats.tempC))
+                    self._uio.info("TEMP CRITICAL: {}".format(lb2120Stats.tempCrticial))
+                    self._uio.info("SAMPLE TIME:   {}".format(lb2120Stats.sampleTime))
+                    self._showHistory(self._history.add(lb2120Stats), lb2120Stats.deviceID)
+                    if self._dashboardServer:
+                        self._dashboardServer.publish(lb2120Stats)
+
+                    storeStart = monotonic()
+                    self._metrics.recordStage(CollectorMetrics.STAGE_LOG, storeStart-logStart)
+                    self._updateDatabase(lb2120Stats)
+                    self._metrics.recordStage(CollectorMetrics.STAGE_STORE, monotonic()-storeStart)
+
+                    if self._profiler and self._profiler.addSample():
+                        break
+
+                except Exception as ex:
+                    #Database errors are handled by spooling the samples (the
+                    #SpoolDrainer reconnects) and the LB2120 errors by the poller
+                    #(see _supervisePoller()) so the error is only reported here.
+                    self._uio.error(str(ex))
+                    if self._options.debug:
+                        raise
+
+        finally:
+            self._stopPoller()
+            if self._statusResponder:
+                self._statusResponder.shutdown()
+            self._spoolDrainer.shutdown()
+            self._spoolDrainer.join()
+            self._flushOnShutdown()
+            if self._metricsServer:
+                self._metricsServer.shutdown()
+            if self._dashboardServer:
+                self._dashboardServer.shutdown()
+            self.shutDown()
+            if self._profiler:
+                self._profiler.disable()
+                self._showProfile()
+
+    def _showProfile(self):
+        """@brief Show the time taken by each stage of handling the samples
+                  and the profile of each thread."""
+        #Wait for the poller to stop profiling its thread.
+        self._lb2120.join()
+        for line in self._profiler.getReport():
+            self._uio.info(line)
+        for line in self._metrics.getStageReport():
+            self._uio.info(line)
+
+    def _flushOnShutdown(self):
+        """@brief Write any buffered samples to the database (or the spool file
+                  if the database is unavailable) before shutting down."""
+        try:
+            self._rowWriter.flush()
+        except Exception as ex:
+            self._uio.error("Failed to save {} buffered samples: {}".format(self._rowWriter.getPendingCount(), str(ex)))
+            self._metrics.incCounter("lb2120_dropped_samples_total", self._rowWriter.getPendingCount())
+
+    def shutDown(self):
+        """@brief Shutdown the db connection if connected."""
+        self._shutdownDBSConnection()
+
+    def _getSQLCmd(self, start, stop, listStride, tableName):
+        """@brief Get the SQL CMD to return a number of records accross the
+                  required time period.
+           @param start The start date/time
+           @param stop The stop date/time
+           @param listStride The stride to read from the stored data. 1 = retrieve every record.
+                             Otherwise the records are grouped into time buckets of
+                             listStride poll periods and one record is returned per bucket
+                             holding the average (and maximum) values over the bucket.
+           @param tableName The database table name."""
+
+        deviceSQL = StatsTable.GetDeviceSQL(self._dataBaseIF, self._options.device)
+        if listStride < 2:
+            sqlCmd = "SELECT * FROM `{}` WHERE TIMESTAMP >= \'{}\' and TIMESTAMP < \'{}\'{} ORDER BY TIMESTAMP;".format(tableName, start, stop, deviceSQL)
+
+        else:
+            #The time range is selected using the TIMESTAMP index so only the
+            #records in the time period are read.
+            bucketSeconds = max(1, int(round(listStride * self._getPollSeconds(start, stop, tableName, deviceSQL))))
+            sqlCmd = "SELECT MIN(TIMESTAMP) AS TIMESTAMP, "\
+                     "AVG(DOWNMBPS) AS DOWNMBPS, AVG(UPMBPS) AS UPMBPS, AVG(TEMPC) AS TEMPC, "\
+                     "MAX(DOWNMBPS) AS MAXDOWNMBPS, MAX(UPMBPS) AS MAXUPMBPS, MAX(TEMPC) AS MAXTEMPC, COUNT(*) AS SAMPLES "\
+                     "FROM `{}` WHERE TIMESTAMP >= \'{}\' and TIMESTAMP < \'{}\'{} "\
+                     "GROUP BY {} ORDER BY TIMESTAMP;".format(tableName, start, stop, deviceSQL, self._dataBaseIF.timeBucket("TIMESTAMP", bucketSeconds))
+
+        return sqlCmd
+
+    def _getPollSeconds(self, start, stop, tableName, deviceSQL):
+        """@brief Get the poll period of the stored samples. This is measured
+                  from the samples as they may have been recorded with a
+                  different --psec (or by many LB2120 devices).
+           @param start The start date/time
+           @param stop The stop date/time
+           @param tableName The database table name.
+           @param deviceSQL The SQL condition that selects the samples of one device.
+           @return The mean time between samples in seconds."""
+        sqlCmd = "SELECT COUNT(*) AS SAMPLES, MIN(TIMESTAMP) AS START, MAX(TIMESTAMP) AS STOP "\
+                 "FROM `{}` WHERE TIMESTAMP >= \'{}\' and TIMESTAMP < \'{}\'{};".format(tableName, start, stop, deviceSQL)
+        records = self._dataBaseIF.executeSQL(sqlCmd)
+        if records and records[0]["SAMPLES"] > 1:
+            record = records[0]
+            return (record["STOP"] - record["START"]).total_seconds() / (record["SAMPLES"] - 1)
+        from    .poller import LB2120
+        return LB2120.POLL_DELAY_SECONDS
+
+    def _getReadDBConfig(self):
+        """@brief Get the configuration that defines the records to read from
+                  the database, configuring it first if required.
+           @return A tuple containing the start date/time, the stop date/time
+                   and the stride."""
+        readDBConfig = ReadDBConfig(self._uio, ReadDBConfig.CFG_FILENAME)
+        if self._options.cplot or self._options.total:
+            readDBConfig.configure()
+
+        start = datetime.datetime.strptime( readDBConfig.getAttr(ReadDBConfig.START_TIMESTAMP), "%Y/%b/%d %H:%M:%S" )
+        stop = start +  datetime.timedelta(days=readDBConfig.getAttr(ReadDBConfig.DAYS))
+        return (start, stop, readDBConfig.getAttr(ReadDBConfig.STRIDE))
+
+    def _getRollupTable(self, start, stop, aligned=False):
+        """@brief Get the rollup table to read data from.
+           @param start The start date/time.
+           @param stop The stop date/time.
+           @param aligned If True only rollup tables with buckets that start
+                          and stop on the start and stop times may be used.
+           @return The RollupTable to read or None to read the LB2120_STATS table."""
+        resolution = self._options.resolution
+        if resolution == UsageLogger.RAW_RESOLUTION:
+            return None
+
+        if resolution != UsageLogger.AUTO_RESOLUTION:
+            for rollupTable in UsageLogger.ROLLUP_TABLES:
+                if rollupTable.resolution == resolution:
+                    return rollupTable
+
+        seconds = (stop - start).total_seconds()
+        selectedTable = None
+        for rollupTable in UsageLogger.ROLLUP_TABLES:
+            if seconds / rollupTable.bucketSeconds < UsageLogger.MIN_AUTO_ROWS:
+                break
+            if aligned and not (rollupTable.isAligned(start) and rollupTable.isAligned(stop)):
+                break
+            selectedTable = rollupTable
+        return selectedTable
+
+    def _getDataSet(self):
+        """@brief Get a set of data from the database. Before calling this
+                  _connectToDBS() must have been successfully called.
+           @return A StatsColumns instance holding the records."""
+
+        tableName = UsageLogger.TABLE_NAME
+
+        start, stop, stride = self._getReadDBConfig()
+        rollupTable = self._getRollupTable(start, stop)
+        if rollupTable:
+            self._uio.info("Reading {} resolution data from the {} table.".format(rollupTable.resolution, rollupTable.tableName))
+            sql = rollupTable.getReadSQLCmd(self._dataBaseIF, start, stop, self._options.device)
+        else:
+            sql = self._getSQLCmd(start, stop, stride, tableName)
+        columns = StatsColumns()
+        for colNames, rows in self._dataBaseIF.executeSQLChunks(sql):
+            columns.appendRows(colNames, rows)
+        columns.finish()
+        self._uio.info("Read {} records".format( len(columns) ))
+
+        return columns
+
+    @staticmethod
+    def MinMaxDownsample(xVals, yVals, maxPoints):
+        """@brief Reduce the number of points in a series while keeping its
+                  peaks and troughs. The points are split into buckets and the
+                  minimum and maximum points of each bucket are kept.
+           @param xVals A numpy array of x values.
+           @param yVals A numpy array of y values.
+           @param maxPoints The maximum number of points to return.
+           @return A tuple containing the x and y values to plot."""
+        import numpy as np
+        pointCount = len(yVals)
+        if pointCount <= maxPoints or maxPoints < 2:
+            return (xVals, yVals)
+
+        bucketCount = maxPoints // 2
+        bucketSize = -(-pointCount // bucketCount)
+        bucketCount = -(-pointCount // bucketSize)
+        #Pad the last bucket so the values can be reshaped to one row per bucket.
+        padded = np.full(bucketCount*bucketSize, np.nan)
+        padded[:pointCount] = yVals
+        buckets = padded.reshape(bucketCount, bucketSize)
+        bucketStarts = np.arange(bucketCount) * bucketSize
+        minIndexes = bucketStarts + np.argmin(np.where(np.isnan(buckets), np.inf, buckets), axis=1)
+        maxIndexes = bucketStarts + np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), axis=1)
+        indexes = np.unique(np.concatenate((minIndexes, maxIndexes)))
+        indexes = indexes[indexes < pointCount]
+        return (xVals[indexes], yVals[indexes])
+
+    def _getTrace(self, xVals, yVals, name, **kwargs):
+        """@brief Get a plotly trace for a series, reduced to the --points
+                  point budget. WebGL is used to render large series.
+           @param xVals The x values.
+           @param yVals The y values.
+           @param name The trace name.
+           @param kwargs Other arguments for the trace.
+           @return The trace."""
+        import plotly.graph_objects as go
+        xVals, yVals = UsageLogger.MinMaxDownsample(xVals, yVals, self._options.points)
+        if len(yVals) > UsageLogger.WEBGL_MIN_POINTS:
+            return go.Scattergl(x=xVals, y=yVals, name=name, **kwargs)
+        return go.Scatter(x=xVals, y=yVals, name=name, **kwargs)
+
+    def _plot(self, dataSet):
+        """@brief Save data to a html file and deploy if required.
+           @param dataSet A StatsColumns instance holding the data to be plotted.
+           @return None"""
+        from plotly.subplots import make_subplots
+        startTime = time()
+
+        fig = make_subplots(rows=1, cols=2, subplot_titles=("Throughput", "LB2120 Temperature"))
+
+        xVals = dataSet["TIMESTAMP"]
+        fig.add_trace(
+            self._getTrace(xVals, dataSet["DOWNMBPS"], "Down"),
+            row=1, col=1
+        )
+
+        fig.add_trace(
+            self._getTrace(xVals, dataSet["UPMBPS"], "Up"),
+            row=1, col=1
+        )
+
+        #Data read from the rollup tables or in time buckets also holds the
+        #peak rates which are hidden by the averages.
+        if "MAXDOWNMBPS" in dataSet:
+            fig.add_trace(
+                self._getTrace(xVals, dataSet["MAXDOWNMBPS"], "Down (max)", visible="legendonly"),
+                row=1, col=1
+            )
+
+            fig.add_trace(
+                self._getTrace(xVals, dataSet["MAXUPMBPS"], "Up (max)", visible="legendonly"),
+                row=1, col=1
+            )
+
+        fig.add_trace(
+            self._getTrace(xVals, dataSet["TEMPC"], "Temp"),
+            row=1, col=2
+        )
+        fig.update_layout(title_text="4G Broadband")
+        fig.show()
+        self._uio.info("Plotted {} records in {:.1f} seconds.".format(len(dataSet), time()-startTime))
+
+    def _getStoreDataSet(self):
+        """@brief Get a set of data from the --store files rather than the database.
+           @return A StatsColumns instance holding the records."""
+        start, stop, _ = self._getReadDBConfig()
+        columns = ParquetStore(self._options.store).read(start, stop, self._options.device)
+        self._uio.info("Read {} records from {}".format( len(columns), self._options.store ))
+        return columns
+
+    def plot(self):
+        """@brief plot data stored in the database."""
+
+        if self._options.offline:
+            self._plot(self._getStoreDataSet())
+            return
+
+        try:
+            self._connectToDBS()
+            dataSet = self._getDataSet()
+
+            self._plot(dataSet)
+
+        finally:
+            self.shutDown()
+
+    def _getExportChunks(self, sql):
+        """@brief Read records from the database in chunks.
+           @param sql The SQL cmd to read the records.
+           @return A generator that yields a StatsColumns instance for each chunk."""
+        for colNames, rows in self._dataBaseIF.executeSQLChunks(sql):
+            columns = StatsColumns()
+            columns.appendRows(colNames, rows)
+            columns.finish()
+            yield columns
+
+    def export(self):
+        """@brief Export the records added to the database since the last
+                  export to the --store files. The DEVICE column is exported
+                  if the table holds it."""
+        store = ParquetStore(self._options.store)
+        lastTimestamp = store.getLastTimestamp()
+
+        try:
+            self._connectToDBS()
+            colNames = [colName for colName in StatsColumns.COLUMN_TYPES if colName in self._tableSchema]
+            sql = "SELECT {} FROM `{}`".format(", ".join(colNames), UsageLogger.TABLE_NAME)
+            if lastTimestamp:
+                sql = sql + " WHERE TIMESTAMP > '{}'".format(lastTimestamp)
+            sql = sql + " ORDER BY TIMESTAMP;"
+            recordCount = store.write(self._getExportChunks(sql))
+            self._uio.info("Exported {} records to {}".format(recordCount, self._options.store))
+
+        finally:
+            self.shutDown()
+
+    def _getSeedStart(self, start, stop):
+        """@brief Get the time of the earliest sample (of all the devices read)
+                  that is the last sample before a time period.
+           @param start The start date/time.
+           @param stop The stop date/time.
+           @return The date/time or start if no samples precede the time period."""
+        if self._hasDevice() and self._options.device is None:
+            sqlCmd = "SELECT DISTINCT DEVICE FROM `{}` WHERE TIMESTAMP >= '{}' AND TIMESTAMP < '{}';".format(UsageLogger.TABLE_NAME, start, stop)
+            deviceIDs = [record[UsageLogger.DEVICE] for record in self._dataBaseIF.executeSQL(sqlCmd)]
+        else:
+            deviceIDs = [self._options.device]
+
+        seedStart = start
+        for deviceID in deviceIDs:
+            sqlCmd = "SELECT MAX(TIMESTAMP) AS START FROM `{}` WHERE TIMESTAMP < '{}'{};".format(UsageLogger.TABLE_NAME, start, StatsTable.GetDeviceSQL(self._dataBaseIF, deviceID))
+            records = self._dataBaseIF.executeSQL(sqlCmd)
+            if records and records[0]["START"] is not None:
+                seedStart = min(seedStart, records[0]["START"])
+        return seedStart
+
+    def _getTotals(self, period=None):
+        """@brief Calculate the data transferred on the database server. Before
+                  calling this _connectToDBS() must have been successfully called.
+                  The data transferred up to the first sample in the time
+                  period is calculated from the sample before it (as it is in
+                  the rollup tables) so that the totals of adjacent time
+                  periods add up.
+           @param period None, 'day' or 'week'. See GetTotalsSQLCmd().
+           @return A tuple of records, one per period."""
+        start, stop, _ = self._getReadDBConfig()
+        hasCounters = self._hasCounters()
+        #Rollup buckets must not extend beyond the start and stop times or
+        #the totals would include samples outside the time period.
+        rollupTable = self._getRollupTable(start, stop, aligned=True)
+        if rollupTable and hasCounters:
+            self._uio.info("Reading {} resolution data from the {} table.".format(rollupTable.resolution, rollupTable.tableName))
+            totals = self._dataBaseIF.executeSQL(rollupTable.getTotalsSQLCmd(self._dataBaseIF, start, stop, period, self._options.device))
+            #Samples without byte counters need the rates from the LB2120_STATS table.
+            if not any(total["MISSING"] for total in totals):
+                return totals
+
+        seedStart = self._getSeedStart(start, stop) if hasCounters else None
+        sql = StatsTable.GetTotalsSQLCmd(self._dataBaseIF, UsageLogger.TABLE_NAME, start, stop, hasCounters, period, self._hasDevice(), self._options.device, seedStart)
+        return self._dataBaseIF.executeSQL(sql)
+
+    def _showTotal(self, total):
+        """@brief Show the data transferred over a period of time.
+           @param total A record returned by _getTotals()."""
+        rxBytes = float(total["RXBYTES"])
+        txBytes = float(total["TXBYTES"])
+        samples = int(total["SAMPLES"])
+        missingCount = int(total["MISSING"] or 0)
+        #Older records only hold the rates so estimate the data transferred from them.
+        if missingCount == samples:
+            rxBytes = float(total["RXESTBYTES"])
+            txBytes = float(total["TXESTBYTES"])
+
+        self._uio.info("Data usage between "+str(total["START"])+" and "+str(total["STOP"])+"")
+        if missingCount == samples:
+            self._uio.info("No byte counters stored, data usage estimated from the Mbps rates.")
+        elif missingCount > 0:
+            self._uio.info("{} samples did not hold the byte counters.".format(missingCount))
+        self._uio.info("Samples:                 {}".format(samples) )
+        self._uio.info("Download:                {:.2f} GB".format( rxBytes/1E9 ))
+        self._uio.info("Upload:                  {:.2f} GB".format( txBytes/1E9 ))
+        self._uio.info("Total:                   {:.2f} GB".format( (rxBytes+txBytes)/1E9 ))
+        self._uio.info("Down (avg/max):          {:.3f}/{:.3f} Mbps".format( float(total["AVGDOWNMBPS"]), float(total["MAXDOWNMBPS"]) ))
+        self._uio.info("Up (avg/max):            {:.3f}/{:.3f} Mbps".format( float(total["AVGUPMBPS"]), float(total["MAXUPMBPS"]) ))
+        self._uio.info("Temp (min/max):          {:.1f}/{:.1f} C".format( float(total["MINTEMPC"]), float(total["MAXTEMPC"]) ))
+        return (rxBytes, txBytes)
+
+    def _showTotals(self, totals):
+        """@brief Show the total data transferred.
+           @param totals The records returned by _getTotals()."""
+        if len(totals) == 0:
+            self._uio.info("No data found.")
+            return
+
+        rxBytes = 0
+        txBytes = 0
+        for total in totals:
+            if len(totals) > 1:
+                self._uio.info("")
+                self._uio.info("{}".format(total["PERIOD"]))
+            periodRXBytes, periodTXBytes = self._showTotal(total)
+            rxBytes = rxBytes + periodRXBytes
+            txBytes = txBytes + periodTXBytes
+
+        startTime = totals[0]["START"]
+        stopTime = totals[-1]["STOP"]
+        totalGB = float(rxBytes + txBytes)/1E9
+        timeDelta = stopTime - startTime
+        expectedMonthlyUsage = -1
+        if timeDelta.days > 0:
+            expectedMonthlyUsage = 31 / timeDelta.days * totalGB
+
+        if len(totals) > 1:
+            self._uio.info("")
+            self._uio.info("Data usage between "+str(startTime)+" and "+str(stopTime)+"")
+            self._uio.info("Total:                   {:.2f} GB".format( totalGB ))
+        self._uio.info("Days:                    {} ".format(timeDelta.days) )
+        if expectedMonthlyUsage > -1:
+            self._uio.info("Expected monthly usage:  {:.2f} GB".format(expectedMonthlyUsage))
+
+    def total(self):
+        """@brief Caclulate the total data over a period of time."""
+
+        if self._options.offline:
+            self._showTotals(self._getStoreDataSet().getTotals(self._options.tperiod))
+            return
+
+        try:
+            self._connectToDBS()
+            totals = self._getTotals(self._options.tperiod)
+            self.shutDown()
+            self._showTotals(totals)
+
+        finally:
+            self.shutDown()
@@ -0,0 +1,47 @@
+import  os
+import  sys
+import  datetime
+
+import  pytest
+
+#The tests import the lb2120lib package from the python_tools folder.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from    lb2120lib.storage import SQLiteBackend
+from    lb2120lib.stats import StatsTable
+
+#The LB2120_STATS table schema when many LB2120 devices are read.
+STATS_SCHEMA = {"TIMESTAMP":    "DATETIME(6)",
+                "DEVICE":       "VARCHAR(64)",
+                "DOWNMBPS":     "FLOAT",
+                "UPMBPS":       "FLOAT",
+                "TEMPC":        "FLOAT",
+                "RXBYTES":      "BIGINT",
+                "TXBYTES":      "BIGINT"}
+START_TIME   = datetime.datetime(2026, 1, 1)
+
+def getStatsRow(timestamp, deviceID, rxBytes, txBytes, mbps=1.0, tempC=40.0):
+    """@brief Get an LB2120_STATS row.
+       @param timestamp The sample time.
+       @param deviceID The ID of the LB2120.
+       @param rxBytes The RX byte counter.
+       @param txBytes The TX byte counter.
+       @param mbps The down and up Mbps.
+       @param tempC The temperature.
+       @return The row dict."""
+    return {"TIMESTAMP":    timestamp,
+            "DEVICE":       deviceID,
+            "DOWNMBPS":     mbps,
+            "UPMBPS":       mbps,
+            "TEMPC":        tempC,
+            "RXBYTES":      rxBytes,
+            "TXBYTES":      txBytes}
+
+@pytest.fixture
+def backend():
+    """@brief An SQLiteBackend holding an empty LB2120_STATS table in memory."""
+    sqliteBackend = SQLiteBackend(":memory:")
+    sqliteBackend.connect()
+    sqliteBackend.ensureTableExists(StatsTable.TABLE_NAME, STATS_SCHEMA, True)
+    yield sqliteBackend
+    sqliteBackend.disconnect()
@@ -0,0 +1,57 @@
+import  json
+
+import  pytest
+
+from    lb2120lib.client import ModelJSONExtractor
+
+def getModelJSON(smsText):
+    """@brief Get model.json text (compact, as sent by the LB2120) holding an SMS.
+       @param smsText The text of the SMS.
+       @return The model.json text."""
+    model = {"sms":     {"msgs": [{"id": 1, "text": smsText}]},
+             "general": {"devTemperature": 41},
+             "power":   {"deviceTempCritical": False},
+             "wwan":    {"dataTransferredRx": 123456789,
+                         "dataTransferredTx": 98765,
+                         "signalStrength": {"rssi": -65, "rsrp": -95, "rsrq": -11, "sinr": 7}}}
+    return json.dumps(model, separators=(',', ':'))
+
+EXPECTED = (123456789, 98765, 41, False)
+
+def test_extract():
+    assert ModelJSONExtractor().extract(getModelJSON("Hello")) == EXPECTED
+
+def test_extractFromHTML():
+    #A browser returns the JSON text wrapped in HTML.
+    html = "<html><body><pre>{}</pre></body></html>".format(getModelJSON("Hello"))
+    assert ModelJSONExtractor().extract(html) == EXPECTED
+
+def test_extractSignalStrength():
+    extractor = ModelJSONExtractor((ModelJSONExtractor.SIGNAL_RSSI, ModelJSONExtractor.SIGNAL_SINR))
+    assert extractor.extract(getModelJSON("Hello")) == (-65, 7)
+
+def test_extractBracesInStrings():
+    #Braces in a string value (E.G an SMS) do not affect the fields read.
+    for smsText in ("}", "{", "}}}{", "a } b { c", '{"wwan":{"dataTransferredRx":1}}'):
+        assert ModelJSONExtractor().extract(getModelJSON(smsText)) == EXPECTED
+
+def test_extractKeysInStrings():
+    #A key held in a string with escaped quotes must not be found.
+    smsText = '"wwan":{"dataTransferredRx":1,"dataTransferredTx":2},"general":{"devTemperature":3}'
+    assert ModelJSONExtractor().extract(getModelJSON(smsText)) == EXPECTED
+
+def test_extractKeyInFollowingObject():
+    #The key of a following object must not be read when the object lacks it.
+    text = getModelJSON("Hello").replace('"deviceTempCritical"', '"tempCritical"')
+    text = text[:-1] + ',"zzz":{"deviceTempCritical":true}}'
+    with pytest.raises(KeyError):
+        ModelJSONExtractor().extract(text)
+
+def test_extractMissingField():
+    text = getModelJSON("Hello").replace('"devTemperature"', '"temperature"')
+    with pytest.raises(KeyError):
+        ModelJSONExtractor().extract(text)
+
+def test_extractNoJSON():
+    with pytest.raises(ValueError):
+        ModelJSONExtractor().extract("<html></html>")
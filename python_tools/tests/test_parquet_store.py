@@ -0,0 +1,80 @@
+import  datetime
+
+import  pytest
+
+pytest.importorskip("pyarrow")
+
+from    lb2120lib.stats import StatsTable, StatsColumns
+from    lb2120lib.storage import ParquetStore
+
+from    conftest import STATS_SCHEMA, START_TIME, getStatsRow
+
+def getColumns(backend, sqlCmd):
+    """@return A StatsColumns instance holding the records read by an SQL cmd."""
+    columns = StatsColumns()
+    for colNames, rows in backend.executeSQLChunks(sqlCmd):
+        columns.appendRows(colNames, rows)
+    columns.finish()
+    return columns
+
+def exportRecords(backend, store, colNames):
+    """@brief Export the records added since the last export as UsageLogger.export() does.
+       @return The number of records exported."""
+    sqlCmd = "SELECT {} FROM `{}`".format(", ".join(colNames), StatsTable.TABLE_NAME)
+    lastTimestamp = store.getLastTimestamp()
+    if lastTimestamp:
+        sqlCmd = sqlCmd + " WHERE TIMESTAMP > '{}'".format(lastTimestamp)
+    return store.write([getColumns(backend, sqlCmd + " ORDER BY TIMESTAMP;")])
+
+def insertRows(backend, firstIndex, count):
+    """@brief Insert the rows of two LB2120 devices."""
+    rows = []
+    for index in range(firstIndex, firstIndex+count):
+        timestamp = START_TIME + datetime.timedelta(seconds=index*10)
+        rows.append(getStatsRow(timestamp, "lte1", 5000000000 + index*1000, index*10))
+        rows.append(getStatsRow(timestamp + datetime.timedelta(seconds=3), "lte2", index*1000, 2000000 + index*10))
+    backend.insertRows(StatsTable.TABLE_NAME, list(STATS_SCHEMA.keys()), rows)
+
+def test_exportDevices(backend, tmp_path):
+    store = ParquetStore(str(tmp_path))
+    colNames = [colName for colName in StatsColumns.COLUMN_TYPES if colName in STATS_SCHEMA]
+    assert StatsTable.DEVICE in colNames
+    insertRows(backend, 0, 5)
+    assert exportRecords(backend, store, colNames) == 10
+    insertRows(backend, 5, 5)
+    assert exportRecords(backend, store, colNames) == 10
+
+    start = START_TIME
+    stop = START_TIME + datetime.timedelta(days=1)
+    columns = store.read(start, stop)
+    assert len(columns) == 20
+    assert set(columns[StatsTable.DEVICE].tolist()) == {"lte1", "lte2"}
+    totals = columns.getTotals()
+    assert (totals[0]["RXBYTES"], totals[0]["TXBYTES"]) == (18000, 180)
+
+    columns = store.read(start, stop, "lte2")
+    assert set(columns[StatsTable.DEVICE].tolist()) == {"lte2"}
+    totals = columns.getTotals()
+    assert (totals[0]["SAMPLES"], totals[0]["RXBYTES"], totals[0]["TXBYTES"]) == (10, 9000, 90)
+
+def test_readWithoutDevice(backend, tmp_path):
+    #Records exported from a table without the DEVICE column.
+    store = ParquetStore(str(tmp_path))
+    insertRows(backend, 0, 5)
+    colNames = [colName for colName in StatsColumns.COLUMN_TYPES if colName in STATS_SCHEMA and colName != StatsTable.DEVICE]
+    sqlCmd = "SELECT {} FROM `{}` WHERE DEVICE = 'lte1' ORDER BY TIMESTAMP;".format(", ".join(colNames), StatsTable.TABLE_NAME)
+    store.write([getColumns(backend, sqlCmd)])
+    start = START_TIME
+    stop = START_TIME + datetime.timedelta(days=1)
+    columns = store.read(start, stop)
+    assert columns.getTotals()[0]["RXBYTES"] == 4000
+    with pytest.raises(Exception):
+        store.read(start, stop, "lte1")
+    #Records exported once the DEVICE column was added. These are the records
+    #after the last lte1 record exported (so include the last lte2 record).
+    insertRows(backend, 5, 5)
+    assert exportRecords(backend, store, colNames + [StatsTable.DEVICE]) == 11
+    columns = store.read(start, stop)
+    assert len(columns) == 16
+    assert columns[StatsTable.DEVICE].tolist().count(None) == 5
+    assert len(store.read(start, stop, "lte2")) == 6
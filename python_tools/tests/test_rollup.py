@@ -0,0 +1,132 @@
+import  datetime
+
+import  pytest
+
+from    lb2120lib.stats import StatsTable
+from    lb2120lib.rollup import RollupTable
+
+from    conftest import STATS_SCHEMA, START_TIME, getStatsRow
+
+ROLLUP_TABLES   = (RollupTable("minute", StatsTable.TABLE_NAME + "_1M", 60),
+                   RollupTable("hour",   StatsTable.TABLE_NAME + "_1H", 3600))
+DEVICE_IDS      = ("lte1", "lte2", "lte3")
+
+def getRows():
+    """@return The LB2120_STATS rows of three LB2120 devices polled every 10
+               seconds for three hours in TIMESTAMP order."""
+    rows = []
+    for sampleIndex in range(3*360):
+        for deviceIndex, deviceID in enumerate(DEVICE_IDS):
+            scale = 10**deviceIndex
+            timestamp = START_TIME + datetime.timedelta(seconds=sampleIndex*10 + deviceIndex)
+            row = getStatsRow(timestamp, deviceID, sampleIndex*1000*scale, sampleIndex*scale, mbps=float(scale), tempC=40.0+deviceIndex)
+            #The counters could not be read from the third LB2120 for one sample.
+            if deviceIndex == 2 and sampleIndex == 500:
+                row["RXBYTES"] = row["TXBYTES"] = None
+            rows.append(row)
+    return rows
+
+def readRollupTable(backend, rollupTable):
+    """@return The rows of a rollup table in TIMESTAMP and DEVICE order."""
+    return backend.executeSQL("SELECT * FROM `{}` ORDER BY TIMESTAMP, DEVICE;".format(rollupTable.tableName))
+
+@pytest.fixture
+def rows(backend):
+    """@brief The rows held in the LB2120_STATS table."""
+    statsRows = getRows()
+    backend.insertRows(StatsTable.TABLE_NAME, list(STATS_SCHEMA.keys()), statsRows)
+    for rollupTable in ROLLUP_TABLES:
+        backend.ensureTableExists(rollupTable.tableName, RollupTable.TABLE_SCHEMA, True, RollupTable.PRIMARY_KEY)
+    return statsRows
+
+def test_bucketStart():
+    timestamp = datetime.datetime(2026, 3, 4, 5, 6, 7, 890)
+    assert RollupTable("minute", "M", 60).getBucketStart(timestamp) == datetime.datetime(2026, 3, 4, 5, 6)
+    assert RollupTable("hour", "H", 3600).getBucketStart(timestamp) == datetime.datetime(2026, 3, 4, 5)
+    assert RollupTable("day", "D", 86400).getBucketStart(timestamp) == datetime.datetime(2026, 3, 4)
+
+def test_bucketsPerDevice():
+    rollupTable = ROLLUP_TABLES[0]
+    rows = [row for row in getRows() if row["TIMESTAMP"] < START_TIME + datetime.timedelta(minutes=2)]
+    buckets = rollupTable.getBuckets(rows, {})
+    assert [(bucket["TIMESTAMP"], bucket["DEVICE"]) for bucket in buckets] == [(START_TIME + datetime.timedelta(minutes=minute), deviceID)
+                                                                               for minute in range(2) for deviceID in DEVICE_IDS]
+    for bucket in buckets:
+        deviceIndex = DEVICE_IDS.index(bucket["DEVICE"])
+        assert bucket["SAMPLES"] == 6
+        assert bucket["SUMDOWNMBPS"] == 6*10**deviceIndex
+        assert bucket["MINTEMPC"] == bucket["MAXTEMPC"] == 40.0 + deviceIndex
+    #The first sample of each LB2120 has no previous sample to count from.
+    assert [bucket["RXBYTES"] for bucket in buckets] == [5000, 50000, 500000, 6000, 60000, 600000]
+
+def test_bucketsLastCounters():
+    rollupTable = ROLLUP_TABLES[0]
+    rows = getRows()[:3]
+    lastCounters = {"lte1": (0, 0), "lte2": (0, 0)}
+    buckets = rollupTable.getBuckets(rows, lastCounters)
+    #The counters are only read from the dict.
+    assert lastCounters == {"lte1": (0, 0), "lte2": (0, 0)}
+    assert [bucket["RXBYTES"] for bucket in buckets] == [0, 0, 0]
+    buckets = rollupTable.getBuckets(getRows()[3:6], {row["DEVICE"]: (row["RXBYTES"], row["TXBYTES"]) for row in rows})
+    assert [(bucket["DEVICE"], bucket["RXBYTES"], bucket["TXBYTES"]) for bucket in buckets] == [("lte1", 1000, 1), ("lte2", 10000, 10), ("lte3", 100000, 100)]
+
+@pytest.mark.parametrize("rollupTable", ROLLUP_TABLES, ids=lambda rollupTable: rollupTable.resolution)
+def test_incrementalMatchesRebuild(backend, rows, rollupTable):
+    #Update the rollup table in batches as the collector does.
+    lastCounters = {}
+    for index in range(0, len(rows), 7):
+        batch = rows[index:index+7]
+        rollupTable.upsert(backend, rollupTable.getBuckets(batch, lastCounters))
+        for row in batch:
+            if row["RXBYTES"] is None:
+                lastCounters.pop(row["DEVICE"], None)
+            else:
+                lastCounters[row["DEVICE"]] = (row["RXBYTES"], row["TXBYTES"])
+    incrementalRows = readRollupTable(backend, rollupTable)
+
+    for sqlCmd in rollupTable.getRebuildSQLCmds(backend, StatsTable.TABLE_NAME, True, True):
+        backend.executeSQL(sqlCmd)
+    rebuiltRows = readRollupTable(backend, rollupTable)
+
+    assert len(rebuiltRows) == len(DEVICE_IDS) * 3 * 3600 // rollupTable.bucketSeconds
+    assert incrementalRows == rebuiltRows
+    assert sum(row["MISSING"] for row in rebuiltRows) == 1
+
+def test_readDevices(backend, rows):
+    rollupTable = ROLLUP_TABLES[0]
+    for sqlCmd in rollupTable.getRebuildSQLCmds(backend, StatsTable.TABLE_NAME, True, True):
+        backend.executeSQL(sqlCmd)
+    start = START_TIME + datetime.timedelta(minutes=10)
+    stop = START_TIME + datetime.timedelta(minutes=20)
+
+    deviceRecords = {}
+    for deviceIndex, deviceID in enumerate(DEVICE_IDS):
+        records = backend.executeSQL(rollupTable.getReadSQLCmd(backend, start, stop, deviceID))
+        assert len(records) == 10
+        assert all(record["SAMPLES"] == 6 for record in records)
+        assert all(record["DOWNMBPS"] == 10**deviceIndex for record in records)
+        deviceRecords[deviceID] = records
+
+    #With no device given the devices are combined in each bucket.
+    records = backend.executeSQL(rollupTable.getReadSQLCmd(backend, start, stop))
+    assert len(records) == 10
+    for index, record in enumerate(records):
+        assert record["SAMPLES"] == 18
+        assert record["DOWNMBPS"] == pytest.approx(111/3)
+        assert record["RXBYTES"] == sum(deviceRecords[deviceID][index]["RXBYTES"] for deviceID in DEVICE_IDS)
+
+def test_totalsPerDevice(backend, rows):
+    rollupTable = ROLLUP_TABLES[1]
+    for sqlCmd in rollupTable.getRebuildSQLCmds(backend, StatsTable.TABLE_NAME, True, True):
+        backend.executeSQL(sqlCmd)
+    start = START_TIME
+    stop = START_TIME + datetime.timedelta(hours=3)
+    totals = {}
+    for deviceID in DEVICE_IDS + (None,):
+        record = backend.executeSQL(rollupTable.getTotalsSQLCmd(backend, start, stop, deviceID=deviceID))[0]
+        totals[deviceID] = (record["SAMPLES"], record["RXBYTES"], record["TXBYTES"], record["MISSING"])
+    assert totals["lte1"] == (1080, 1079*1000, 1079, 0)
+    assert totals["lte2"] == (1080, 1079*10000, 1079*10, 0)
+    #The sample after the missing counters has no previous sample to count from.
+    assert totals["lte3"] == (1080, 1077*100000, 1077*100, 1)
+    assert totals[None] == tuple(sum(totals[deviceID][index] for deviceID in DEVICE_IDS) for index in range(4))
@@ -0,0 +1,125 @@
+from    threading import Thread
+
+import  pytest
+
+from    lb2120lib.stats import LB2120Stats
+from    lb2120lib.pipeline import SampleQueue
+from    lb2120lib.metrics import CollectorMetrics
+
+def getStats(deviceID, index):
+    """@brief Get the stats of a sample.
+       @param deviceID The ID of the LB2120.
+       @param index The index of the sample.
+       @return A LB2120Stats instance."""
+    lb2120Stats = LB2120Stats()
+    lb2120Stats.sampleTime  = index
+    lb2120Stats.downMbps    = float(index)
+    lb2120Stats.upMbps      = float(index)/10
+    lb2120Stats.tempC       = 40 + index
+    lb2120Stats.rxBytes     = index*1000
+    lb2120Stats.txBytes     = index*100
+    lb2120Stats.deviceID    = deviceID
+    lb2120Stats.queuedTime  = index
+    return lb2120Stats
+
+def getQueued(sampleQueue):
+    """@return A list of the device ID and sample time of the queued samples."""
+    queued = []
+    while not sampleQueue.empty():
+        lb2120Stats = sampleQueue.get_nowait()
+        queued.append((lb2120Stats.deviceID, lb2120Stats.sampleTime))
+    return queued
+
+def test_invalidPolicy():
+    with pytest.raises(Exception):
+        SampleQueue(10, "discard")
+
+def test_dropPolicy():
+    sampleQueue = SampleQueue(3, SampleQueue.POLICY_DROP)
+    for index in range(5):
+        sampleQueue.put(getStats("lte1", index))
+    assert sampleQueue.droppedCount == 2
+    assert sampleQueue.coalescedCount == 0
+    #The oldest samples are dropped.
+    assert getQueued(sampleQueue) == [("lte1", 2), ("lte1", 3), ("lte1", 4)]
+
+def test_coalescePolicy():
+    sampleQueue = SampleQueue(2, SampleQueue.POLICY_COALESCE)
+    sampleQueue.put(getStats("lte1", 1))
+    sampleQueue.put(getStats("lte2", 2))
+    sampleQueue.put(getStats("lte1", 3))
+    sampleQueue.put(getStats("lte1", 5))
+    assert sampleQueue.droppedCount == 0
+    assert sampleQueue.coalescedCount == 2
+    lb2120Stats = sampleQueue.get_nowait()
+    assert lb2120Stats.deviceID == "lte1"
+    assert lb2120Stats.sampleCount == 3
+    assert lb2120Stats.sampleTime == 5
+    #The rates are averaged and the counters are those of the newest sample.
+    assert lb2120Stats.downMbps == pytest.approx(3.0)
+    assert lb2120Stats.upMbps == pytest.approx(0.3)
+    assert lb2120Stats.tempC == 45
+    assert (lb2120Stats.rxBytes, lb2120Stats.txBytes) == (5000, 500)
+    #The time queued is that of the oldest sample.
+    assert lb2120Stats.queuedTime == 1
+    assert getQueued(sampleQueue) == [("lte2", 2)]
+
+def test_coalesceAveragesCoalescedSamples():
+    olderStats = LB2120Stats.Coalesce(getStats("lte1", 1), getStats("lte1", 2))
+    lb2120Stats = LB2120Stats.Coalesce(olderStats, getStats("lte1", 6))
+    assert lb2120Stats.sampleCount == 3
+    assert lb2120Stats.downMbps == pytest.approx(3.0)
+
+def test_coalescePolicyNoMatch():
+    #A sample from an LB2120 with no queued sample drops the oldest sample.
+    sampleQueue = SampleQueue(2, SampleQueue.POLICY_COALESCE)
+    sampleQueue.put(getStats("lte1", 1))
+    sampleQueue.put(getStats("lte2", 2))
+    sampleQueue.put(getStats("lte3", 3))
+    assert sampleQueue.droppedCount == 1
+    assert sampleQueue.coalescedCount == 0
+    assert getQueued(sampleQueue) == [("lte2", 2), ("lte3", 3)]
+
+def test_blockPolicy():
+    sampleQueue = SampleQueue(1, SampleQueue.POLICY_BLOCK)
+    sampleQueue.put(getStats("lte1", 1))
+    thread = Thread(target=sampleQueue.put, args=(getStats("lte1", 2),), daemon=True)
+    thread.start()
+    thread.join(0.2)
+    #The poller waits for space in the queue.
+    assert thread.is_alive()
+    assert sampleQueue.get(timeout=1).sampleTime == 1
+    thread.join(1)
+    assert not thread.is_alive()
+    assert getQueued(sampleQueue) == [("lte1", 2)]
+    assert sampleQueue.droppedCount == 0
+
+def test_blockPolicyInterrupt():
+    sampleQueue = SampleQueue(1, SampleQueue.POLICY_BLOCK)
+    sampleQueue.put(getStats("lte1", 1))
+    thread = Thread(target=sampleQueue.put, args=(getStats("lte1", 2),), daemon=True)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()
+    #A blocked poller is released and its sample dropped.
+    sampleQueue.interrupt()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert sampleQueue.droppedCount == 1
+    sampleQueue.put(getStats("lte1", 3))
+    assert sampleQueue.droppedCount == 2
+    assert getQueued(sampleQueue) == [("lte1", 1)]
+    #After resume() a sample that fits is queued.
+    sampleQueue.resume()
+    sampleQueue.put(getStats("lte1", 4))
+    assert getQueued(sampleQueue) == [("lte1", 4)]
+
+def test_metrics():
+    metrics = CollectorMetrics()
+    sampleQueue = SampleQueue(1, SampleQueue.POLICY_COALESCE, metrics)
+    sampleQueue.put(getStats("lte1", 1))
+    sampleQueue.put(getStats("lte1", 2))
+    sampleQueue.put(getStats("lte2", 3))
+    text = metrics.getText()
+    assert "lb2120_coalesced_samples_total 1" in text
+    assert "lb2120_dropped_samples_total 1" in text
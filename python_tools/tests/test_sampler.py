@@ -0,0 +1,49 @@
+import  json
+
+import  pytest
+
+from    lb2120lib.poller import LB2120Sampler
+from    lb2120lib.servers import StatusCache
+
+class Output(object):
+    """@brief Ignores the messages the sampler shows the user."""
+
+    def info(self, msg):
+        pass
+
+def getModelJSON(rxBytes, rsrp):
+    """@return model.json text holding the RX byte counter and RSRP."""
+    model = {"general": {"devTemperature": 41},
+             "power":   {"deviceTempCritical": False},
+             "wwan":    {"dataTransferredRx": rxBytes,
+                         "dataTransferredTx": rxBytes // 10,
+                         "signalStrength": {"rsrp": rsrp}}}
+    return json.dumps(model)
+
+def getStatus(statusCache):
+    """@return The status dict held by the StatusCache."""
+    return json.loads(statusCache.getReply()[4:])
+
+def test_getStats():
+    sampler = LB2120Sampler(Output())
+    assert sampler.getStats(getModelJSON(1000, -95), 10.0) is None
+    lb2120Stats = sampler.getStats(getModelJSON(126000, -95), 12.0)
+    assert lb2120Stats.downMbps == pytest.approx(125000*8/2/1E6)
+    assert (lb2120Stats.rxBytes, lb2120Stats.txBytes) == (126000, 12600)
+
+@pytest.mark.parametrize("rsrp", (None, "", "--"))
+def test_unknownRSRP(rsrp):
+    statusCache = StatusCache()
+    sampler = LB2120Sampler(Output(), statusCache=statusCache)
+    sampler.getStats(getModelJSON(1000, -95), 10.0)
+    assert getStatus(statusCache) == {StatusCache.RXP_KEY: -95}
+    #The sample is read and the last known RSRP is kept.
+    lb2120Stats = sampler.getStats(getModelJSON(2000, rsrp), 11.0)
+    assert lb2120Stats.rxBytes == 2000
+    assert getStatus(statusCache) == {StatusCache.RXP_KEY: -95}
+
+def test_getRSRP():
+    assert LB2120Sampler.GetRSRP(-95) == -95
+    assert LB2120Sampler.GetRSRP("-101") == -101
+    assert LB2120Sampler.GetRSRP(None) is None
+    assert LB2120Sampler.GetRSRP("N/A") is None
@@ -0,0 +1,92 @@
+import  datetime
+
+import  pytest
+
+np = pytest.importorskip("numpy")
+
+from    lb2120lib.stats import StatsTable, StatsColumns
+
+from    conftest import STATS_SCHEMA, START_TIME, getStatsRow
+
+NAN     = float("nan")
+WRAP_32 = 2**32
+
+def getColumns(backend, sqlCmd):
+    """@return A StatsColumns instance holding the records read by an SQL cmd."""
+    columns = StatsColumns()
+    for colNames, rows in backend.executeSQLChunks(sqlCmd):
+        columns.appendRows(colNames, rows)
+    columns.finish()
+    return columns
+
+def getTotals(totals):
+    """@return A list of the period, samples, RX bytes, TX bytes and missing count of each total."""
+    return [(total["PERIOD"], int(total["SAMPLES"]), int(total["RXBYTES"]), int(total["TXBYTES"]), int(total["MISSING"])) for total in totals]
+
+def test_counterDeltas():
+    counts = np.array([100.0, 300.0, WRAP_32 - 100.0, 50.0, 10.0, 40.0])
+    #Increase, increase, wrap, reset (counts from 0), increase.
+    assert StatsColumns.GetCounterDeltas(counts).tolist() == [0.0, 200.0, WRAP_32 - 400.0, 150.0, 10.0, 30.0]
+    assert StatsColumns.GetCounterDeltas(np.array([5.0])).tolist() == [0.0]
+
+def test_counterDeltasUnknown():
+    #The delta is 0 when the counter of the sample or of the sample before it
+    #is not known, not the whole count.
+    counts = np.array([NAN, 7000000000.0, 7000001000.0, NAN, 7000002000.0, 7000002500.0])
+    assert StatsColumns.GetCounterDeltas(counts).tolist() == [0.0, 0.0, 1000.0, 0.0, 0.0, 500.0]
+
+@pytest.mark.parametrize("period", (None, "day", "week"))
+def test_totalsMatchSQL(backend, period):
+    rows = []
+    for index in range(3000):
+        timestamp = START_TIME + datetime.timedelta(minutes=index*5)
+        rxBytes = (index*30000000) % WRAP_32
+        if index > 2000:
+            rxBytes = (index - 2000)*1000
+        row = getStatsRow(timestamp, None, rxBytes, index*100 + 7000000000, mbps=1.0 + index % 7)
+        #Rows stored before the counters were or when the counters could not be read.
+        if index < 5 or index % 400 == 0:
+            row["RXBYTES"] = row["TXBYTES"] = None
+        rows.append(row)
+    backend.insertRows(StatsTable.TABLE_NAME, list(STATS_SCHEMA.keys()), rows)
+    start = START_TIME
+    stop = START_TIME + datetime.timedelta(days=30)
+
+    columns = getColumns(backend, "SELECT * FROM `{}` ORDER BY TIMESTAMP;".format(StatsTable.TABLE_NAME))
+    sqlTotals = backend.executeSQL(StatsTable.GetTotalsSQLCmd(backend, StatsTable.TABLE_NAME, start, stop, True, period))
+    columnTotals = getTotals(columns.getTotals(period))
+    sqlTotals = getTotals(sqlTotals)
+    if period == "week":
+        #SQLite does not name the weeks by ISO week (see SQLiteBackend.periodName()).
+        columnTotals = [total[1:] for total in columnTotals]
+        sqlTotals = [total[1:] for total in sqlTotals]
+    assert columnTotals == sqlTotals
+    if period is None:
+        #The first known TX counter (7 GB) is not counted as usage.
+        assert int(columns.getTotals()[0]["TXBYTES"]) < 3000*100
+
+def getDeviceRows():
+    """@return The rows of two LB2120 devices whose counters differ greatly
+               (each transfers 9000 RX bytes) in TIMESTAMP order."""
+    rows = []
+    for index in range(10):
+        timestamp = START_TIME + datetime.timedelta(seconds=index*10)
+        rows.append(getStatsRow(timestamp, "lte1", 5000000000 + index*1000, index*10))
+        rows.append(getStatsRow(timestamp + datetime.timedelta(seconds=3), "lte2", index*1000, 2000000 + index*10, mbps=2.0))
+    return rows
+
+@pytest.mark.parametrize("deviceID", (None, "lte1", "lte2"))
+def test_deviceTotalsMatchSQL(backend, deviceID):
+    backend.insertRows(StatsTable.TABLE_NAME, list(STATS_SCHEMA.keys()), getDeviceRows())
+    start = START_TIME
+    stop = START_TIME + datetime.timedelta(days=1)
+    deviceSQL = StatsTable.GetDeviceSQL(backend, deviceID)
+
+    columns = getColumns(backend, "SELECT * FROM `{}` WHERE TIMESTAMP >= '{}'{} ORDER BY TIMESTAMP;".format(StatsTable.TABLE_NAME, start, deviceSQL))
+    columnTotals = columns.getTotals()
+    sqlTotals = backend.executeSQL(StatsTable.GetTotalsSQLCmd(backend, StatsTable.TABLE_NAME, start, stop, True, hasDevice=True, deviceID=deviceID))
+    assert getTotals(columnTotals) == getTotals(sqlTotals)
+    #The time between samples is also calculated for each device.
+    assert columnTotals[0]["RXESTBYTES"] == pytest.approx(sqlTotals[0]["RXESTBYTES"])
+    deviceCount = 1 if deviceID else 2
+    assert getTotals(columnTotals)[0][2:4] == (9000*deviceCount, 90*deviceCount)
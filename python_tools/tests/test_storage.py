@@ -0,0 +1,111 @@
+import  datetime
+import  sqlite3
+
+import  pytest
+
+from    lb2120lib.stats import StatsTable
+from    lb2120lib.storage import SQLiteBackend
+from    lb2120lib.rollup import RollupTable
+
+from    conftest import STATS_SCHEMA, START_TIME, getStatsRow
+
+ROLLUP_TABLE = RollupTable("minute", StatsTable.TABLE_NAME + "_1M", 60)
+
+def getRows(count, deviceID="lte1"):
+    """@return A list of count LB2120_STATS rows, one per second."""
+    return [getStatsRow(START_TIME + datetime.timedelta(seconds=index), deviceID, index*1000, index*100) for index in range(count)]
+
+def getRowCount(backend, tableName):
+    """@return The number of rows in a table."""
+    return backend.executeSQL("SELECT COUNT(*) AS ROWCOUNT FROM `{}`;".format(tableName))[0]["ROWCOUNT"]
+
+@pytest.fixture
+def fileBackend(tmp_path):
+    """@brief An SQLiteBackend holding empty LB2120_STATS and rollup tables
+              in a file so that a second connection can read what was committed."""
+    sqliteBackend = SQLiteBackend(str(tmp_path / "lb2120.db"))
+    sqliteBackend.connect()
+    sqliteBackend.ensureTableExists(StatsTable.TABLE_NAME, STATS_SCHEMA, True)
+    sqliteBackend.ensureTableExists(ROLLUP_TABLE.tableName, RollupTable.TABLE_SCHEMA, True, RollupTable.PRIMARY_KEY)
+    yield sqliteBackend
+    sqliteBackend.disconnect()
+
+def getCommittedRowCount(backend, tableName):
+    """@return The number of rows in a table read using a second connection."""
+    readBackend = SQLiteBackend(backend._filename)
+    readBackend.connect()
+    try:
+        return getRowCount(readBackend, tableName)
+    finally:
+        readBackend.disconnect()
+
+def storeRows(backend, rows):
+    """@brief Store rows and update the rollup table as the collector does."""
+    backend.insertRows(StatsTable.TABLE_NAME, list(STATS_SCHEMA.keys()), rows)
+    ROLLUP_TABLE.upsert(backend, ROLLUP_TABLE.getBuckets(rows, {}))
+
+def test_transactionCommit(fileBackend):
+    with fileBackend.transaction():
+        storeRows(fileBackend, getRows(10))
+        #Nothing is committed until the transaction ends.
+        assert getCommittedRowCount(fileBackend, StatsTable.TABLE_NAME) == 0
+    assert getCommittedRowCount(fileBackend, StatsTable.TABLE_NAME) == 10
+    assert getCommittedRowCount(fileBackend, ROLLUP_TABLE.tableName) == 1
+
+def test_transactionRollback(fileBackend):
+    storeRows(fileBackend, getRows(5))
+    with pytest.raises(RuntimeError):
+        with fileBackend.transaction():
+            storeRows(fileBackend, getRows(10, "lte2"))
+            assert getRowCount(fileBackend, StatsTable.TABLE_NAME) == 15
+            raise RuntimeError("Rollup update failed")
+    #The samples and rollup rows of the failed batch are both rolled back.
+    assert getRowCount(fileBackend, StatsTable.TABLE_NAME) == 5
+    assert getRowCount(fileBackend, ROLLUP_TABLE.tableName) == 1
+    assert getCommittedRowCount(fileBackend, StatsTable.TABLE_NAME) == 5
+    #The backend is usable after the rollback.
+    storeRows(fileBackend, getRows(3, "lte3"))
+    assert getCommittedRowCount(fileBackend, StatsTable.TABLE_NAME) == 8
+
+def test_transactionRollbackFailedStatement(fileBackend):
+    with pytest.raises(sqlite3.Error):
+        with fileBackend.transaction():
+            storeRows(fileBackend, getRows(10))
+            fileBackend.executeSQL("INSERT INTO `NO_SUCH_TABLE` VALUES (1);")
+    assert getRowCount(fileBackend, StatsTable.TABLE_NAME) == 0
+    assert getRowCount(fileBackend, ROLLUP_TABLE.tableName) == 0
+
+def test_failedInsertRolledBack(backend):
+    #Outside a transaction a failed insert leaves none of its rows.
+    backend.ensureTableExists("NOT_NULL_TABLE", {"ID": "INT NOT NULL"}, True)
+    with pytest.raises(sqlite3.Error):
+        backend.insertRows("NOT_NULL_TABLE", ["ID"], [{"ID": 1}, {"ID": 2}, {"ID": None}])
+    assert getRowCount(backend, "NOT_NULL_TABLE") == 0
+    backend.insertRows("NOT_NULL_TABLE", ["ID"], [{"ID": 1}, {"ID": 2}])
+    assert getRowCount(backend, "NOT_NULL_TABLE") == 2
+
+def test_insertRowsParameters(backend):
+    #Values are passed as parameters so quotes are stored as they are.
+    deviceID = "lte'1\"; DROP TABLE `LB2120_STATS`; --"
+    backend.insertRows(StatsTable.TABLE_NAME, list(STATS_SCHEMA.keys()), getRows(3, deviceID))
+    records = backend.executeSQL("SELECT * FROM `{}` WHERE DEVICE = {};".format(StatsTable.TABLE_NAME, backend.quoteValue(deviceID)))
+    assert [record["RXBYTES"] for record in records] == [0, 1000, 2000]
+    assert records[0]["TIMESTAMP"] == START_TIME
+
+def test_upsertRows(backend):
+    backend.ensureTableExists(ROLLUP_TABLE.tableName, RollupTable.TABLE_SCHEMA, True, RollupTable.PRIMARY_KEY)
+    rows = getRows(30)
+    rows[10]["DOWNMBPS"] = 5.0
+    rows[20]["DOWNMBPS"] = 0.5
+    lastCounters = {}
+    for batch in (rows[:10], rows[10:20], rows[20:]):
+        ROLLUP_TABLE.upsert(backend, ROLLUP_TABLE.getBuckets(batch, lastCounters))
+        lastCounters = {"lte1": (batch[-1]["RXBYTES"], batch[-1]["TXBYTES"])}
+    records = backend.executeSQL("SELECT * FROM `{}`;".format(ROLLUP_TABLE.tableName))
+    assert len(records) == 1
+    record = records[0]
+    assert record["SAMPLES"] == 30
+    assert record["SUMDOWNMBPS"] == pytest.approx(28 + 5.0 + 0.5)
+    assert (record["MINDOWNMBPS"], record["MAXDOWNMBPS"]) == (0.5, 5.0)
+    assert (record["FIRSTSAMPLE"], record["LASTSAMPLE"]) == (rows[0]["TIMESTAMP"], rows[-1]["TIMESTAMP"])
+    assert (record["RXBYTES"], record["TXBYTES"]) == (29000, 2900)
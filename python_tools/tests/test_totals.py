@@ -0,0 +1,145 @@
+import  datetime
+
+import  pytest
+
+from    lb2120lib.stats import LB2120Stats, StatsTable
+from    lb2120lib.rollup import RollupTable
+
+from    conftest import STATS_SCHEMA, START_TIME, getStatsRow
+
+WRAP_32         = 2**32
+WRAP_64         = 2**64
+SAMPLE_SECONDS  = 60
+SAMPLE_COUNT    = 2*24*60
+#The sample after which each LB2120 was reset (E.G rebooted).
+RESET_SAMPLE    = 1500
+DEVICE_IDS      = ("lte1", "lte2")
+
+def test_counterDelta():
+    assert LB2120Stats.GetCounterDelta(1000, 1500) == (500, None)
+    assert LB2120Stats.GetCounterDelta(WRAP_32 - 100, 50) == (150, 'wrap')
+    assert LB2120Stats.GetCounterDelta(WRAP_64 - 100, 50) == (150, 'wrap')
+    #A counter that goes backwards from well below a wrap value was reset.
+    assert LB2120Stats.GetCounterDelta(WRAP_32 // 2, 50) == (50, 'reset')
+    assert LB2120Stats.GetCounterDelta(WRAP_32 + 1000, 50) == (50, 'reset')
+
+def getCounters(deviceIndex, sampleIndex):
+    """@brief Get the byte counters of a sample. The RX counters wrap at
+              2^32 at different times (the database columns cannot hold
+              counters that wrap at 2^64). Both LB2120 devices are reset
+              after RESET_SAMPLE.
+       @param deviceIndex The index of the LB2120 in DEVICE_IDS.
+       @param sampleIndex The index of the sample.
+       @return A tuple of the RX and TX byte counters."""
+    if sampleIndex > RESET_SAMPLE:
+        count = sampleIndex - RESET_SAMPLE
+        return (count*1000*(deviceIndex+1), count*10)
+    if deviceIndex == 0:
+        return ((sampleIndex*50000000) % WRAP_32, sampleIndex*100)
+    return ((WRAP_32 - 10**9 + sampleIndex*70000000) % WRAP_32, sampleIndex*200)
+
+def getRows():
+    """@return The LB2120_STATS rows of both LB2120 devices in TIMESTAMP order."""
+    rows = []
+    for sampleIndex in range(SAMPLE_COUNT):
+        for deviceIndex, deviceID in enumerate(DEVICE_IDS):
+            #The LB2120 devices are not polled at the same time.
+            timestamp = START_TIME + datetime.timedelta(seconds=sampleIndex*SAMPLE_SECONDS + deviceIndex*7)
+            rxBytes, txBytes = getCounters(deviceIndex, sampleIndex)
+            rows.append(getStatsRow(timestamp, deviceID, rxBytes, txBytes, mbps=deviceIndex+1.0))
+    return rows
+
+def getExpectedTotals(rows, start, stop, deviceID=None):
+    """@brief Calculate the data transferred by adding the counter deltas.
+       @return A tuple of the number of samples, RX bytes and TX bytes."""
+    lastCounters = {}
+    samples = rxBytes = txBytes = 0
+    for row in rows:
+        if deviceID and row["DEVICE"] != deviceID:
+            continue
+        if start <= row["TIMESTAMP"] < stop:
+            samples = samples + 1
+            if row["DEVICE"] in lastCounters:
+                lastRxBytes, lastTxBytes = lastCounters[row["DEVICE"]]
+                rxBytes = rxBytes + LB2120Stats.GetCounterDelta(lastRxBytes, row["RXBYTES"])[0]
+                txBytes = txBytes + LB2120Stats.GetCounterDelta(lastTxBytes, row["TXBYTES"])[0]
+        lastCounters[row["DEVICE"]] = (row["RXBYTES"], row["TXBYTES"])
+    return (samples, rxBytes, txBytes)
+
+def getSeedStart(backend, start, deviceID):
+    """@return The time of the earliest last sample before start (as UsageLogger reads it)."""
+    seedStart = start
+    for readDeviceID in ([deviceID] if deviceID else DEVICE_IDS):
+        sqlCmd = "SELECT MAX(TIMESTAMP) AS START FROM `{}` WHERE TIMESTAMP < '{}'{};".format(StatsTable.TABLE_NAME, start, StatsTable.GetDeviceSQL(backend, readDeviceID))
+        records = backend.executeSQL(sqlCmd)
+        if records[0]["START"] is not None:
+            seedStart = min(seedStart, records[0]["START"])
+    return seedStart
+
+def getTotals(records):
+    """@return A list of the period, samples, RX bytes and TX bytes of each record."""
+    return [(record["PERIOD"], record["SAMPLES"], record["RXBYTES"], record["TXBYTES"]) for record in records]
+
+@pytest.fixture
+def rows(backend):
+    """@brief The rows held in the LB2120_STATS and minute rollup tables."""
+    statsRows = getRows()
+    backend.insertRows(StatsTable.TABLE_NAME, list(STATS_SCHEMA.keys()), statsRows)
+    rollupTable = RollupTable("minute", StatsTable.TABLE_NAME + "_1M", 60)
+    backend.ensureTableExists(rollupTable.tableName, RollupTable.TABLE_SCHEMA, True, RollupTable.PRIMARY_KEY)
+    for sqlCmd in rollupTable.getRebuildSQLCmds(backend, StatsTable.TABLE_NAME, True, True):
+        backend.executeSQL(sqlCmd)
+    return statsRows
+
+def test_rowsHoldWrapsAndResets():
+    for deviceIndex in range(len(DEVICE_IDS)):
+        counts = [getCounters(deviceIndex, sampleIndex)[0] for sampleIndex in range(SAMPLE_COUNT)]
+        changes = [LB2120Stats.GetCounterDelta(lastCount, count)[1] for lastCount, count in zip(counts, counts[1:])]
+        assert changes.count('wrap') >= 2
+        assert changes.count('reset') == 1
+
+@pytest.mark.parametrize("deviceID", (None,) + DEVICE_IDS)
+def test_totalsRawMatchesRollup(backend, rows, deviceID):
+    rollupTable = RollupTable("minute", StatsTable.TABLE_NAME + "_1M", 60)
+    #The time period holds counter wraps and the reset.
+    start = START_TIME + datetime.timedelta(minutes=30)
+    stop = START_TIME + datetime.timedelta(days=1, hours=12)
+    seedStart = getSeedStart(backend, start, deviceID)
+    expected = getExpectedTotals(rows, start, stop, deviceID)
+
+    rawTotals = getTotals(backend.executeSQL(StatsTable.GetTotalsSQLCmd(backend, StatsTable.TABLE_NAME, start, stop, True,
+                                                                        hasDevice=True, deviceID=deviceID, seedStart=seedStart)))
+    rollupTotals = getTotals(backend.executeSQL(rollupTable.getTotalsSQLCmd(backend, start, stop, deviceID=deviceID)))
+    assert rawTotals == [("ALL",) + expected]
+    assert rollupTotals == rawTotals
+
+@pytest.mark.parametrize("deviceID", (None,) + DEVICE_IDS)
+def test_dailyTotalsRawMatchesRollup(backend, rows, deviceID):
+    rollupTable = RollupTable("minute", StatsTable.TABLE_NAME + "_1M", 60)
+    start = START_TIME
+    stop = START_TIME + datetime.timedelta(days=2)
+    seedStart = getSeedStart(backend, start, deviceID)
+
+    rawTotals = getTotals(backend.executeSQL(StatsTable.GetTotalsSQLCmd(backend, StatsTable.TABLE_NAME, start, stop, True, period="day",
+                                                                        hasDevice=True, deviceID=deviceID, seedStart=seedStart)))
+    rollupTotals = getTotals(backend.executeSQL(rollupTable.getTotalsSQLCmd(backend, start, stop, period="day", deviceID=deviceID)))
+    assert len(rawTotals) == 2
+    assert rollupTotals == rawTotals
+    #The daily totals add up to the total of both days.
+    expected = getExpectedTotals(rows, start, stop, deviceID)
+    assert tuple(sum(total[index] for total in rawTotals) for index in range(1, 4)) == expected
+
+def test_totalsIncludeFirstSample(backend, rows):
+    #The data transferred up to the first sample in the time period is
+    #included so adjacent time periods add up to the whole.
+    start = START_TIME + datetime.timedelta(hours=2)
+    middle = START_TIME + datetime.timedelta(hours=20)
+    stop = START_TIME + datetime.timedelta(days=1, hours=6)
+    totals = []
+    for periodStart, periodStop in ((start, middle), (middle, stop), (start, stop)):
+        sqlCmd = StatsTable.GetTotalsSQLCmd(backend, StatsTable.TABLE_NAME, periodStart, periodStop, True,
+                                            hasDevice=True, seedStart=getSeedStart(backend, periodStart, None))
+        totals.append(getTotals(backend.executeSQL(sqlCmd))[0])
+    assert totals[0][1] + totals[1][1] == totals[2][1]
+    assert totals[0][2] + totals[1][2] == totals[2][2]
+    assert totals[0][3] + totals[1][3] == totals[2][3]
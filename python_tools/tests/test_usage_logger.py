@@ -0,0 +1,108 @@
+import  datetime
+from    optparse import OptionParser
+
+import  pytest
+
+from    lb2120lib.storage import DBClientConfig, SQLiteBackend
+from    lb2120lib.stats import LB2120Stats, StatsTable
+from    lb2120lib.usage import UsageLogger
+from    lb2120lib.cli import addCollectorOptions
+
+from    conftest import STATS_SCHEMA, START_TIME, getStatsRow
+
+class Output(object):
+    """@brief Holds the messages the UsageLogger would show the user."""
+
+    def __init__(self):
+        self.infos = []
+        self.errors = []
+
+    def info(self, msg):
+        self.infos.append(msg)
+
+    def warn(self, msg):
+        pass
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+    def debug(self, msg):
+        pass
+
+class Config(object):
+    """@brief The database config of an SQLite database file."""
+
+    def __init__(self, filename):
+        self._attrs = {DBClientConfig.DB_BACKEND:       SQLiteBackend.NAME,
+                       DBClientConfig.DB_SQLITE_FILE:   filename,
+                       DBClientConfig.DB_TABLE_SCHEMA:  " ".join("{}:{}".format(colName, colType) for colName, colType in STATS_SCHEMA.items())}
+
+    def getAttr(self, key):
+        return self._attrs[key]
+
+def getRows(start, count):
+    """@return count LB2120_STATS rows, one per second from the start sample."""
+    return [getStatsRow(START_TIME + datetime.timedelta(seconds=index), "lte1", index*1000, index*100) for index in range(start, start+count)]
+
+def getRowCount(usageLogger, tableName):
+    """@return The number of rows in a table."""
+    return usageLogger._dataBaseIF.executeSQL("SELECT COUNT(*) AS ROWCOUNT FROM `{}`;".format(tableName))[0]["ROWCOUNT"]
+
+@pytest.fixture
+def usageLogger(tmp_path):
+    """@brief A UsageLogger connected to an SQLite database file."""
+    opts = OptionParser()
+    addCollectorOptions(opts)
+    options, _ = opts.parse_args(["--spool", str(tmp_path / "lb2120.spool")])
+    logger = UsageLogger(Output(), options, Config(str(tmp_path / "lb2120.db")))
+    logger._connectToDBS()
+    logger._dbAvailable = True
+    yield logger
+    logger._shutdownDBSConnection()
+
+def test_rollupFailureSpoolsRows(usageLogger, monkeypatch):
+    usageLogger._storeRows(getRows(0, 5))
+    assert usageLogger._lastRollupCounters == {"lte1": (4000, 400)}
+
+    def upsert(dataBaseIF, buckets):
+        raise RuntimeError("Rollup update failed")
+    #The first rollup tables are updated before the last one fails.
+    monkeypatch.setattr(UsageLogger.ROLLUP_TABLES[-1], "upsert", upsert)
+    usageLogger._storeRows(getRows(5, 5))
+    assert usageLogger._uio.errors
+    assert usageLogger._spool.getPendingCount() == 5
+    #The last counters are those of the samples that were stored.
+    assert usageLogger._lastRollupCounters == {"lte1": (4000, 400)}
+
+    #Neither the samples nor any rollup table update of the failed batch are stored.
+    usageLogger._connectToDBS()
+    assert getRowCount(usageLogger, StatsTable.TABLE_NAME) == 5
+    for rollupTable in UsageLogger.ROLLUP_TABLES:
+        records = usageLogger._dataBaseIF.executeSQL("SELECT SUM(SAMPLES) AS SAMPLES FROM `{}`;".format(rollupTable.tableName))
+        assert records[0]["SAMPLES"] == 5
+
+def getHistoryLines(usageLogger):
+    """@return The window statistics lines shown."""
+    return [msg for msg in usageLogger._uio.infos if msg.startswith("LAST ")]
+
+def getStats(deviceID):
+    """@return A LB2120Stats instance read from an LB2120."""
+    lb2120Stats = LB2120Stats()
+    lb2120Stats.downMbps    = 2.0
+    lb2120Stats.upMbps      = 1.0
+    lb2120Stats.tempC       = 40.0
+    lb2120Stats.deviceID    = deviceID
+    lb2120Stats.sampleTime  = START_TIME
+    return lb2120Stats
+
+def test_showHistory(usageLogger):
+    for deviceID in ("lte1", "lte1", "lte2", "lte1"):
+        lb2120Stats = getStats(deviceID)
+        usageLogger._showHistory(usageLogger._history.add(lb2120Stats), deviceID)
+    #The statistics over each of the two windows are shown once per --wsec for each LB2120.
+    assert len(getHistoryLines(usageLogger)) == 2*2
+
+def test_showHistoryDisabled(usageLogger):
+    usageLogger._options.wsec = 0
+    usageLogger._showHistory(usageLogger._history.add(getStats("lte1")), "lte1")
+    assert getHistoryLines(usageLogger) == []